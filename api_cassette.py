@@ -0,0 +1,216 @@
+# api_cassette.py
+# Record/replay transport for external APIs (Gemini, Spoonacular, Open Food Facts)
+#
+# Record once with real keys, then replay offline:
+#   HOME_OS_CASSETTE=cassettes/receipt.json HOME_OS_CASSETTE_MODE=record streamlit run app.py
+#   HOME_OS_CASSETTE=cassettes/receipt.json python load_test.py --items 40
+import base64
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# Never written to a cassette
+SECRET_PARAMS = {'apikey', 'key'}
+SECRET_HEADERS = {'x-goog-api-key', 'authorization'}
+# Content is stored decoded, so these no longer describe it
+DROP_RESPONSE_HEADERS = {'content-encoding', 'transfer-encoding', 'content-length', 'set-cookie'}
+
+
+class CassetteMiss(Exception):
+    """Replay mode got a request that was never recorded"""
+
+
+def _redact_url(url):
+    parts = urlsplit(url)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if k.lower() not in SECRET_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
+
+def request_key(method, url, body):
+    """Stable identity of a request: method, URL without secrets, hash of the body"""
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha256(body or b'').hexdigest()[:16]
+    return f"{method.upper()} {_redact_url(url)} {digest}"
+
+
+class Cassette:
+    """
+    Recorded request/response pairs in a JSON file.
+    Several responses for the same request are replayed in recorded order;
+    the last one repeats once they run out, so replay is deterministic.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._interactions = []
+        self._cursor = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                self._interactions = json.load(f).get('interactions', [])
+
+    def find(self, key):
+        with self._lock:
+            matches = [i for i in self._interactions if i['key'] == key]
+            if not matches:
+                return None
+            n = self._cursor.get(key, 0)
+            self._cursor[key] = n + 1
+            return matches[min(n, len(matches) - 1)]
+
+    def add(self, key, request, response):
+        content = response.content
+        try:
+            body, encoding = content.decode('utf-8'), 'utf-8'
+        except UnicodeDecodeError:
+            body, encoding = base64.b64encode(content).decode('ascii'), 'base64'
+
+        entry = {
+            'key': key,
+            'method': request.method,
+            'url': _redact_url(request.url),
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {k: v for k, v in response.headers.items()
+                        if k.lower() not in DROP_RESPONSE_HEADERS},
+            'body': body,
+            'body_encoding': encoding,
+            'elapsed_ms': round(response.elapsed.total_seconds() * 1000, 1),
+            'request_headers': {k: v for k, v in request.headers.items()
+                                if k.lower() not in SECRET_HEADERS}
+        }
+        with self._lock:
+            self._interactions.append(entry)
+            self._save()
+
+    def _save(self):
+        folder = os.path.dirname(self.path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'interactions': self._interactions}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self._interactions)
+
+
+class CassetteAdapter(HTTPAdapter):
+    """
+    Transport adapter that records real traffic to a cassette ('record')
+    or answers from it without touching the network ('replay').
+    latency: seconds added to each replayed response — a number,
+             a (min, max) range, or 'recorded' to reuse the recorded timing.
+    """
+
+    def __init__(self, cassette, mode='replay', latency=0.0, seed=0, **kwargs):
+        super().__init__(**kwargs)
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.cassette = cassette
+        self.mode = mode
+        self.latency = latency
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+
+        if self.mode == 'record':
+            response = super().send(request, **kwargs)
+            self.cassette.add(key, request, response)
+            return response
+
+        entry = self.cassette.find(key)
+        if entry is None:
+            raise CassetteMiss(f"No recorded response for {key}")
+        self._sleep(entry)
+        return self._build_response(request, entry)
+
+    def _sleep(self, entry):
+        if self.latency == 'recorded':
+            delay = entry.get('elapsed_ms', 0) / 1000
+        elif isinstance(self.latency, (tuple, list)):
+            with self._random_lock:
+                delay = self._random.uniform(*self.latency)
+        else:
+            delay = float(self.latency or 0)
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def _build_response(request, entry):
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry.get('reason', '')
+        response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+        if entry.get('body_encoding') == 'base64':
+            response._content = base64.b64decode(entry['body'])
+        else:
+            response._content = entry['body'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+
+_config = {'path': None, 'mode': 'replay', 'latency': 0.0}
+_cassettes = {}
+_cassettes_lock = threading.Lock()
+
+
+def install(path, mode='replay', latency=0.0):
+    """
+    Route every session created by new_session() through a cassette.
+    Call before the API clients are first used.
+    """
+    _config.update(path=path, mode=mode, latency=latency)
+
+
+def uninstall():
+    _config.update(path=None, mode='replay', latency=0.0)
+
+
+def _config_from_env():
+    path = _config['path'] or os.getenv('HOME_OS_CASSETTE')
+    if not path:
+        return None
+    mode = _config['mode'] if _config['path'] else os.getenv('HOME_OS_CASSETTE_MODE', 'replay')
+    latency = _config['latency'] if _config['path'] else os.getenv('HOME_OS_CASSETTE_LATENCY', '0')
+    if isinstance(latency, str) and latency != 'recorded':
+        latency = tuple(float(x) for x in latency.split(',')) if ',' in latency else float(latency)
+    return path, mode, latency
+
+
+def new_session(pool_size=4):
+    """
+    requests.Session with a connection pool of pool_size.
+    When a cassette is installed (install() or $HOME_OS_CASSETTE), traffic
+    goes through it instead.
+    """
+    session = requests.Session()
+    config = _config_from_env()
+    if config:
+        path, mode, latency = config
+        with _cassettes_lock:
+            if path not in _cassettes:
+                _cassettes[path] = Cassette(path)
+            cassette = _cassettes[path]
+        adapter = CassetteAdapter(cassette, mode=mode, latency=latency,
+                                  pool_connections=pool_size, pool_maxsize=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -150,6 +150,8 @@ user_name = st.session_state.get('user_name', 'Friend')
 user_picture = st.session_state.get('user_picture', '')
 
 from inventory_logic import InventoryLogic
+from ingredient_matcher import item_key
+from unit_converter import UnitConverter
 from barcode_scanner import BarcodeScanner
 from receipt_scanner import ReceiptScanner
 
@@ -213,24 +215,60 @@ def db_add_to_shopping_list(item_name, estimated_price=0.0):
             }).execute()
     except: pass
 
-def db_record_purchase(item_name, price, store=None):
+def _rpc_missing(error):
+    # PostgREST answers PGRST202 when the SQL function hasn't been created yet
+    return getattr(error, 'code', None) in ("PGRST202", "42883")
+
+def _record_purchases_direct(rows):
+    # Previous path, for projects that haven't run supabase/002 yet
     try:
-        supabase.table("price_history").insert({
-            "user_id": user_id, "item_name": item_name, "price": price,
-            "store": store or "", "quantity": 1, "unit": "unit",
-            "date_recorded": date.today().isoformat()
+        supabase.table("price_history").insert([{"user_id": user_id, **r} for r in rows]).execute()
+    except Exception:
+        # Nor supabase/001: no category / item_key columns
+        supabase.table("price_history").insert([
+            {"user_id": user_id, **{k: v for k, v in r.items() if k not in ("category", "item_key")}}
+            for r in rows]).execute()
+    total = sum(r['price'] for r in rows)
+    existing = supabase.table("budget_settings").select("*").eq("user_id", user_id).order("id").limit(1).execute()
+    if existing.data:
+        supabase.table("budget_settings").update({
+            "current_spent": (existing.data[0]['current_spent'] or 0) + total
+        }).eq("id", existing.data[0]['id']).execute()
+    else:
+        supabase.table("budget_settings").insert({
+            "user_id": user_id, "period": "monthly", "budget_limit": 500.0,
+            "current_spent": total, "start_date": date.today().isoformat()
         }).execute()
-        existing = supabase.table("budget_settings").select("*").eq("user_id", user_id).execute()
-        if existing.data:
-            supabase.table("budget_settings").update({
-                "current_spent": existing.data[0]['current_spent'] + price
-            }).eq("user_id", user_id).execute()
-        else:
-            supabase.table("budget_settings").insert({
-                "user_id": user_id, "period": "monthly", "budget_limit": 500.0,
-                "current_spent": price, "start_date": date.today().isoformat()
-            }).execute()
-    except: pass
+
+def db_record_purchases(items, store=None):
+    # items: (item_name, price) pairs. One RPC records them all and bumps the
+    # budget atomically (supabase/002_record_purchases.sql)
+    if not items: return
+    logic = InventoryLogic()
+    rows = [{
+        "item_name": name, "price": price,
+        "store": store or "", "quantity": 1, "unit": "unit",
+        "date_recorded": date.today().isoformat(),
+        "category": logic.normalize_item(name)['category'],
+        "item_key": item_key(name, logic)
+    } for name, price in items]
+    try:
+        supabase.rpc("record_purchases", {"p_user_id": user_id, "p_items": rows}).execute()
+        return
+    except Exception as e:
+        # A timeout or dropped connection may come after the RPC committed, so
+        # only a missing function is retried the old way; anything else could
+        # record the receipt twice
+        if not _rpc_missing(e):
+            st.error(f"Error recording purchases: {e}")
+            return
+    try:
+        _record_purchases_direct(rows)
+    except Exception as e:
+        st.error(f"Error recording purchases: {e}")
+
+def db_record_purchase(item_name, price, store=None):
+    db_record_purchases([(item_name, price)], store)
 
 def db_move_to_fridge(item_name, price=0.0, store=None):
     db_add_item(item_name, price=price, store=store)
@@ -242,7 +280,7 @@ def db_move_to_fridge(item_name, price=0.0, store=None):
 
 def db_get_budget():
     try:
-        r = supabase.table("budget_settings").select("*").eq("user_id", user_id).execute()
+        r = supabase.table("budget_settings").select("*").eq("user_id", user_id).order("id").limit(1).execute()
         if r.data: return r.data[0]
         supabase.table("budget_settings").insert({
             "user_id": user_id, "period": "monthly", "budget_limit": 500.0,
@@ -251,22 +289,36 @@ def db_get_budget():
         return {"budget_limit": 500.0, "current_spent": 0}
     except: return {"budget_limit": 500.0, "current_spent": 0}
 
+def _savings_counts_direct(som):
+    # Previous path, for projects that haven't run supabase/003 yet
+    meals = supabase.table("meal_plan").select("id").eq("user_id", user_id).gte("date", som).execute()
+    mc = len(meals.data) if meals.data else 0
+    trips = supabase.table("price_history").select("date_recorded").eq("user_id", user_id).gte("date_recorded", som).execute()
+    ud = len(set([r['date_recorded'] for r in trips.data])) if trips.data else 0
+    consumed = supabase.table("inventory").select("price").eq("user_id", user_id).eq("status", "Consumed").gte("date_added", som).execute()
+    wp = sum([r['price'] for r in consumed.data if r.get('price')]) if consumed.data else 0
+    return mc, ud, wp
+
 def db_calculate_savings():
     try:
         som = date.today().replace(day=1).isoformat()
-        meals = supabase.table("meal_plan").select("id").eq("user_id", user_id).gte("date", som).execute()
-        mc = len(meals.data) if meals.data else 0
-        trips = supabase.table("price_history").select("date_recorded").eq("user_id", user_id).gte("date_recorded", som).execute()
-        ud = len(set([r['date_recorded'] for r in trips.data])) if trips.data else 0
-        consumed = supabase.table("inventory").select("price").eq("user_id", user_id).eq("status", "Consumed").gte("date_added", som).execute()
-        wp = sum([r['price'] for r in consumed.data if r.get('price')]) if consumed.data else 0
+        try:
+            # Counted in Postgres, one round trip (supabase/003_savings_summary.sql)
+            r = supabase.rpc("savings_summary", {"p_user_id": user_id, "p_since": som}).execute()
+            row = r.data[0] if r.data else {}
+            mc = row.get('meals_planned') or 0
+            ud = row.get('shopping_trips') or 0
+            wp = row.get('waste_prevented') or 0
+        except Exception:
+            # Read-only, so retrying with the per-table queries is always safe
+            mc, ud, wp = _savings_counts_direct(som)
         ms = int(mc * 0.8) * 35.0
         ss = ud * 10.0
         total = ms + ss + wp
         return {'meal_planning_savings': ms, 'smart_shopping_savings': ss,
                 'food_waste_prevention': wp, 'total_monthly_savings': total,
                 'annual_projection': total * 12, 'meals_cooked': int(mc * 0.8), 'shopping_trips': ud}
-    except:
+    except Exception:
         return {'meal_planning_savings': 0, 'smart_shopping_savings': 0, 'food_waste_prevention': 0,
                 'total_monthly_savings': 0, 'annual_projection': 0, 'meals_cooked': 0, 'shopping_trips': 0}
 
@@ -448,7 +500,7 @@ with st.sidebar.expander(t('quick_add'), expanded=True):
                     if st.form_submit_button(t('save_selected')):
                         for item in selected:
                             db_add_item(clean_item_name(item['item']), quantity=item.get('qty',1), price=item['price'], store=store_name)
-                            db_record_purchase(item['item'], item['price'], store=store_name)
+                        db_record_purchases([(item['item'], item['price']) for item in selected], store=store_name)
                         st.toast(f"{t('save_selected')}!")
                         del st.session_state['scan_results']
                         st.rerun()
@@ -1067,8 +1119,8 @@ with tab2:
             if st.button("Read List", type="primary", use_container_width=True, key="wb_read_btn"):
                 with st.spinner("Reading your list..." if st.session_state['lang']=='en' else "Leyendo tu lista..."):
                     try:
-                        import base64 as _b64lib, requests as _wreq, json as _wjson
-                        _api_key = st.secrets["GOOGLE_API_KEY"]
+                        import base64 as _b64lib
+                        from gemini_client import get_client, image_part
                         _img_bytes = wb_photo.getvalue()
                         _b64_str = _b64lib.b64encode(_img_bytes).decode()
                         _lang_str = "Spanish" if st.session_state['lang']=='es' else "English"
@@ -1080,24 +1132,9 @@ with tab2:
                             "If nothing is readable, return []. "
                             "Respond in " + _lang_str + ". Return ONLY the JSON array."
                         )
-                        _payload = {
-                            "contents": [{
-                                "parts": [
-                                    {"inline_data": {"mime_type": "image/jpeg", "data": _b64_str}},
-                                    {"text": _prompt}
-                                ]
-                            }],
-                            "generationConfig": {"temperature": 0.1}
-                        }
-                        _r = _wreq.post(
-                            "https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key=" + _api_key,
-                            json=_payload, timeout=20
+                        _detected = get_client().generate_json(
+                            [image_part(_b64_str), _prompt], temperature=0.1, timeout=20
                         )
-                        _raw = _r.json()["candidates"][0]["content"]["parts"][0]["text"].strip()
-                        if "```" in _raw:
-                            _raw = _raw.split("```")[1]
-                            if _raw.startswith("json"): _raw = _raw[4:]
-                        _detected = _wjson.loads(_raw.strip())
                         if _detected:
                             st.session_state["wb_items"] = _detected
                         else:
@@ -1200,6 +1237,20 @@ with tab3:
                         supabase.table("meal_plan").delete().eq("id", meal['id']).eq("user_id", user_id).execute()
                         st.rerun()
 
+def start_recipe_prefetch():
+    """Prefetch full recipes for the current suggestions, dropping the previous batch."""
+    from recipe_manager import RecipeDetailsPrefetch
+    old = st.session_state.pop('recipe_prefetch', None)
+    if old:
+        old.cancel()
+    for key in [k for k in st.session_state.keys() if str(k).startswith('details_')]:
+        del st.session_state[key]
+    recipes = st.session_state.get('recipes')
+    if isinstance(recipes, list) and recipes:
+        st.session_state['recipe_prefetch'] = RecipeDetailsPrefetch(
+            recipes, st.session_state.get('recipe_ingredients', []), lang=st.session_state['lang']
+        )
+
 with tab4:
     st.header(t('recipe_rescue_title'))
 
@@ -1226,7 +1277,7 @@ with tab4:
 
             if recipe_mode == mode_labels[0]:
                 # Expiring soon — within 7 days
-                r = supabase.table("inventory").select("item_name").eq("user_id", user_id).eq("status", "In Stock").lte("expiry_date", (date.today() + timedelta(days=7)).isoformat()).execute()
+                r = supabase.table("inventory").select("item_name, expiry_date").eq("user_id", user_id).eq("status", "In Stock").lte("expiry_date", (date.today() + timedelta(days=7)).isoformat()).execute()
                 if r.data:
                     ingredients = list(set([i['item_name'] for i in r.data]))
                     label = "expiring"
@@ -1235,7 +1286,7 @@ with tab4:
                     ingredients = []
             else:
                 # Full inventory
-                r = supabase.table("inventory").select("item_name").eq("user_id", user_id).eq("status", "In Stock").execute()
+                r = supabase.table("inventory").select("item_name, expiry_date").eq("user_id", user_id).eq("status", "In Stock").execute()
                 if r.data:
                     ingredients = list(set([i['item_name'] for i in r.data]))
                     label = "inventory"
@@ -1244,17 +1295,38 @@ with tab4:
                     ingredients = []
 
             if ingredients:
-                spinner_msg = "🤖 Finding recipes..." if st.session_state['lang'] == 'en' else "🤖 Buscando recetas..."
-                with st.spinner(spinner_msg):
-                    st.session_state['recipes'] = suggest_recipes_from_list(
-                        ingredients,
-                        lang=st.session_state['lang']
-                    )
+                # A local recipe corpus answers in milliseconds; Gemini is the fallback
+                from recipe_index import load_default_index
+                recipe_index = load_default_index()
+                local_recipes = recipe_index.rank(r.data, top_k=3) if recipe_index else []
+                if local_recipes:
+                    st.session_state['recipes'] = local_recipes
                     st.session_state['recipe_ingredients'] = ingredients
+                else:
+                    spinner_msg = "🤖 Finding recipes..." if st.session_state['lang'] == 'en' else "🤖 Buscando recetas..."
+                    with st.spinner(spinner_msg):
+                        st.session_state['recipes'] = suggest_recipes_from_list(
+                            ingredients,
+                            lang=st.session_state['lang']
+                        )
+                        st.session_state['recipe_ingredients'] = ingredients
+                start_recipe_prefetch()
 
         except Exception as e:
             st.error(f"Error: {e}")
 
+    # Same fridge gives the cached ideas; this asks Gemini for different ones
+    if st.session_state.get('recipe_ingredients') and isinstance(st.session_state.get('recipes'), list):
+        if st.button("🔄 New Ideas" if st.session_state['lang'] == 'en' else "🔄 Otras Ideas"):
+            from recipe_manager import suggest_recipes_from_list
+            with st.spinner("🤖 Finding recipes..." if st.session_state['lang'] == 'en' else "🤖 Buscando recetas..."):
+                st.session_state['recipes'] = suggest_recipes_from_list(
+                    st.session_state['recipe_ingredients'],
+                    lang=st.session_state['lang'],
+                    refresh=True
+                )
+            start_recipe_prefetch()
+
     if 'recipes' in st.session_state:
         recipes = st.session_state['recipes']
         if isinstance(recipes, list):
@@ -1291,11 +1363,15 @@ with tab4:
                         if b2.button("📖 Full Recipe" if st.session_state['lang'] == 'en' else "📖 Receta Completa", key=f"detail_{r['id']}"):
                             from recipe_manager import get_recipe_details
                             with st.spinner("Loading..." if st.session_state['lang'] == 'en' else "Cargando..."):
-                                details = get_recipe_details(
-                                    r['title'],
-                                    st.session_state.get('recipe_ingredients', used),
-                                    lang=st.session_state['lang']
-                                )
+                                # Usually already fetched in the background; wait for it if still in flight
+                                prefetch = st.session_state.get('recipe_prefetch')
+                                details = r.get('details') or (prefetch.get(r['title'], timeout=25) if prefetch else None)
+                                if details is None:
+                                    details = get_recipe_details(
+                                        r['title'],
+                                        st.session_state.get('recipe_ingredients', used),
+                                        lang=st.session_state['lang']
+                                    )
                                 st.session_state[f"details_{r['id']}"] = details
 
                         # Cook this — mark ingredients as consumed
@@ -1591,8 +1667,7 @@ with tab_dump:
         if submit_ai:
             # Ask Gemini to split into categorized items
             try:
-                import requests as _req, json as _json
-                _api_key = st.secrets["GOOGLE_API_KEY"]
+                from gemini_client import get_client
                 _lang_str = "Spanish" if st.session_state['lang']=='es' else "English"
                 _prompt = f"""Split this brain dump into individual items and assign each a category.
 Categories: grocery, task, appointment, reminder, idea, personal, worry, other
@@ -1605,14 +1680,7 @@ Return ONLY a JSON array:
   {{"text": "milk is running low", "category": "grocery"}}
 ]
 Respond in {_lang_str}. Return ONLY JSON, no markdown."""
-                _r = _req.post(
-                    f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key={_api_key}",
-                    json={{"contents": [{{"parts": [{{"text": _prompt}}]}}], "generationConfig": {{"temperature": 0.2}}}},
-                    timeout=15
-                )
-                _raw = _r.json()['candidates'][0]['content']['parts'][0]['text'].strip()
-                if "```" in _raw: _raw = _raw.split("```")[1]; _raw = _raw[4:] if _raw.startswith("json") else _raw
-                _items = _json.loads(_raw.strip())
+                _items = get_client().generate_json(_prompt, temperature=0.2, timeout=15)
                 for _item in _items:
                     supabase.table("brain_dump").insert({
                         "user_id": user_id,
@@ -1695,11 +1763,15 @@ with tab5:
     with c2:
         st.subheader(t('spending_by_category'))
         try:
-            ph = supabase.table("price_history").select("item_name, price").eq("user_id", user_id).execute()
+            ph = supabase.table("price_history").select("item_name, price, category").eq("user_id", user_id).execute()
             if ph.data:
-                logic = InventoryLogic()
                 df_ph = pd.DataFrame(ph.data)
-                df_ph['category'] = df_ph['item_name'].apply(lambda x: logic.normalize_item(x)['category'])
+                # Category is stamped when the purchase is recorded; older rows fall back to normalizing
+                missing = df_ph['category'].isna()
+                if missing.any():
+                    logic = InventoryLogic()
+                    df_ph.loc[missing, 'category'] = df_ph.loc[missing, 'item_name'].apply(
+                        lambda x: logic.normalize_item(x)['category'])
                 import plotly.express as px
                 fig = px.pie(df_ph.groupby('category')['price'].sum().reset_index(), values='price', names='category',
                              color_discrete_sequence=['#2D5016','#7A9E5F','#C8952A','#C4572A','#4a7c29','#a0c878'])
@@ -1716,16 +1788,24 @@ with tab5:
     st.caption("Which store gives you the best price on each item?" if st.session_state['lang'] == 'en' else "¿Qué tienda te da el mejor precio por producto?")
 
     try:
-        ph_full = supabase.table("price_history").select("item_name, price, store, date_recorded").eq("user_id", user_id).execute()
+        ph_full = supabase.table("price_history").select("item_name, price, store, quantity, unit, date_recorded").eq("user_id", user_id).execute()
         if ph_full.data and len(ph_full.data) >= 2:
             df_price = pd.DataFrame(ph_full.data)
             df_price = df_price[df_price['store'].notna() & (df_price['store'] != '')]
 
             if not df_price.empty:
-                # Group by item + store, get average price
-                comparison = df_price.groupby(['item_name', 'store'])['price'].agg(['mean', 'count']).reset_index()
+                # Group by item + store on unit price (per lb, per gallon...), so pack sizes compare fairly
+                logic = InventoryLogic()
+                converter = UnitConverter(logic.rules)
+                df_price['key'] = df_price['item_name'].apply(lambda x: item_key(x, logic))
+                df_price['units'] = [converter.to_purchase_units(k, q or 1, u) or 1
+                                     for k, q, u in zip(df_price['key'], df_price['quantity'], df_price['unit'])]
+                comparison = df_price.groupby(['key', 'store']).agg(
+                    spent=('price', 'sum'), units=('units', 'sum'), count=('price', 'size')).reset_index()
+                comparison['Avg Price'] = (comparison['spent'] / comparison['units']).round(2)
+                comparison = comparison[['key', 'store', 'Avg Price', 'count']]
                 comparison.columns = ['Item', 'Store', 'Avg Price', 'Times Bought']
-                comparison['Avg Price'] = comparison['Avg Price'].round(2)
+                unit_of = {k: converter.purchase_unit(k)[0] for k in comparison['Item'].unique()}
 
                 # Find cheapest store per item
                 cheapest = comparison.loc[comparison.groupby('Item')['Avg Price'].idxmin()][['Item', 'Store', 'Avg Price']]
@@ -1752,7 +1832,7 @@ with tab5:
                                 prefix = "🥇 " if is_best else "　"
                                 color = "#2D5016" if is_best else "#6B6B6B"
                                 st.markdown(
-                                    f"<span style='color:{color}'>{prefix}**{store_row['Store']}** — ${store_row['Avg Price']:.2f}</span>",
+                                    f"<span style='color:{color}'>{prefix}**{store_row['Store']}** — ${store_row['Avg Price']:.2f} / {unit_of[item]}</span>",
                                     unsafe_allow_html=True
                                 )
 
@@ -0,0 +1,60 @@
+# backfill_price_history.py
+# Stamp category and item_key on Supabase price_history rows with the same rule
+# app.py uses when it writes them (InventoryLogic.normalize_item / item_key).
+# Run after supabase/001_price_history_category.sql, and again whenever
+# defaults.json changes. Needs the service-role key, since it updates every user's rows:
+#   SUPABASE_URL=... SUPABASE_KEY=<service role key> python backfill_price_history.py
+# Without the variables it reads .streamlit/secrets.toml like the app.
+import os
+import tomllib
+
+from supabase import create_client
+
+from ingredient_matcher import item_key
+from inventory_logic import InventoryLogic
+
+PAGE = 1000
+
+
+def get_client():
+    url, key = os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_KEY')
+    if not (url and key):
+        with open(os.path.join('.streamlit', 'secrets.toml'), 'rb') as f:
+            secrets = tomllib.load(f)
+        url, key = secrets['SUPABASE_URL'], secrets['SUPABASE_KEY']
+    return create_client(url, key)
+
+
+def main():
+    supabase = get_client()
+    logic = InventoryLogic()
+
+    # Every (name, category, key) combination stored today, a page at a time
+    stamped = {}
+    start = 0
+    while True:
+        page = (supabase.table("price_history").select("id, item_name, category, item_key")
+                .order("id").range(start, start + PAGE - 1).execute())
+        for row in page.data:
+            stamped.setdefault(row['item_name'], set()).add((row.get('category'), row.get('item_key')))
+        if len(page.data) < PAGE:
+            break
+        start += PAGE
+
+    # One update per distinct name whose rows don't all carry the app's values
+    updated = 0
+    for name, values in stamped.items():
+        if name is None:
+            continue
+        target = (logic.normalize_item(name or '')['category'], item_key(name, logic))
+        if values == {target}:
+            continue
+        supabase.table("price_history").update(
+            {"category": target[0], "item_key": target[1]}).eq("item_name", name).execute()
+        updated += 1
+
+    print(f"✅ {len(stamped)} item names checked, {updated} re-stamped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,15 @@
-import requests
 import json
+from api_cassette import new_session
 
 class BarcodeScanner:
     """
     Uses Open Food Facts API (free, no key required) to lookup product info by barcode
     """
     
-    def __init__(self):
+    def __init__(self, timeout=10):
         self.api_url = "https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
+        self.timeout = timeout
+        self.session = new_session(2)
     
     def lookup_barcode(self, barcode):
         """
@@ -16,7 +18,7 @@ class BarcodeScanner:
         """
         try:
             url = self.api_url.format(barcode=barcode)
-            response = requests.get(url)
+            response = self.session.get(url, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
@@ -87,8 +89,9 @@ class BarcodeScanner:
         Search for products by name (useful for finding barcodes)
         """
         try:
-            url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={search_term}&json=1&page_size=5"
-            response = requests.get(url)
+            url = "https://world.openfoodfacts.org/cgi/search.pl"
+            params = {'search_terms': search_term, 'json': 1, 'page_size': 5}
+            response = self.session.get(url, params=params, timeout=self.timeout)
             
             if response.status_code == 200:
                 data = response.json()
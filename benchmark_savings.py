@@ -0,0 +1,235 @@
+# benchmark_savings.py
+# SavingsTracker.calculate_monthly_savings (set-based) vs the old per-row implementation,
+# on a synthetic database, checking both give the same numbers.
+#
+#   python benchmark_savings.py                      # 10k and 1M price_history rows
+#   python benchmark_savings.py --rows 50000 --runs 5
+#   python benchmark_savings.py --legacy-max 0       # time the new code only
+import argparse
+import math
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import date, timedelta
+
+STORES = ['Walmart', 'Kroger', 'Aldi', 'Costco', "Sam's Club", 'Whole Foods', '']
+MONTHS = 24
+
+
+class LegacySavingsTracker:
+    """The previous implementation: one connection per component, queries per row/item"""
+
+    def __init__(self, tracker):
+        self.db_name = tracker.db_name
+        self.tracker = tracker
+
+    def calculate_monthly_savings(self, start_date):
+        if start_date.month == 12:
+            end_date = start_date.replace(year=start_date.year + 1, month=1, day=1)
+        else:
+            end_date = start_date.replace(month=start_date.month + 1, day=1)
+
+        savings = {
+            'meal_planning_savings': self._meal_planning(start_date, end_date),
+            'smart_shopping_savings': self._smart_shopping(start_date, end_date),
+            'food_waste_prevention': self._food_waste(start_date, end_date),
+            'price_comparison_savings': self._price_comparison(start_date, end_date),
+            'bulk_buying_savings': self._bulk(start_date, end_date),
+        }
+        savings['total_monthly_savings'] = sum(savings.values())
+        savings['annual_projection'] = savings['total_monthly_savings'] * 12
+        savings['equivalent_salary'] = savings['annual_projection'] * 1.25
+        return savings
+
+    def _meal_planning(self, start_date, end_date):
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM meal_plan WHERE date BETWEEN ? AND ?",
+                       (str(start_date), str(end_date)))
+        meals_planned = cursor.fetchone()[0]
+        conn.close()
+        return int(meals_planned * 0.8) * self.tracker.RESTAURANT_MEAL_COST
+
+    def _smart_shopping(self, start_date, end_date):
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT COUNT(DISTINCT date_recorded) FROM price_history
+        WHERE date_recorded BETWEEN ? AND ?
+        ''', (str(start_date), str(end_date)))
+        delivery_savings = cursor.fetchone()[0] * self.tracker.GROCERY_DELIVERY_FEE
+
+        cursor.execute("SELECT item_name, price FROM price_history WHERE date_recorded BETWEEN ? AND ?",
+                       (str(start_date), str(end_date)))
+        comparison_savings = 0
+        for item_name, price in cursor.fetchall():
+            cursor.execute('''
+            SELECT AVG(price) FROM price_history
+            WHERE item_name = ? AND date_recorded < ? AND date_recorded > ?
+            ''', (item_name, str(start_date), str(start_date - timedelta(days=180))))
+            avg_past_price = cursor.fetchone()[0]
+            if avg_past_price and avg_past_price > price:
+                comparison_savings += (avg_past_price - price)
+        conn.close()
+        return delivery_savings + comparison_savings
+
+    def _food_waste(self, start_date, end_date):
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT SUM(price) FROM inventory
+        WHERE status = 'Consumed' AND date_added BETWEEN ? AND ? AND expiry_date >= date_added
+        ''', (str(start_date), str(end_date)))
+        result = cursor.fetchone()[0]
+        conn.close()
+        return result if result else 0
+
+    def _price_comparison(self, start_date, end_date):
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT item_name FROM price_history WHERE date_recorded BETWEEN ? AND ?",
+                       (str(start_date), str(end_date)))
+        total_savings = 0
+        for (item_name,) in cursor.fetchall():
+            cursor.execute('''
+            SELECT price, store FROM price_history
+            WHERE item_name = ? AND date_recorded BETWEEN ? AND ?
+            ORDER BY date_recorded DESC, id ASC
+            LIMIT 1
+            ''', (item_name, str(start_date), str(end_date)))
+            current = cursor.fetchone()
+            if not current:
+                continue
+            price_paid, store_used = current
+            cursor.execute('''
+            SELECT MAX(price) FROM price_history
+            WHERE item_name = ? AND store != ? AND date_recorded > ?
+            ''', (item_name, store_used if store_used else '', str(start_date - timedelta(days=90))))
+            max_other_price = cursor.fetchone()[0]
+            if max_other_price and max_other_price > price_paid:
+                total_savings += (max_other_price - price_paid)
+        conn.close()
+        return total_savings
+
+    def _bulk(self, start_date, end_date):
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT SUM(price * 0.15) FROM price_history
+        WHERE date_recorded BETWEEN ? AND ?
+        AND (quantity > 1 OR store LIKE '%Costco%' OR store LIKE '%Sam%')
+        ''', (str(start_date), str(end_date)))
+        result = cursor.fetchone()[0]
+        conn.close()
+        return result if result else 0
+
+
+def populate(db_name, rows, seed=42):
+    """rows purchases over MONTHS months, plus meals and consumed inventory in proportion"""
+    rng = random.Random(seed)
+    today = date.today()
+    first = today - timedelta(days=30 * MONTHS)
+    items = [f'item {i}' for i in range(max(50, rows // 500))]
+
+    def day():
+        return (first + timedelta(days=rng.randrange(30 * MONTHS + 1))).isoformat()
+
+    conn = sqlite3.connect(db_name)
+    cursor = conn.cursor()
+    batch = []
+    for _ in range(rows):
+        store = rng.choice(STORES)
+        batch.append((rng.choice(items), round(rng.uniform(0.5, 20), 2),
+                      None if store == '' and rng.random() < 0.5 else store,
+                      rng.choice((1, 1, 1, 2, 3)), 'unit', day()))
+        if len(batch) == 50000:
+            cursor.executemany('''
+            INSERT INTO price_history (item_name, price, store, quantity, unit, date_recorded)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', batch)
+            batch = []
+    cursor.executemany('''
+    INSERT INTO price_history (item_name, price, store, quantity, unit, date_recorded)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', batch)
+
+    cursor.executemany("INSERT INTO meal_plan (date, meal_type, recipe_name) VALUES (?, 'dinner', 'Pasta')",
+                       [(day(),) for _ in range(max(100, rows // 50))])
+    inventory = []
+    for _ in range(max(100, rows // 20)):
+        added = day()
+        shelf = rng.randrange(-3, 30)
+        expiry = (date.fromisoformat(added) + timedelta(days=shelf)).isoformat()
+        inventory.append((rng.choice(items), added, expiry, rng.choice(('Consumed', 'In Stock')),
+                          round(rng.uniform(1, 15), 2)))
+    cursor.executemany('''
+    INSERT INTO inventory (item_name, date_added, expiry_date, status, price)
+    VALUES (?, ?, ?, ?, ?)
+    ''', inventory)
+    conn.commit()
+    conn.close()
+
+
+def same(a, b):
+    return all(math.isclose(a[k], b[k], rel_tol=1e-9, abs_tol=1e-6) for k in a)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SavingsTracker benchmark")
+    parser.add_argument('--rows', default='10000,1000000', help="comma-separated price_history sizes")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help="skip the old implementation above this many rows (it takes hours at 1M)")
+    args = parser.parse_args()
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix='homeos_savings_')
+    shutil.copy(os.path.join(repo_dir, 'defaults.json'), workdir)
+    os.chdir(workdir)
+
+    from create_db import create_database
+    from savings_tracker import SavingsTracker
+
+    month = date.today().replace(day=1)
+    try:
+        for rows in (int(r) for r in args.rows.split(',')):
+            if os.path.exists('home.db'):
+                os.remove('home.db')
+            create_database()
+            start = time.perf_counter()
+            populate('home.db', rows)
+            print(f"\n📦 {rows:,} price_history rows (built in {time.perf_counter() - start:.1f}s)")
+
+            # First SavingsTracker() migrates the new database (indexes), outside the timings
+            tracker = SavingsTracker('home.db')
+
+            timings = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                new = tracker.calculate_monthly_savings(month)
+                timings.append(time.perf_counter() - start)
+            print(f"   set-based: {min(timings) * 1000:9.1f} ms (best of {args.runs})")
+
+            if rows > args.legacy_max:
+                print("   legacy:    skipped (--legacy-max)")
+                continue
+            start = time.perf_counter()
+            old = LegacySavingsTracker(tracker).calculate_monthly_savings(month)
+            legacy = time.perf_counter() - start
+            print(f"   legacy:    {legacy * 1000:9.1f} ms ({legacy / min(timings):.0f}x slower)")
+            if same(new, old):
+                print(f"   ✅ identical: total ${new['total_monthly_savings']:.2f}")
+            else:
+                print("   ❌ results differ:")
+                for key in new:
+                    print(f"      {key}: {new[key]!r} vs {old[key]!r}")
+    finally:
+        os.chdir(repo_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,60 @@
+import calendar
 import sqlite3
-from datetime import datetime, timedelta
-import statistics
+from datetime import date, datetime, timedelta
+from itertools import combinations
+from db_migrations import BEST_STORE_SQL, migrate, rebuild_spending_rollup, rebuild_unit_prices
+from ingredient_matcher import item_key
+from inventory_logic import InventoryLogic
+from price_analytics import PriceAnalytics
+from unit_converter import UnitConverter
+
+DEFAULT_ITEM_PRICE = 5.00   # estimate for items with no price or category history
+RECENCY_DAYS = 30           # a price this many days old counts half as much as today's
+
+# Spending between two days (end exclusive), from the daily rollup
+RANGE_SPENT_SQL = '''
+SELECT COALESCE(SUM(total), 0), COALESCE(SUM(purchases), 0)
+FROM spending_daily WHERE day >= ? AND day < ?
+'''
+
+
+def _add_months(day, months):
+    """Same day of the month `months` later, clamped to the month's length"""
+    month = day.month - 1 + months
+    year = day.year + month // 12
+    month = month % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+
+def _today():
+    """
+    Local date. Purchases, period bounds and resets all use this one clock
+    (SQLite's date('now') is UTC and would put evening purchases on the next day).
+    """
+    return datetime.now().date()
+
+
+def period_bounds(anchor, period, day):
+    """
+    (start, end) of the budget period containing day, end exclusive.
+    Periods repeat every week or month from the anchor date (budget start_date).
+    """
+    if period == 'weekly':
+        start = anchor + timedelta(days=7 * ((day - anchor).days // 7))
+        return start, start + timedelta(days=7)
+
+    months = (day.year - anchor.year) * 12 + day.month - anchor.month
+    if _add_months(anchor, months) > day:
+        months -= 1
+    return _add_months(anchor, months), _add_months(anchor, months + 1)
+
 
 class BudgetManager:
     def __init__(self, db_name='home.db'):
         self.db_name = db_name
+        self.logic = InventoryLogic()
+        self.converter = UnitConverter(self.logic.rules)
+        migrate(db_name)
     
     def record_purchase(self, item_name, price, quantity=1, unit='unit', store=None, barcode=None):
         """
@@ -14,31 +64,52 @@ class BudgetManager:
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
-        # Add to price history
-        cursor.execute('''
-        INSERT INTO price_history (item_name, price, store, quantity, unit, date_recorded, barcode)
-        VALUES (?, ?, ?, ?, ?, date('now'), ?)
-        ''', (item_name, price, store, quantity, unit, barcode))
+        category = self.logic.normalize_item(item_name)['category']
+        key = item_key(item_name, self.logic)
+        today = _today()
         
-        # Update budget spending - FIXED: Added the parameter
+        # Add to price history, and to the daily rollup in the same transaction
         cursor.execute('''
-        UPDATE budget_settings
-        SET current_spent = current_spent + ?
-        WHERE id = 1
-        ''', (price,))
+        INSERT INTO price_history (item_name, price, store, quantity, unit, date_recorded, barcode,
+                                   item_key, category, rolled_up)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1)
+        ''', (item_name, price, store, quantity, unit, today.isoformat(), barcode, key, category))
         
-        # Check if alert needed
         cursor.execute('''
-        SELECT budget_limit, alert_threshold, current_spent
-        FROM budget_settings WHERE id = 1
-        ''')
+        INSERT INTO spending_daily (day, category, store, total, purchases, min_price, max_price)
+        VALUES (?, ?, ?, ?, 1, ?, ?)
+        ON CONFLICT (day, category, store) DO UPDATE SET
+            total = total + excluded.total,
+            purchases = purchases + 1,
+            min_price = MIN(min_price, excluded.min_price),
+            max_price = MAX(max_price, excluded.max_price)
+        ''', (today.isoformat(), category, store or '', price, price, price))
+        
+        # Unit price at this store (per purchase unit, e.g. per lb), and the item's cheapest store
+        if store:
+            amount = self.converter.to_purchase_units(key, quantity, unit) or 1
+            cursor.execute('''
+            INSERT INTO store_unit_prices (item_key, store, unit, spent, quantity, purchases,
+                                           last_unit_price, last_date)
+            VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+            ON CONFLICT (item_key, store) DO UPDATE SET
+                unit = excluded.unit,
+                spent = spent + excluded.spent,
+                quantity = quantity + excluded.quantity,
+                purchases = purchases + 1,
+                last_unit_price = excluded.last_unit_price,
+                last_date = excluded.last_date
+            ''', (key, store, self.converter.purchase_unit(key)[0], price, amount, price / amount,
+                  today.isoformat()))
+            cursor.execute(BEST_STORE_SQL.format(key='?'), (key,))
         
-        budget_data = cursor.fetchone()
+        # Check if alert needed
+        budget_data = self._current_period(cursor, today)
         conn.commit()
         conn.close()
         
         if budget_data:
-            limit, threshold, spent = budget_data
+            limit, threshold, spent = budget_data['limit'], budget_data['threshold'], budget_data['spent']
             percentage = (spent / limit) if limit > 0 else 0
             
             if percentage >= threshold:
@@ -52,23 +123,91 @@ class BudgetManager:
         
         return None
     
+    def _current_period(self, cursor, today=None):
+        """
+        Settings and spend of the budget period containing today.
+        Periods that ended since the last check are snapshotted into
+        budget_period_history first, so no job has to reset anything.
+        Spend comes from the daily rollup; current_spent is only a mirror of it.
+        """
+        cursor.execute('''
+        SELECT period, budget_limit, alert_threshold, start_date, start_day_spent, start_day_purchases
+        FROM budget_settings WHERE id = 1
+        ''')
+        row = cursor.fetchone()
+        if not row:
+            return None
+        
+        period, limit, threshold, anchor, carried_spent, carried_purchases = row
+        today = today or _today()
+        anchor = datetime.strptime(str(anchor)[:10], '%Y-%m-%d').date() if anchor else today
+        start, end = period_bounds(anchor, period, today)
+        
+        def spend(range_start, range_end):
+            cursor.execute(RANGE_SPENT_SQL, (range_start.isoformat(), range_end.isoformat()))
+            spent, purchases = cursor.fetchone()
+            if range_start == anchor:
+                # Spent on the start day before a reset belongs to the period the reset closed
+                spent, purchases = spent - (carried_spent or 0), purchases - (carried_purchases or 0)
+            return spent, purchases
+        
+        # Close every period between the last snapshot and the current one
+        cursor.execute("SELECT MAX(period_end) FROM budget_period_history")
+        last_end = cursor.fetchone()[0]
+        closed_from = max(anchor, datetime.strptime(last_end, '%Y-%m-%d').date()) if last_end else anchor
+        while closed_from < start:
+            closed_start, closed_end = period_bounds(anchor, period, closed_from)
+            closed_start, closed_end = max(closed_start, closed_from), min(closed_end, start)
+            self._close_period(cursor, closed_start, closed_end, period, limit, *spend(closed_start, closed_end),
+                               rollover=True)
+            closed_from = closed_end
+        
+        spent, purchases = spend(start, end)
+        cursor.execute("UPDATE budget_settings SET current_spent = ? WHERE id = 1", (spent,))
+        
+        return {
+            'period': period,
+            'limit': limit or 0,
+            'threshold': threshold,
+            'start_date': start.isoformat(),
+            'end_date': end.isoformat(),
+            'spent': spent,
+            'purchases': purchases
+        }
+    
+    def _close_period(self, cursor, start, end, period, limit, spent, purchases, rollover=False):
+        """
+        Snapshot [start, end) into budget_period_history.
+        A rollover may be computed by two processes at once, so it is only
+        written if that period isn't there yet (one statement, so atomic);
+        a reset is a single event and always written.
+        """
+        if start > end or (start == end and not purchases):
+            return
+        guard = '''
+        WHERE NOT EXISTS (SELECT 1 FROM budget_period_history WHERE period_end = ?1 AND period_start = ?2)
+        ''' if rollover else ''
+        cursor.execute(f'''
+        INSERT INTO budget_period_history
+            (period_end, period_start, period, budget_limit, spent, purchases, closed_at)
+        SELECT ?1, ?2, ?3, ?4, ?5, ?6, datetime('now')
+        {guard}
+        ''', (end.isoformat(), start.isoformat(), period, limit, spent, purchases))
+    
     def get_budget_status(self):
         """
         Get current budget status
+        start_date / end_date are the bounds of the current period (end exclusive)
         """
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
-        cursor.execute('''
-        SELECT period, budget_limit, current_spent, alert_threshold, start_date
-        FROM budget_settings WHERE id = 1
-        ''')
-        
-        data = cursor.fetchone()
+        data = self._current_period(cursor)
+        conn.commit()
         conn.close()
         
         if data:
-            period, limit, spent, threshold, start_date = data
+            period, limit, threshold, spent = data['period'], data['limit'], data['threshold'], data['spent']
             percentage = (spent / limit * 100) if limit > 0 else 0
             remaining = limit - spent
             
@@ -79,7 +218,8 @@ class BudgetManager:
                 'remaining': remaining,
                 'percentage': percentage,
                 'threshold': threshold * 100,
-                'start_date': start_date,
+                'start_date': data['start_date'],
+                'end_date': data['end_date'],
                 'status': 'over_budget' if spent > limit else 
                          'warning' if percentage >= threshold * 100 else 'good'
             }
@@ -89,14 +229,14 @@ class BudgetManager:
     def set_budget(self, amount, period='monthly'):
         """
         Set or update budget limit
+        The period in progress is closed and a new one starts now (see _close_current).
         """
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
+        self._close_current(cursor)
         cursor.execute('''
-        UPDATE budget_settings
-        SET budget_limit = ?, period = ?, start_date = date('now'), current_spent = 0
-        WHERE id = 1
+        UPDATE budget_settings SET budget_limit = ?, period = ? WHERE id = 1
         ''', (amount, period))
         
         conn.commit()
@@ -106,79 +246,157 @@ class BudgetManager:
     def reset_budget_period(self):
         """
         Reset spending for new budget period
+        Not needed for rollover (periods roll over by themselves); this closes
+        the period in progress early and starts a new one now (see _close_current).
         """
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
-        cursor.execute('''
-        UPDATE budget_settings
-        SET current_spent = 0, start_date = date('now')
-        WHERE id = 1
-        ''')
+        self._close_current(cursor)
         
         conn.commit()
         conn.close()
         print("✅ Budget period reset")
     
-    def get_price_trends(self, item_name, days=90):
+    def _close_current(self, cursor):
         """
-        Get price history and trends for an item
+        End the period in progress now and start a new one today.
+        Today's purchases so far stay in the closed period: its snapshot ends
+        today (exclusive) but includes them, and the new period starts with
+        them as start_day_spent, which its spend leaves out.
+        """
+        today = _today()
+        data = self._current_period(cursor, today)
+        if not data:
+            return
+        start = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
+        self._close_period(cursor, start, today, data['period'], data['limit'],
+                           data['spent'], data['purchases'])
+        
+        cursor.execute(RANGE_SPENT_SQL, (today.isoformat(), (today + timedelta(days=1)).isoformat()))
+        today_spent, today_purchases = cursor.fetchone()
+        cursor.execute('''
+        UPDATE budget_settings
+        SET start_date = ?, start_day_spent = ?, start_day_purchases = ?, current_spent = 0
+        WHERE id = 1
+        ''', (today.isoformat(), today_spent, today_purchases))
+    
+    def get_budget_history(self, periods=12):
+        """
+        Closed budget periods, newest first
+        Returns: list of dicts with period_start, period_end (exclusive), period,
+        budget_limit, spent, purchases
         """
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
-        date_limit = datetime.now().date() - timedelta(days=days)
+        self._current_period(cursor)
+        conn.commit()
         
         cursor.execute('''
-        SELECT price, store, date_recorded
-        FROM price_history
-        WHERE item_name LIKE ? AND date_recorded >= ?
-        ORDER BY date_recorded DESC
-        ''', (f'%{item_name}%', date_limit))
-        
-        records = cursor.fetchall()
+        SELECT period_start, period_end, period, budget_limit, spent, purchases
+        FROM budget_period_history
+        ORDER BY period_end DESC, period_start DESC, id DESC
+        LIMIT ?
+        ''', (periods,))
+        
+        columns = ['period_start', 'period_end', 'period', 'budget_limit', 'spent', 'purchases']
+        history = [dict(zip(columns, row)) for row in cursor.fetchall()]
         conn.close()
-        
-        if not records:
-            return None
-        
-        prices = [r[0] for r in records]
-        
-        return {
-            'item_name': item_name,
-            'current_price': prices[0],
-            'average_price': statistics.mean(prices),
-            'min_price': min(prices),
-            'max_price': max(prices),
-            'price_change': ((prices[0] - prices[-1]) / prices[-1] * 100) if len(prices) > 1 else 0,
-            'stores': list(set([r[1] for r in records if r[1]])),
-            'history': [{'price': r[0], 'store': r[1], 'date': r[2]} for r in records]
-        }
+        return history
+    
+    def get_price_trends(self, item_name, days=90):
+        """
+        Get price history and trends for an item
+        See PriceAnalytics.trend for the extra fields (ewma, rolling means, spikes...)
+        """
+        return PriceAnalytics(self.db_name).trend(item_name, days)
     
     def get_cheapest_store(self, item_name):
         """
         Find which store has the best price for an item
+        Prices are per purchase unit (per lb, per gallon...), so pack sizes compare fairly.
         """
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
+        key = item_key(item_name, self.logic)
         cursor.execute('''
-        SELECT store, AVG(price) as avg_price
-        FROM price_history
-        WHERE item_name LIKE ? AND store IS NOT NULL
-        GROUP BY store
-        ORDER BY avg_price ASC
-        LIMIT 1
-        ''', (f'%{item_name}%',))
+        SELECT store, unit_price, unit FROM item_best_store WHERE item_key = ?
+        ''', (key,))
         
         result = cursor.fetchone()
         conn.close()
         
         if result:
-            return {'store': result[0], 'avg_price': result[1]}
+            # Rows inserted outside record_purchase carry no unit label
+            unit = result[2] or self.converter.purchase_unit(key)[0]
+            return {'store': result[0], 'avg_price': result[1], 'unit_price': result[1], 'unit': unit}
         
         return None
     
+    def plan_shopping_trip(self, max_stores=None):
+        """
+        Split the shopping list across stores by unit price
+        max_stores: limit the trip to the best combination of this many stores
+        Returns: {'stores': {store: [{item, quantity, unit, unit_price, estimated_cost}]},
+                  'unpriced': [items with no store prices], 'total_estimate': float}
+        """
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT item_name, COALESCE(quantity, 1) FROM shopping_list ORDER BY id")
+        items = [(name, qty, item_key(name, self.logic)) for name, qty in cursor.fetchall()]
+        
+        # Every store's unit price for every list item, in one query
+        prices = {}
+        if items:
+            keys = list(dict.fromkeys(key for _, _, key in items))
+            placeholders = ','.join('?' * len(keys))
+            cursor.execute(f'''
+            SELECT item_key, store, spent / quantity, unit
+            FROM store_unit_prices
+            WHERE item_key IN ({placeholders}) AND quantity > 0
+            ''', keys)
+            for key, store, unit_price, unit in cursor.fetchall():
+                prices.setdefault(key, {})[store] = (unit_price, unit)
+        conn.close()
+        
+        stores = sorted({store for by_store in prices.values() for store in by_store})
+        
+        def trip_cost(chosen):
+            return sum(qty * min(prices[key][s][0] for s in chosen if s in prices[key])
+                       for _, qty, key in items
+                       if key in prices and any(s in prices[key] for s in chosen))
+        
+        chosen = stores
+        if max_stores and len(stores) > max_stores:
+            # Fewest unpriced items first, then the cheapest total
+            def rank(combo):
+                covered = sum(1 for _, _, key in items if key in prices and any(s in prices[key] for s in combo))
+                return (-covered, trip_cost(combo))
+            chosen = min(combinations(stores, max_stores), key=rank)
+        
+        trip = {}
+        unpriced = []
+        total = 0
+        for name, qty, key in items:
+            options = [(prices[key][s][0], s) for s in chosen if s in prices.get(key, {})]
+            if not options:
+                unpriced.append(name)
+                continue
+            unit_price, store = min(options)
+            trip.setdefault(store, []).append({
+                'item': name,
+                'quantity': qty,
+                'unit': prices[key][store][1] or self.converter.purchase_unit(key)[0],
+                'unit_price': unit_price,
+                'estimated_cost': unit_price * qty
+            })
+            total += unit_price * qty
+        
+        return {'stores': trip, 'unpriced': unpriced, 'total_estimate': total}
+    
     def get_spending_by_category(self, days=30):
         """
         Get spending breakdown by category
@@ -189,61 +407,104 @@ class BudgetManager:
         date_limit = datetime.now().date() - timedelta(days=days)
         
         cursor.execute('''
-        SELECT i.category, SUM(ph.price) as total
-        FROM price_history ph
-        LEFT JOIN inventory i ON ph.item_name = i.item_name
-        WHERE ph.date_recorded >= ?
-        GROUP BY i.category
+        SELECT category, SUM(total) as total
+        FROM spending_daily
+        WHERE day >= ?
+        GROUP BY category
         ORDER BY total DESC
-        ''', (date_limit,))
+        ''', (str(date_limit),))
         
         categories = cursor.fetchall()
         conn.close()
         
         return [{'category': c[0] if c[0] else 'Other', 'spent': c[1]} for c in categories]
     
+    def get_monthly_spending(self, months=12):
+        """
+        Spending per month for the last `months` months, oldest first
+        """
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        
+        first_day = (datetime.now().date().replace(day=1) - timedelta(days=31 * (months - 1))).replace(day=1)
+        
+        cursor.execute('''
+        SELECT substr(day, 1, 7) as month, SUM(total), SUM(purchases)
+        FROM spending_daily
+        WHERE day >= ?
+        GROUP BY month
+        ORDER BY month
+        ''', (str(first_day),))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [{'month': r[0], 'spent': r[1], 'purchases': r[2]} for r in rows]
+    
+    def rebuild_rollups(self):
+        """
+        Recompute the spending rollup and unit prices from price_history, after deleting or editing purchases
+        """
+        conn = sqlite3.connect(self.db_name)
+        rebuild_spending_rollup(conn.cursor())
+        rebuild_unit_prices(conn.cursor())
+        conn.commit()
+        conn.close()
+    
     def estimate_shopping_list_cost(self):
         """
         Estimate total cost of current shopping list based on price history
+        Every item is priced in one query: a recency-weighted average of its
+        purchases (by normalized name), else the average purchase in its
+        category, else a flat default.
         """
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
-        cursor.execute("SELECT item_name FROM shopping_list")
-        items = cursor.fetchall()
+        cursor.execute("SELECT item_name FROM shopping_list ORDER BY id")
+        items = [row[0] for row in cursor.fetchall()]
         
-        total_estimate = 0
         item_estimates = []
-        
-        for item in items:
-            item_name = item[0]
-            
-            # Get average price from history
-            cursor.execute('''
-            SELECT AVG(price) FROM price_history
-            WHERE item_name LIKE ?
-            ''', (f'%{item_name}%',))
+        if items:
+            rows = []
+            for pos, item_name in enumerate(items):
+                category = self.logic.normalize_item(item_name)['category']
+                rows.append((pos, item_key(item_name, self.logic),
+                             None if category == 'Unsorted' else category))
             
-            avg_price = cursor.fetchone()[0]
+            values = ', '.join('(?, ?, ?)' for _ in rows)
+            cursor.execute(f'''
+            WITH list(pos, item_key, category) AS (VALUES {values}),
+            item_prices AS (
+                SELECT item_key, SUM(price * w) / SUM(w) AS estimate
+                FROM (
+                    SELECT item_key, price,
+                           1.0 / (1 + MAX(julianday('now') - COALESCE(julianday(date_recorded), julianday('now')), 0) / ?) AS w
+                    FROM price_history
+                    WHERE item_key IN (SELECT item_key FROM list)
+                )
+                GROUP BY item_key
+            ),
+            category_prices AS (
+                SELECT category, SUM(total) / SUM(purchases) AS estimate
+                FROM spending_daily
+                WHERE category IN (SELECT category FROM list)
+                GROUP BY category
+            )
+            SELECT COALESCE(ip.estimate, cp.estimate, ?)
+            FROM list l
+            LEFT JOIN item_prices ip ON ip.item_key = l.item_key
+            LEFT JOIN category_prices cp ON cp.category = l.category
+            ORDER BY l.pos
+            ''', [v for row in rows for v in row] + [RECENCY_DAYS, DEFAULT_ITEM_PRICE])
             
-            if avg_price:
-                total_estimate += avg_price
-                item_estimates.append({
-                    'item': item_name,
-                    'estimated_price': avg_price
-                })
-            else:
-                # No history, use default estimate
-                item_estimates.append({
-                    'item': item_name,
-                    'estimated_price': 5.00  # Default estimate
-                })
-                total_estimate += 5.00
+            item_estimates = [{'item': item_name, 'estimated_price': row[0]}
+                              for item_name, row in zip(items, cursor.fetchall())]
         
         conn.close()
         
         return {
-            'total_estimate': total_estimate,
+            'total_estimate': sum(e['estimated_price'] for e in item_estimates),
             'item_count': len(items),
             'items': item_estimates
         }
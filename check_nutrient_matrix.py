@@ -0,0 +1,104 @@
+# check_nutrient_matrix.py
+# Regression check for NutrientMatrix name resolution on a scratch database:
+# known and unknown names mixed across repeated calls, rows written by another
+# process, and how often misses go back to the database.
+#
+#   python check_nutrient_matrix.py
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+from datetime import date, timedelta
+
+
+def check(label, ok, detail=''):
+    print(f"   {'✅' if ok else '❌'} {label}{f' ({detail})' if detail else ''}")
+    return ok
+
+
+def main():
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    workdir = tempfile.mkdtemp(prefix='homeos_matrix_')
+    shutil.copy(os.path.join(repo_dir, 'defaults.json'), workdir)
+    os.chdir(workdir)
+
+    import nutrient_matrix
+    from create_db import create_database
+    from meal_planner import MealPlanner
+    from nutrition_tracker import NutritionTracker
+
+    results = []
+    try:
+        create_database()
+        tracker = NutritionTracker('home.db')   # no API key: unknown names stay unknown
+        tracker.add_nutrition_data('Chicken', '100g', 165, protein=31, fat=3.6)
+        tracker.add_nutrition_data('Rice', '100g', 130, protein=2.7, carbs=28)
+        matrix = tracker.matrix
+
+        reads = []
+        real_read = matrix._read
+        matrix._read = lambda where, params=(): reads.append(where) or real_read(where, params)
+
+        print("\n🍗 Known and unknown names across calls")
+        meal = [{'name': 'chicken', 'amount': 150}, {'name': 'rice', 'amount': 200}]
+        first = tracker.calculate_meal_nutrition(meal)
+        mixed = tracker.calculate_meal_nutrition(meal + [{'name': 'dragon fruit', 'amount': 100}])
+        again = tracker.calculate_meal_nutrition(meal + [{'name': 'starfruit', 'amount': 100}])
+        results += [
+            check("known names keep their rows after a miss", mixed == first,
+                  f"{mixed['calories']} kcal, expected {first['calories']}"),
+            check("and after a second, different miss", again == first),
+            check("calories add up", round(first['calories'], 2) == round(1.5 * 165 + 2 * 130, 2)),
+        ]
+
+        before = len(reads)
+        for _ in range(5):
+            tracker.calculate_meal_nutrition(meal + [{'name': 'dragon fruit', 'amount': 100}])
+        results.append(check("a remembered miss doesn't query again", len(reads) == before,
+                             f"{len(reads) - before} queries in 5 calls"))
+
+        print("\n📅 Daily nutrition, then a range")
+        planner = MealPlanner('home.db')
+        start = date.today()
+        for day in range(9):
+            planner.add_meal((start + timedelta(days=day)).isoformat(), 'dinner', recipe_name='Chicken rice',
+                             ingredients=['chicken', 'rice', 'mystery spice'])
+        daily = tracker.get_daily_nutrition(start)
+        series = tracker.get_nutrition_series(start, start + timedelta(days=8))
+        results += [
+            check("get_daily_nutrition", round(daily['calories'], 2) == 295.0, f"{daily['calories']} kcal"),
+            check("get_nutrition_series after it", (series['calories'].round(2) == 295.0).all(),
+                  f"{series['calories'].tolist()}"),
+        ]
+
+        print("\n🔄 Rows written elsewhere")
+        conn = sqlite3.connect('home.db')
+        conn.execute("INSERT INTO nutrition_data (item_name, calories, source) VALUES ('Dragon Fruit', 60, 'manual')")
+        conn.execute("UPDATE nutrition_data SET calories = 170, last_updated = datetime('now', '+1 minute') "
+                     "WHERE item_name = 'Chicken'")
+        conn.commit()
+        conn.close()
+        cached = tracker.calculate_meal_nutrition([{'name': 'dragon fruit', 'amount': 100}])
+        matrix._misses_expire = 0   # as if MISS_TTL had passed
+        fresh = tracker.calculate_meal_nutrition([{'name': 'dragon fruit', 'amount': 100},
+                                                  {'name': 'chicken', 'amount': 100}])
+        results += [
+            check("a miss is trusted for MISS_TTL", cached['calories'] == 0, f"{nutrient_matrix.MISS_TTL}s"),
+            check("then new and updated rows are picked up", fresh['calories'] == 60 + 170,
+                  f"{fresh['calories']} kcal"),
+        ]
+
+        tracker.add_nutrition_data('Starfruit', '100g', 31)
+        local = tracker.calculate_meal_nutrition([{'name': 'starfruit', 'amount': 100}])
+        results.append(check("a local write clears the remembered miss", local['calories'] == 31))
+    finally:
+        os.chdir(repo_dir)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'✅ All checks passed' if all(results) else '❌ Some checks failed'}")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
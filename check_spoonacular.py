@@ -0,0 +1,162 @@
+# check_spoonacular.py
+# Offline check of SpoonacularClient against a recorded search + information exchange:
+# negative caching, coalescing of identical lookups in flight, and lookup_many.
+#
+#   python check_spoonacular.py
+#   python check_spoonacular.py --cassette cassettes/spoonacular.json --latency 0.2
+# Re-record (needs SPOONACULAR_API_KEY and network):
+#   python check_spoonacular.py --mode record
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import requests
+
+from api_cassette import Cassette, CassetteAdapter
+from spoonacular_client import SpoonacularClient
+
+FOUND = ['spinach', 'tomato', 'rice']
+NOT_FOUND = 'unobtainium'
+NOT_RECORDED = 'dilithium'   # replay raises CassetteMiss, i.e. a failed request
+
+
+class CountingAdapter(CassetteAdapter):
+    """CassetteAdapter that counts requests per endpoint"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.calls = Counter()
+        self._calls_lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        path = urlsplit(request.url).path
+        endpoint = 'search' if path.endswith('/search') else 'information'
+        with self._calls_lock:
+            self.calls[endpoint] += 1
+        return super().send(request, **kwargs)
+
+
+def new_client(cassette, mode='replay', latency=0.0, **kwargs):
+    adapter = CountingAdapter(cassette, mode=mode, latency=latency)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    client = SpoonacularClient(os.getenv('SPOONACULAR_API_KEY', 'replay'), session=session, **kwargs)
+    return client, adapter
+
+
+def check(label, ok, detail=''):
+    print(f"   {'✅' if ok else '❌'} {label}{f' ({detail})' if detail else ''}")
+    return ok
+
+
+def check_negative_cache(cassette):
+    print("\n🚫 Negative caching")
+    client, adapter = new_client(cassette)
+    results = [
+        check("no match returns None", client.lookup_nutrition(NOT_FOUND) is None),
+        check("miss is remembered", client.lookup_nutrition(NOT_FOUND.upper()) is None
+              and adapter.calls['search'] == 1, f"{adapter.calls['search']} searches"),
+    ]
+
+    client._not_found[NOT_FOUND] = time.time() - 1
+    client.lookup_nutrition(NOT_FOUND)
+    results.append(check("expired miss is asked again", adapter.calls['search'] == 2,
+                         f"{adapter.calls['search']} searches"))
+
+    # A failed request is not a "no match": it must be retried next time
+    before = adapter.calls['search']
+    client.lookup_nutrition(NOT_RECORDED)
+    client.lookup_nutrition(NOT_RECORDED)
+    results.append(check("errors are not cached", adapter.calls['search'] - before == 2
+                         and NOT_RECORDED not in client._not_found))
+    return all(results)
+
+
+def check_coalescing(cassette, latency, callers=8):
+    print(f"\n🔀 Coalescing ({callers} concurrent lookups of '{FOUND[0]}')")
+    client, adapter = new_client(cassette, latency=latency)
+    barrier = threading.Barrier(callers)
+    answers = [None] * callers
+
+    def worker(i):
+        barrier.wait()
+        answers[i] = client.lookup_nutrition(FOUND[0])
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return all([
+        check("every caller got the answer", all(a and a['calories'] > 0 for a in answers)),
+        check("one search and one information request", adapter.calls == Counter(search=1, information=1),
+              dict(adapter.calls)),
+        check("cached afterwards", client.lookup_nutrition(FOUND[0]) is answers[0]
+              and sum(adapter.calls.values()) == 2),
+    ])
+
+
+def check_lookup_many(cassette, latency):
+    names = FOUND + [NOT_FOUND, FOUND[0]]
+    print(f"\n📦 lookup_many({names})")
+    client, adapter = new_client(cassette, latency=latency)
+    start = time.perf_counter()
+    results = client.lookup_many(names)
+    elapsed = time.perf_counter() - start
+    # Found names need a search and an information request, the miss only a search
+    serial = (2 * len(FOUND) + 1) * latency
+
+    return all([
+        check("duplicates resolved once", list(results) == FOUND + [NOT_FOUND]),
+        check("nutrition for every match", all(results[n] and results[n]['serving_size'] == '100g'
+                                               for n in FOUND),
+              ', '.join(f"{n} {results[n]['calories']} kcal" for n in FOUND if results[n])),
+        check("None for the miss", results[NOT_FOUND] is None),
+        check("one request per name and endpoint",
+              adapter.calls == Counter(search=len(FOUND) + 1, information=len(FOUND)), dict(adapter.calls)),
+        check("lookups ran concurrently", latency == 0 or elapsed < serial,
+              f"{elapsed * 1000:.0f} ms vs {serial * 1000:.0f} ms one after another"),
+    ])
+
+
+def record(cassette):
+    client, adapter = new_client(cassette, mode='record')
+    for name in FOUND + [NOT_FOUND]:
+        client.lookup_nutrition(name)
+    print(f"✅ Recorded {sum(adapter.calls.values())} requests to {cassette.path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline SpoonacularClient check")
+    parser.add_argument('--cassette', default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                           'cassettes', 'spoonacular.json'))
+    parser.add_argument('--mode', choices=['record', 'replay'], default='replay')
+    parser.add_argument('--latency', type=float, default=0.1, help="replay delay per request in seconds")
+    args = parser.parse_args()
+
+    if args.mode == 'record':
+        if os.path.exists(args.cassette):
+            raise SystemExit(f"❌ {args.cassette} exists; remove it to record again")
+        record(Cassette(args.cassette))
+        return
+
+    if not os.path.exists(args.cassette):
+        raise SystemExit(f"❌ No cassette at {args.cassette}")
+
+    # A fresh Cassette per check, so replay cursors never leak between them
+    results = [
+        check_negative_cache(Cassette(args.cassette)),
+        check_coalescing(Cassette(args.cassette), args.latency),
+        check_lookup_many(Cassette(args.cassette), args.latency),
+    ]
+    print(f"\n{'✅ All checks passed' if all(results) else '❌ Some checks failed'}")
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
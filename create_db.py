@@ -1,4 +1,5 @@
 import sqlite3
+from db_migrations import ensure_schema
 
 def create_database():
     conn = sqlite3.connect('home.db')
@@ -7,11 +8,24 @@ def create_database():
     # Drop old tables to ensure clean schema
     cursor.execute('DROP TABLE IF EXISTS inventory')
     cursor.execute('DROP TABLE IF EXISTS shopping_list')
+    cursor.execute('DROP TABLE IF EXISTS meal_ingredients')
     cursor.execute('DROP TABLE IF EXISTS meal_plan')
     cursor.execute('DROP TABLE IF EXISTS price_history')
     cursor.execute('DROP TABLE IF EXISTS nutrition_data')
     cursor.execute('DROP TABLE IF EXISTS budget_settings')
 
+    # Tables and triggers the migrations add; user_version is reset below so
+    # ensure_schema creates them again, empty
+    cursor.execute('DROP TRIGGER IF EXISTS trg_budget_period_history_immutable')
+    cursor.execute('DROP TRIGGER IF EXISTS trg_savings_snapshots_immutable')
+    cursor.execute('DROP TABLE IF EXISTS spending_daily')
+    cursor.execute('DROP TABLE IF EXISTS recipe_cache')
+    cursor.execute('DROP TABLE IF EXISTS store_unit_prices')
+    cursor.execute('DROP TABLE IF EXISTS item_best_store')
+    cursor.execute('DROP TABLE IF EXISTS budget_period_history')
+    cursor.execute('DROP TABLE IF EXISTS savings_snapshots')
+    cursor.execute('DROP TABLE IF EXISTS item_rules')
+
     # 1. INVENTORY TABLE (Enhanced with price tracking)
     cursor.execute('''
     CREATE TABLE inventory (
@@ -109,6 +123,11 @@ def create_database():
     VALUES ('monthly', 500.00, date('now'), 0)
     ''')
 
+    # Indexes and later schema additions live in db_migrations
+    cursor.execute('PRAGMA user_version = 0')
+    conn.commit()
+    ensure_schema(conn)
+
     print("✅ Database V2 Created Successfully with Enhanced Features!")
     print("   - Meal Planning")
     print("   - Price Tracking")
@@ -0,0 +1,532 @@
+import json
+import sqlite3
+from ingredient_keys import normalize_ingredient
+from ingredient_matcher import item_key
+from inventory_logic import InventoryLogic
+from unit_converter import UnitConverter, parse_ingredient
+
+# Schema changes applied on top of create_db.py, tracked with PRAGMA user_version.
+# Each step is idempotent and skips tables that don't exist yet, so it is safe
+# on old databases, fresh ones and partially created ones.
+
+
+def _has_table(cursor, table):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,))
+    return cursor.fetchone() is not None
+
+
+def _has_column(cursor, table, column):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return any(row[1] == column for row in cursor.fetchall())
+
+
+def _v1_lookup_indexes(cursor):
+    """Indexes for shopping-list de-duplication and meal plan date ranges"""
+    if _has_table(cursor, 'shopping_list'):
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_shopping_list_item ON shopping_list(item_name)")
+    if _has_table(cursor, 'meal_plan'):
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_meal_plan_date ON meal_plan(date)")
+
+
+def _v2_shopping_list_quantities(cursor):
+    """Estimated quantity and purchase unit on shopping list rows"""
+    if not _has_table(cursor, 'shopping_list'):
+        return
+    if not _has_column(cursor, 'shopping_list', 'quantity'):
+        cursor.execute("ALTER TABLE shopping_list ADD COLUMN quantity REAL")
+    if not _has_column(cursor, 'shopping_list', 'unit'):
+        cursor.execute("ALTER TABLE shopping_list ADD COLUMN unit TEXT")
+
+
+def meal_ingredient_rows(meal_id, entries):
+    """
+    meal_ingredients rows for a meal's planned ingredients
+    ingredient holds the normalized item name so lookups can use the index;
+    original keeps the text as planned for display
+    """
+    rows = []
+    for position, entry in enumerate(entries or []):
+        name, amount, unit = parse_ingredient(entry)
+        key = normalize_ingredient(name) if name else ''
+        if not key:
+            continue
+        original = entry if isinstance(entry, str) else name
+        rows.append((meal_id, position, key, amount, unit, original))
+    return rows
+
+
+def _v3_meal_ingredients(cursor):
+    """One row per planned ingredient, backfilled from the meal_plan.ingredients JSON"""
+    if not _has_table(cursor, 'meal_plan'):
+        return
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS meal_ingredients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        meal_id INTEGER NOT NULL REFERENCES meal_plan(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        ingredient TEXT NOT NULL,
+        amount REAL,
+        unit TEXT,
+        original TEXT
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_meal_ingredients_meal ON meal_ingredients(meal_id, position)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_meal_ingredients_ingredient ON meal_ingredients(ingredient, meal_id)")
+
+    cursor.execute('''
+    SELECT id, ingredients FROM meal_plan
+    WHERE ingredients IS NOT NULL AND ingredients != ''
+      AND id NOT IN (SELECT meal_id FROM meal_ingredients)
+    ''')
+    rows = []
+    for meal_id, ingredients in cursor.fetchall():
+        try:
+            rows.extend(meal_ingredient_rows(meal_id, json.loads(ingredients)))
+        except (TypeError, ValueError):
+            continue
+    cursor.executemany('''
+    INSERT INTO meal_ingredients (meal_id, position, ingredient, amount, unit, original)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def _v4_recipe_cache(cursor):
+    """Spoonacular recipe details by recipe_id; details never change once fetched"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS recipe_cache (
+        recipe_id INTEGER PRIMARY KEY,
+        details TEXT NOT NULL,
+        fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+
+UNKNOWN_CATEGORY = 'Unsorted'   # InventoryLogic.normalize_item's category for unknown items
+
+
+def refresh_item_rules(cursor):
+    """
+    item_rules: the defaults.json keys in file order, so triggers can match a
+    name the way InventoryLogic.normalize_item does (first key contained in it)
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS item_rules (
+        key TEXT PRIMARY KEY,
+        category TEXT NOT NULL,
+        position INTEGER NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("DELETE FROM item_rules")
+    cursor.executemany("INSERT INTO item_rules (key, category, position) VALUES (?, ?, ?)",
+                       [(key, rule.get('category', UNKNOWN_CATEGORY), position)
+                        for position, (key, rule) in enumerate(InventoryLogic().rules.items())])
+
+
+def _rule_match(name, column):
+    """SQL for item_rules.column of the first rule key found in name, or NULL"""
+    return f'''(SELECT {column} FROM item_rules
+             WHERE instr(lower({name}), key) > 0 ORDER BY position LIMIT 1)'''
+
+
+def _rule_category(name):
+    """SQL for normalize_item's category of name: the first rule's, else 'Unsorted'"""
+    return f"COALESCE({_rule_match(name, 'category')}, '{UNKNOWN_CATEGORY}')"
+
+
+def _rule_key(name):
+    """SQL for item_key(name): the first rule key, else the lower-cased name"""
+    return f"COALESCE({_rule_match(name, 'key')}, lower(trim(replace({name}, '*', ''))))"
+
+
+def _v5_spending_rollup(cursor):
+    """
+    spending_daily: day x category x store totals of price_history.
+    record_purchase maintains it in the same transaction and inserts its rows
+    with rolled_up = 1; the trigger rolls up anything inserted some other way.
+    """
+    if not _has_table(cursor, 'price_history'):
+        return
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS spending_daily (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        store TEXT NOT NULL DEFAULT '',
+        total REAL NOT NULL DEFAULT 0,
+        purchases INTEGER NOT NULL DEFAULT 0,
+        min_price REAL,
+        max_price REAL,
+        PRIMARY KEY (day, category, store)
+    ) WITHOUT ROWID
+    ''')
+    if not _has_column(cursor, 'price_history', 'rolled_up'):
+        cursor.execute("ALTER TABLE price_history ADD COLUMN rolled_up INTEGER NOT NULL DEFAULT 0")
+
+    refresh_item_rules(cursor)
+    _create_rollup_trigger(cursor, _rule_category('NEW.item_name'))
+
+    # Backfill everything recorded so far
+    rebuild_spending_rollup(cursor)
+
+
+def _create_rollup_trigger(cursor, category):
+    cursor.execute("DROP TRIGGER IF EXISTS trg_price_history_rollup")
+    cursor.execute(f'''
+    CREATE TRIGGER trg_price_history_rollup
+    AFTER INSERT ON price_history
+    WHEN NEW.rolled_up = 0
+    BEGIN
+        INSERT INTO spending_daily (day, category, store, total, purchases, min_price, max_price)
+        VALUES (substr(COALESCE(NEW.date_recorded, date('now', 'localtime')), 1, 10), {category},
+                COALESCE(NEW.store, ''), NEW.price, 1, NEW.price, NEW.price)
+        ON CONFLICT (day, category, store) DO UPDATE SET
+            total = total + excluded.total,
+            purchases = purchases + 1,
+            min_price = MIN(min_price, excluded.min_price),
+            max_price = MAX(max_price, excluded.max_price);
+    END
+    ''')
+
+
+def rebuild_spending_rollup(cursor):
+    """
+    Recompute spending_daily from price_history, e.g. after rows were deleted or edited
+    Rows without a stamped category get InventoryLogic.normalize_item's, like record_purchase.
+    """
+    if _has_table(cursor, 'item_rules'):
+        refresh_item_rules(cursor)
+    logic = InventoryLogic()
+    categories = {}
+
+    def item_category(name):
+        if name not in categories:
+            categories[name] = logic.normalize_item(name or '')['category']
+        return categories[name]
+
+    cursor.connection.create_function('item_category', 1, item_category)
+    category = "item_category(ph.item_name)"
+    if _has_column(cursor, 'price_history', 'category'):
+        category = f"COALESCE(ph.category, {category})"
+    cursor.execute("DELETE FROM spending_daily")
+    cursor.execute(f'''
+    INSERT INTO spending_daily (day, category, store, total, purchases, min_price, max_price)
+    SELECT substr(ph.date_recorded, 1, 10), {category}, COALESCE(ph.store, ''),
+           SUM(ph.price), COUNT(*), MIN(ph.price), MAX(ph.price)
+    FROM price_history ph
+    WHERE ph.date_recorded IS NOT NULL
+    GROUP BY 1, 2, 3
+    ''')
+
+
+def _v6_price_item_key(cursor):
+    """Indexed normalized name on price_history, backfilled in one UPDATE"""
+    if not _has_table(cursor, 'price_history'):
+        return
+    if not _has_column(cursor, 'price_history', 'item_key'):
+        cursor.execute("ALTER TABLE price_history ADD COLUMN item_key TEXT")
+
+    cursor.connection.create_function('item_key', 1, item_key)
+    cursor.execute("UPDATE price_history SET item_key = item_key(item_name) WHERE item_key IS NULL")
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_price_history_item_key
+    ON price_history(item_key, date_recorded, price)
+    ''')
+
+    # Rows inserted without a key get item_key's, matched against item_rules
+    if not _has_table(cursor, 'item_rules'):
+        refresh_item_rules(cursor)
+    cursor.execute("DROP TRIGGER IF EXISTS trg_price_history_item_key")
+    cursor.execute(f'''
+    CREATE TRIGGER trg_price_history_item_key
+    AFTER INSERT ON price_history
+    WHEN NEW.item_key IS NULL
+    BEGIN
+        UPDATE price_history SET item_key = {_rule_key('NEW.item_name')} WHERE id = NEW.id;
+    END
+    ''')
+
+
+BACKFILL_BATCH = 5000
+
+
+def _v7_price_category(cursor):
+    """
+    Category stamped on price_history rows, backfilled in batches so a large
+    history never holds the write lock for long.
+    One rule on every write path: record_purchase and the backfill use
+    normalize_item, and the insert trigger matches item_rules the same way
+    (as v6's item_key trigger does), so direct inserts get the same category.
+    """
+    if not _has_table(cursor, 'price_history'):
+        return
+    if not _has_column(cursor, 'price_history', 'category'):
+        cursor.execute("ALTER TABLE price_history ADD COLUMN category TEXT")
+
+    logic = InventoryLogic()
+    last_id = 0
+    while True:
+        cursor.execute('''
+        SELECT id, item_name FROM price_history
+        WHERE id > ? AND category IS NULL
+        ORDER BY id LIMIT ?
+        ''', (last_id, BACKFILL_BATCH))
+        rows = cursor.fetchall()
+        if not rows:
+            break
+        cursor.executemany('''
+        UPDATE price_history SET category = ?, item_key = COALESCE(item_key, ?) WHERE id = ?
+        ''', [(logic.normalize_item(name or '')['category'], item_key(name, logic), row_id)
+              for row_id, name in rows])
+        cursor.connection.commit()
+        last_id = rows[-1][0]
+
+    category = _rule_category('NEW.item_name')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_price_history_category")
+    cursor.execute(f'''
+    CREATE TRIGGER trg_price_history_category
+    AFTER INSERT ON price_history
+    WHEN NEW.category IS NULL
+    BEGIN
+        UPDATE price_history SET category = {category} WHERE id = NEW.id;
+    END
+    ''')
+    # spending_daily was built by v5 with normalize_item for unstamped rows,
+    # which is what the backfill just stamped, so only the trigger changes
+    _create_rollup_trigger(cursor, f"COALESCE(NEW.category, {category})")
+
+
+# Refresh the cheapest store of one item from its per-store unit prices
+BEST_STORE_SQL = '''
+INSERT OR REPLACE INTO item_best_store (item_key, store, unit_price, unit)
+SELECT item_key, store, spent / quantity, unit
+FROM store_unit_prices
+WHERE item_key = {key} AND quantity > 0
+ORDER BY spent / quantity, store
+LIMIT 1
+'''
+
+
+def _v8_unit_prices(cursor):
+    """
+    store_unit_prices: per item and store, money spent over quantity bought in
+    the item's purchase unit; item_best_store: the cheapest of those, per item.
+    record_purchase refreshes both; the trigger covers direct inserts, counting
+    their quantity as purchase units (the unit name is left to record_purchase).
+    """
+    if not _has_table(cursor, 'price_history'):
+        return
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS store_unit_prices (
+        item_key TEXT NOT NULL,
+        store TEXT NOT NULL,
+        unit TEXT,
+        spent REAL NOT NULL DEFAULT 0,
+        quantity REAL NOT NULL DEFAULT 0,
+        purchases INTEGER NOT NULL DEFAULT 0,
+        last_unit_price REAL,
+        last_date TEXT,
+        PRIMARY KEY (item_key, store)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS item_best_store (
+        item_key TEXT PRIMARY KEY,
+        store TEXT NOT NULL,
+        unit_price REAL NOT NULL,
+        unit TEXT
+    ) WITHOUT ROWID
+    ''')
+
+    _create_unit_price_trigger(cursor, f"COALESCE(NEW.item_key, {_rule_key('NEW.item_name')})")
+    rebuild_unit_prices(cursor)
+
+
+def _create_unit_price_trigger(cursor, key):
+    quantity = "COALESCE(NULLIF(NEW.quantity, 0), 1)"
+    cursor.execute("DROP TRIGGER IF EXISTS trg_price_history_unit_price")
+    cursor.execute(f'''
+    CREATE TRIGGER trg_price_history_unit_price
+    AFTER INSERT ON price_history
+    WHEN NEW.rolled_up = 0 AND COALESCE(NEW.store, '') != ''
+    BEGIN
+        INSERT INTO store_unit_prices (item_key, store, unit, spent, quantity, purchases,
+                                       last_unit_price, last_date)
+        VALUES ({key}, NEW.store, NULL, NEW.price, {quantity}, 1,
+                NEW.price / {quantity}, NEW.date_recorded)
+        ON CONFLICT (item_key, store) DO UPDATE SET
+            spent = spent + excluded.spent,
+            quantity = quantity + excluded.quantity,
+            purchases = purchases + 1,
+            last_unit_price = excluded.last_unit_price,
+            last_date = excluded.last_date;
+        {BEST_STORE_SQL.format(key=key)};
+    END
+    ''')
+
+
+def rebuild_unit_prices(cursor):
+    """
+    Recompute store_unit_prices and item_best_store from price_history
+    """
+    logic = InventoryLogic()
+    converter = UnitConverter(logic.rules)
+    cursor.execute('''
+    SELECT COALESCE(item_key, lower(trim(item_name))), store, price, quantity, unit, date_recorded
+    FROM price_history
+    WHERE COALESCE(store, '') != ''
+    ORDER BY date_recorded, id
+    ''')
+    totals = {}
+    for key, store, price, quantity, unit, day in cursor.fetchall():
+        amount = converter.to_purchase_units(key, quantity or 1, unit) or 1
+        row = totals.setdefault((key, store), [converter.purchase_unit(key)[0], 0.0, 0.0, 0, None, None])
+        row[1] += price
+        row[2] += amount
+        row[3] += 1
+        row[4] = price / amount
+        row[5] = day
+
+    cursor.execute("DELETE FROM store_unit_prices")
+    cursor.execute("DELETE FROM item_best_store")
+    cursor.executemany('''
+    INSERT INTO store_unit_prices (item_key, store, unit, spent, quantity, purchases, last_unit_price, last_date)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [key + tuple(row) for key, row in totals.items()])
+    cursor.execute('''
+    INSERT INTO item_best_store (item_key, store, unit_price, unit)
+    SELECT item_key, store, unit_price, unit FROM (
+        SELECT item_key, store, spent / quantity AS unit_price, unit,
+               ROW_NUMBER() OVER (PARTITION BY item_key ORDER BY spent / quantity, store) AS rank
+        FROM store_unit_prices
+        WHERE quantity > 0
+    )
+    WHERE rank = 1
+    ''')
+
+
+def _v9_budget_periods(cursor):
+    """
+    budget_period_history: one row per closed budget period, written once by
+    BudgetManager when the period rolls over or is reset, never updated afterwards.
+    Several resets on one day give several rows for that day, so the key is a rowid.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS budget_period_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        period_start TEXT NOT NULL,
+        period_end TEXT NOT NULL,
+        period TEXT NOT NULL,
+        budget_limit REAL,
+        spent REAL NOT NULL DEFAULT 0,
+        purchases INTEGER NOT NULL DEFAULT 0,
+        closed_at TEXT NOT NULL
+    )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_budget_period_history_end ON budget_period_history(period_end, period_start)")
+    # A reset starts the new period mid-day: what was spent earlier that day
+    # belongs to the closed period and is left out of the new one
+    if _has_table(cursor, 'budget_settings'):
+        if not _has_column(cursor, 'budget_settings', 'start_day_spent'):
+            cursor.execute("ALTER TABLE budget_settings ADD COLUMN start_day_spent REAL NOT NULL DEFAULT 0")
+        if not _has_column(cursor, 'budget_settings', 'start_day_purchases'):
+            cursor.execute("ALTER TABLE budget_settings ADD COLUMN start_day_purchases INTEGER NOT NULL DEFAULT 0")
+    cursor.execute("DROP TRIGGER IF EXISTS trg_budget_period_history_immutable")
+    cursor.execute('''
+    CREATE TRIGGER trg_budget_period_history_immutable
+    BEFORE UPDATE ON budget_period_history
+    BEGIN
+        SELECT RAISE(ABORT, 'closed budget periods are immutable');
+    END
+    ''')
+
+
+def _v10_price_history_date(cursor):
+    """Date-range index covering the monthly savings queries (SavingsTracker)"""
+    if _has_table(cursor, 'price_history'):
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_price_history_date
+        ON price_history(date_recorded, item_name, store, price)
+        ''')
+
+
+def _v11_savings_snapshots(cursor):
+    """
+    savings_snapshots: SavingsTracker's numbers for each closed month, written
+    once when the month is first asked for after it closed, never updated.
+    """
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS savings_snapshots (
+        month TEXT PRIMARY KEY,
+        meal_planning_savings REAL NOT NULL DEFAULT 0,
+        smart_shopping_savings REAL NOT NULL DEFAULT 0,
+        food_waste_prevention REAL NOT NULL DEFAULT 0,
+        price_comparison_savings REAL NOT NULL DEFAULT 0,
+        bulk_buying_savings REAL NOT NULL DEFAULT 0,
+        meals_planned INTEGER NOT NULL DEFAULT 0,
+        shopping_trips INTEGER NOT NULL DEFAULT 0,
+        created_at TEXT NOT NULL
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute("DROP TRIGGER IF EXISTS trg_savings_snapshots_immutable")
+    cursor.execute('''
+    CREATE TRIGGER trg_savings_snapshots_immutable
+    BEFORE UPDATE ON savings_snapshots
+    BEGIN
+        SELECT RAISE(ABORT, 'savings snapshots are immutable');
+    END
+    ''')
+
+
+def _v12_inventory_consumed(cursor):
+    """Index for the consumed-this-month sum in SavingsTracker.get_savings_summary"""
+    if _has_table(cursor, 'inventory') and _has_column(cursor, 'inventory', 'price'):
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_inventory_status_added
+        ON inventory(status, date_added, price)
+        ''')
+
+
+MIGRATIONS = [
+    (1, _v1_lookup_indexes),
+    (2, _v2_shopping_list_quantities),
+    (3, _v3_meal_ingredients),
+    (4, _v4_recipe_cache),
+    (5, _v5_spending_rollup),
+    (6, _v6_price_item_key),
+    (7, _v7_price_category),
+    (8, _v8_unit_prices),
+    (9, _v9_budget_periods),
+    (10, _v10_price_history_date),
+    (11, _v11_savings_snapshots),
+    (12, _v12_inventory_consumed),
+]
+
+_migrated = set()
+
+
+def ensure_schema(conn):
+    """
+    Apply every migration newer than the database's user_version
+    """
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA user_version")
+    version = cursor.fetchone()[0]
+
+    for target, step in MIGRATIONS:
+        if target > version:
+            step(cursor)
+            cursor.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+
+
+def migrate(db_name='home.db'):
+    """
+    Bring a database file up to date, once per process
+    """
+    if db_name in _migrated:
+        return
+    conn = sqlite3.connect(db_name)
+    try:
+        ensure_schema(conn)
+    finally:
+        conn.close()
+    _migrated.add(db_name)
@@ -1,17 +1,24 @@
 import sqlite3
 from datetime import datetime, timedelta
+from db_migrations import migrate
 
 DB_NAME = 'home.db'
 
 # --- THIS IS THE FUNCTION APP.PY IS LOOKING FOR ---
 def load_demo():
     print("🎬 Populating Home OS with demo data...")
+    migrate(DB_NAME)
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
 
     # 1. Clear old data to prevent duplicates
     cursor.execute("DELETE FROM inventory")
     cursor.execute("DELETE FROM price_history")
+    cursor.execute("DELETE FROM spending_daily")
+    cursor.execute("DELETE FROM store_unit_prices")
+    cursor.execute("DELETE FROM item_best_store")
+    # Frozen months were computed from the data being replaced
+    cursor.execute("DELETE FROM savings_snapshots")
     
     # 2. Add Sample Inventory
     today = datetime.now().date()
@@ -47,9 +54,6 @@ def load_demo():
         VALUES (?, ?, ?, ?, ?, ?)
         ''', (name, price, store, 1, 'unit', today))
 
-    # 4. Set Budget
-    cursor.execute('UPDATE budget_settings SET current_spent = 150.50 WHERE id = 1')
-
     conn.commit()
     conn.close()
     print("✅ Demo data loaded successfully!")
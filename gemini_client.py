@@ -0,0 +1,221 @@
+# gemini_client.py
+# One place to call Gemini: pooled session, timeouts, retries, JSON extraction, metrics
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from collections import deque
+
+import requests
+import streamlit as st
+
+from api_cassette import new_session
+from single_flight import SingleFlight
+
+API_URL = "https://generativelanguage.googleapis.com/v1/models/{model}:generateContent"
+DEFAULT_MODEL = "gemini-2.0-flash"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Shared by every client and session in the process
+_flight = SingleFlight()
+
+
+class GeminiError(Exception):
+    """Gemini could not give a usable answer (missing key, HTTP error, empty reply)"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def image_part(data_b64, mime_type="image/jpeg"):
+    """Inline image part for generate(); data is base64 text"""
+    return {"inline_data": {"mime_type": mime_type, "data": data_b64}}
+
+
+def extract_json(text):
+    """
+    Parse JSON out of a model reply.
+    Handles bare JSON, ```json fenced blocks and JSON surrounded by prose.
+    Raises json.JSONDecodeError when nothing parses.
+    """
+    text = text.strip()
+    candidates = [text]
+
+    fenced = re.search(r"```(?:json)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    if fenced:
+        candidates.append(fenced.group(1).strip())
+
+    balanced = _first_balanced(text)
+    if balanced:
+        candidates.append(balanced)
+
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            continue
+    return json.loads(text)  # re-raise with the original text
+
+
+def _first_balanced(text):
+    """First complete [...] or {...} in text, skipping brackets inside strings"""
+    starts = [i for i in (text.find('['), text.find('{')) if i != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    depth, in_string, escaped = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in '[{':
+            depth += 1
+        elif ch in ']}':
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+class GeminiClient:
+    """
+    Thin Gemini REST client shared by every caller in the app.
+    Keeps one keep-alive Session, applies a timeout to each call, retries
+    rate limits / server errors / dropped connections with exponential
+    backoff, and records latency and payload sizes for each call.
+    """
+
+    def __init__(self, api_key, model=DEFAULT_MODEL, timeout=20, max_retries=2,
+                 backoff=0.5, session=None, pool_size=8):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = session or new_session(pool_size)
+        self._metrics = deque(maxlen=500)
+        self._metrics_lock = threading.Lock()
+
+    def generate(self, prompt, temperature=0.2, timeout=None, model=None, coalesce=False):
+        """
+        Send a prompt and return the reply text
+        prompt: a string, or a list of parts (strings and image_part() dicts)
+        coalesce: concurrent identical requests (same model, prompt and
+                  temperature) from any session share one in-flight call
+        """
+        parts = [prompt] if isinstance(prompt, (str, dict)) else list(prompt)
+        parts = [{"text": p} if isinstance(p, str) else p for p in parts]
+        payload = {
+            "contents": [{"parts": parts}],
+            "generationConfig": {"temperature": temperature}
+        }
+        body = json.dumps(payload).encode('utf-8')
+        model = model or self.model
+        if coalesce:
+            key = hashlib.sha256(model.encode('utf-8') + b'\0' + body).hexdigest()
+            return _flight.do(key, self._post, model, body, timeout)
+        return self._post(model, body, timeout)
+
+    def _post(self, model, body, timeout):
+        url = API_URL.format(model=model)
+        headers = {"Content-Type": "application/json", "x-goog-api-key": self.api_key}
+
+        started = time.perf_counter()
+        response, status, error = None, None, None
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(url, data=body, headers=headers,
+                                             timeout=timeout or self.timeout)
+                status = response.status_code
+                error = None
+                if status not in RETRY_STATUS:
+                    break
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, status, error = None, None, e
+            if attempt < self.max_retries:
+                time.sleep(self.backoff * (2 ** attempt) + random.uniform(0, self.backoff / 2))
+
+        self._record(model, started, len(body), response, status, attempt + 1)
+
+        if error is not None:
+            raise GeminiError(f"Connection failed: {error}")
+        if status != 200:
+            raise GeminiError(f"API Error {status}: {response.text[:200]}", status_code=status)
+
+        try:
+            return response.json()['candidates'][0]['content']['parts'][0]['text'].strip()
+        except (KeyError, IndexError, ValueError):
+            raise GeminiError("Empty response from Gemini", status_code=status)
+
+    def generate_json(self, prompt, temperature=0.2, timeout=None, model=None, coalesce=False):
+        """
+        Like generate(), but parses the reply as JSON (see extract_json)
+        Each caller gets its own parsed copy, even when the request was coalesced.
+        """
+        return extract_json(self.generate(prompt, temperature=temperature, timeout=timeout,
+                                          model=model, coalesce=coalesce))
+
+    def _record(self, model, started, request_bytes, response, status, attempts):
+        entry = {
+            'model': model,
+            'latency_ms': round((time.perf_counter() - started) * 1000, 1),
+            'request_bytes': request_bytes,
+            'response_bytes': len(response.content) if response is not None else 0,
+            'status': status,
+            'attempts': attempts,
+            'time': time.time()
+        }
+        with self._metrics_lock:
+            self._metrics.append(entry)
+
+    def get_metrics(self):
+        """Most recent calls, oldest first"""
+        with self._metrics_lock:
+            return list(self._metrics)
+
+    def metrics_summary(self):
+        """Call count, error count, p50/p95 latency and average payload sizes"""
+        calls = self.get_metrics()
+        if not calls:
+            return {'calls': 0}
+        latencies = sorted(c['latency_ms'] for c in calls)
+        return {
+            'calls': len(calls),
+            'errors': sum(1 for c in calls if c['status'] != 200),
+            'retries': sum(c['attempts'] - 1 for c in calls),
+            'p50_latency_ms': latencies[len(latencies) // 2],
+            'p95_latency_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            'avg_request_bytes': sum(c['request_bytes'] for c in calls) / len(calls),
+            'avg_response_bytes': sum(c['response_bytes'] for c in calls) / len(calls)
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key=None):
+    """
+    Process-wide client (one per API key) so every session reuses the same connections.
+    Reads GOOGLE_API_KEY from Streamlit Secrets when no key is given.
+    """
+    if api_key is None:
+        try:
+            api_key = st.secrets["GOOGLE_API_KEY"]
+        except Exception:
+            raise GeminiError("GOOGLE_API_KEY missing from Streamlit Secrets.")
+
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = GeminiClient(api_key)
+        return _clients[api_key]
@@ -0,0 +1,47 @@
+# ingredient_keys.py
+# Normalized ingredient keys shared by the meal plan, recipe index and migrations.
+# Standard library only, and the rules always come from the defaults.json next to
+# this file, so a key never depends on the working directory.
+import json
+import os
+import re
+from functools import lru_cache
+
+UNIT_WORDS = {
+    'cup', 'cups', 'tbsp', 'tsp', 'tablespoon', 'tablespoons', 'teaspoon', 'teaspoons',
+    'oz', 'ounce', 'ounces', 'lb', 'lbs', 'pound', 'pounds', 'g', 'gram', 'grams', 'kg',
+    'ml', 'l', 'pinch', 'clove', 'cloves', 'can', 'cans', 'package', 'slice', 'slices',
+    'taza', 'tazas', 'cucharada', 'cucharadas', 'cucharadita', 'cucharaditas',
+    'gramo', 'gramos', 'pizca', 'diente', 'dientes', 'lata', 'latas', 'rebanada', 'rebanadas'
+}
+
+DEFAULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'defaults.json')
+
+
+@lru_cache(maxsize=1)
+def _rules():
+    try:
+        with open(DEFAULTS_PATH, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+@lru_cache(maxsize=65536)
+def normalize_ingredient(name):
+    """
+    "2 cups Frozen Spinach, chopped" -> "spinach", "Jalapeño" -> "jalapeño"
+    Letters in any script are kept; digits and punctuation are dropped.
+    Names containing a defaults.json item map to it, the same core-item
+    matching InventoryLogic.normalize_item uses.
+    """
+    text = (name or '').casefold().split(',')[0]
+    text = re.sub(r'[\W\d_]+', ' ', text)
+    words = [w for w in text.split() if w not in UNIT_WORDS and w != 'frozen']
+    text = ' '.join(words)
+    if not text:
+        return ''
+    for key in _rules():
+        if key in text:
+            return key
+    return text
@@ -0,0 +1,74 @@
+import re
+from functools import lru_cache
+from inventory_logic import InventoryLogic
+
+
+@lru_cache(maxsize=1)
+def _default_logic():
+    return InventoryLogic()
+
+
+def item_key(name, logic=None):
+    """Normalized item name inventory, shopping list and prices share ("Whole Milk" -> "milk")"""
+    logic = logic or _default_logic()
+    return logic.normalize_item((name or '').replace('*', '').strip())['clean_name']
+
+
+def _tokens(name):
+    """Words of a name, with a plain plural 's' / 'es' dropped ("eggs" -> "egg")"""
+    tokens = set()
+    for word in re.findall(r'[a-z]+', name.lower()):
+        if len(word) > 3 and word.endswith('es'):
+            word = word[:-2]
+        elif len(word) > 2 and word.endswith('s'):
+            word = word[:-1]
+        tokens.add(word)
+    return tokens
+
+
+class IngredientMatcher:
+    """
+    Matches recipe ingredients against inventory.
+    Both sides go through InventoryLogic.normalize_item, and candidates come
+    from a token index instead of comparing every ingredient with every
+    inventory row.
+    """
+
+    def __init__(self, inventory_rows, logic=None):
+        """
+        inventory_rows: (item_name, quantity) pairs
+        """
+        self.logic = logic or InventoryLogic()
+        self._keys = {}
+
+        self.on_hand = {}    # normalized name -> total quantity in stock
+        self._index = {}     # token -> normalized names containing it
+
+        for item_name, quantity in inventory_rows:
+            key = self.normalize(item_name)
+            self.on_hand[key] = self.on_hand.get(key, 0) + (quantity or 0)
+            for token in _tokens(key):
+                self._index.setdefault(token, set()).add(key)
+
+    def normalize(self, name):
+        """Same clean name the inventory uses for an item"""
+        if name not in self._keys:
+            self._keys[name] = item_key(name, self.logic)
+        return self._keys[name]
+
+    def match(self, ingredient):
+        """
+        Normalized inventory name in stock for this ingredient, or None
+        """
+        key = self.normalize(ingredient)
+        if self.on_hand.get(key, 0) > 0:
+            return key
+
+        candidates = set()
+        for token in _tokens(key):
+            candidates |= self._index.get(token, set())
+
+        for candidate in sorted(candidates):
+            if (candidate in key or key in candidate) and self.on_hand[candidate] > 0:
+                return candidate
+        return None
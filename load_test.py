@@ -0,0 +1,106 @@
+# load_test.py
+# End-to-end load test of "scan a receipt, save every item" against recorded API traffic
+#
+# Record once (needs GOOGLE_API_KEY and network):
+#   python load_test.py --receipt receipt.jpg --cassette cassettes/receipt.json --mode record
+# Replay offline, as often as needed:
+#   python load_test.py --receipt receipt.jpg --cassette cassettes/receipt.json --items 40 --runs 5 --latency 0.8
+import argparse
+import cProfile
+import os
+import pstats
+import shutil
+import statistics
+import tempfile
+import time
+
+import api_cassette
+
+
+def run_once(scanner, receipt_path, n_items, store):
+    """One scan + save of n_items; returns (scan_seconds, save_seconds, items_saved)"""
+    from budget_manager import BudgetManager
+    from inventory_manager import InventoryManager
+
+    start = time.perf_counter()
+    with open(receipt_path, 'rb') as f:
+        items = scanner.scan_receipt(f)
+    scan_time = time.perf_counter() - start
+
+    if isinstance(items, dict):
+        raise SystemExit(f"❌ Scan failed: {items.get('error')}")
+
+    # Repeat the receipt's lines until we have the requested number of items
+    batch = [items[i % len(items)] for i in range(n_items)] if n_items else items
+
+    inventory = InventoryManager()
+    budget = BudgetManager()
+    start = time.perf_counter()
+    for item in batch:
+        inventory.add_item(item['item'], quantity=item.get('qty', 1), price=item['price'], store=store)
+        budget.record_purchase(item['item'], item['price'], quantity=item.get('qty', 1), store=store)
+    save_time = time.perf_counter() - start
+
+    return scan_time, save_time, len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receipt scan + save load test")
+    parser.add_argument('--receipt', required=True, help="receipt image to scan")
+    parser.add_argument('--cassette', default='cassettes/receipt.json')
+    parser.add_argument('--mode', choices=['record', 'replay'], default='replay')
+    parser.add_argument('--latency', default='0',
+                        help="replay delay in seconds: 0.8, a range 0.5,1.5, or 'recorded'")
+    parser.add_argument('--items', type=int, default=40, help="items to save per run (0 = as scanned)")
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--store', default='Walmart')
+    parser.add_argument('--profile', action='store_true', help="print the top functions by cumulative time")
+    args = parser.parse_args()
+
+    latency = args.latency
+    if latency != 'recorded':
+        latency = tuple(float(x) for x in latency.split(',')) if ',' in latency else float(latency)
+
+    receipt_path = os.path.abspath(args.receipt)
+    cassette_path = os.path.abspath(args.cassette)
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    api_cassette.install(cassette_path, mode=args.mode, latency=latency)
+
+    # Fresh database in a scratch folder so runs never touch the real home.db
+    workdir = tempfile.mkdtemp(prefix='homeos_load_')
+    shutil.copy(os.path.join(repo_dir, 'defaults.json'), workdir)
+    os.chdir(workdir)
+
+    from create_db import create_database
+    from gemini_client import get_client
+    from receipt_scanner import ReceiptScanner
+
+    create_database()
+    scanner = ReceiptScanner(api_key=os.getenv('GOOGLE_API_KEY', 'replay'))
+
+    profiler = cProfile.Profile() if args.profile else None
+    results = []
+    for run in range(args.runs if args.mode == 'replay' else 1):
+        if profiler:
+            profiler.enable()
+        results.append(run_once(scanner, receipt_path, args.items, args.store))
+        if profiler:
+            profiler.disable()
+        scan_time, save_time, saved = results[-1]
+        print(f"Run {run + 1}: scan {scan_time * 1000:.0f} ms, "
+              f"save {saved} items {save_time * 1000:.0f} ms ({save_time / saved * 1000:.1f} ms/item)")
+
+    scans = [r[0] for r in results]
+    saves = [r[1] for r in results]
+    print(f"\n📊 {len(results)} runs — scan median {statistics.median(scans) * 1000:.0f} ms, "
+          f"save median {statistics.median(saves) * 1000:.0f} ms")
+    print(f"Gemini calls: {get_client(scanner.api_key).metrics_summary()}")
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import math
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+
+from ingredient_keys import normalize_ingredient
+from inventory_logic import InventoryLogic
+from meal_planner import MealPlanner
+from recipe_index import EXPIRY_BOOST, MISS_PENALTY, PANTRY_STAPLES
+from unit_converter import UnitConverter
+
+SHORTLIST = 60        # candidates considered by the local-search replace move
+TIME_BUDGET = 0.3     # seconds of local search after the greedy plan
+EARLY_BONUS = 0.01    # per day of delay, so equal plans use things sooner
+
+
+def _to_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+class MealOptimizer:
+    """
+    Schedules candidate recipes over the next N days so inventory gets
+    cooked before it expires.
+    Each inventory row is a lot holding a number of portions (quantity in its
+    unit / the item's portion size from defaults.json). Meals consume one
+    portion of each ingredient from the earliest-expiring lot still good on
+    their day. A plan scores the portions it uses, weighted like the recipe
+    index (1 + EXPIRY_BOOST / (1 + days left today)), minus MISS_PENALTY for
+    every non-staple ingredient that has to be bought.
+    A greedy pass fills the days in order, then local search swaps days and
+    replaces meals with shortlisted candidates while the score improves.
+    """
+
+    def __init__(self, db_name='home.db'):
+        self.db_name = db_name
+        self.converter = UnitConverter(InventoryLogic().rules)
+
+    def _load_inventory(self):
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT item_name, quantity, unit, expiry_date FROM inventory
+        WHERE status = 'In Stock' AND quantity > 0
+        ''')
+        rows = cursor.fetchall()
+        conn.close()
+        return rows
+
+    def _portions(self, key, quantity, unit):
+        """How many one-meal portions a lot of quantity x unit holds"""
+        purchase_unit, (dimension, package) = self.converter.purchase_unit(key)
+        portion_amount, portion_unit = self.converter.default_portion(key)
+        per_portion = self.converter.factor_to(key, portion_unit, dimension)
+        if not per_portion:
+            return max(1, int(quantity))
+
+        clean = self.converter.clean_unit(unit)
+        per_unit = package if clean in ('unit', purchase_unit) else self.converter.factor_to(key, clean, dimension)
+        if not per_unit:
+            return max(1, int(quantity))
+        return max(1, int(quantity * per_unit / (portion_amount * per_portion) + 1e-9))
+
+    def _build(self, candidates, inventory, start_date):
+        """Lots, their expiry offsets and each candidate's ingredient keys"""
+        lots_by_key = {}
+        capacity, expiry = [], []
+        for item_name, quantity, unit, expiry_date in inventory:
+            key = normalize_ingredient(item_name)
+            if not key:
+                continue
+            expires = _to_date(expiry_date)
+            lot = len(capacity)
+            capacity.append(self._portions(key, quantity or 0, unit))
+            expiry.append((expires - start_date).days if expires else math.inf)
+            lots_by_key.setdefault(key, []).append(lot)
+
+        # First-expiring lot first (FEFO)
+        for lots in lots_by_key.values():
+            lots.sort(key=lambda lot: expiry[lot])
+
+        recipe_keys = []
+        for recipe in candidates:
+            keys = dict.fromkeys(normalize_ingredient(i if isinstance(i, str) else i.get('name', ''))
+                                 for i in recipe.get('ingredients', []))
+            recipe_keys.append([k for k in keys if k and (k in lots_by_key or k not in PANTRY_STAPLES)])
+
+        return lots_by_key, capacity, expiry, recipe_keys
+
+    def optimize(self, candidates, days=7, start_date=None, meal_types=('dinner',),
+                 inventory=None, time_budget=TIME_BUDGET):
+        """
+        Best schedule of candidates for the next `days` days
+        candidates: recipe dicts with 'title' (or 'recipe_name') and 'ingredients';
+                    'recipe_id' is kept for Spoonacular recipes
+        inventory: (item_name, quantity, unit, expiry_date) rows; read from the database if None
+        Returns: list of meal dicts {date, meal_type, recipe_id, recipe_name, ingredients,
+                 uses, missing} in date order, one per (day, meal type)
+        """
+        start_date = _to_date(start_date) or datetime.now().date()
+        if inventory is None:
+            inventory = self._load_inventory()
+        if not candidates:
+            return []
+
+        lots_by_key, capacity, expiry, recipe_keys = self._build(candidates, inventory, start_date)
+        slot_days = [day for day in range(days) for _ in meal_types]
+        n_slots = min(len(slot_days), len(candidates))
+        slot_days = slot_days[:n_slots]
+
+        def weight(lot, day):
+            # Urgency is fixed by the lot's expiry; the small day term only
+            # breaks ties toward cooking sooner
+            return 1 + EXPIRY_BOOST / (1 + max(expiry[lot], 0)) - EARLY_BONUS * day
+
+        def take(remaining, key, day):
+            """Lot a portion of key comes from on day, or None"""
+            for lot in lots_by_key.get(key, ()):
+                if remaining[lot] > 0 and expiry[lot] >= day:
+                    return lot
+            return None
+
+        def evaluate(plan):
+            remaining = list(capacity)
+            score = 0.0
+            for day, r in zip(slot_days, plan):
+                for key in recipe_keys[r]:
+                    lot = take(remaining, key, day)
+                    if lot is None:
+                        score -= MISS_PENALTY
+                    else:
+                        remaining[lot] -= 1
+                        score += weight(lot, day)
+            return score
+
+        # Greedy: fill slots in date order with the best remaining candidate
+        remaining = list(capacity)
+        unused = set(range(len(candidates)))
+        plan = []
+        for day in slot_days:
+            best, best_gain = None, -math.inf
+            for r in unused:
+                gain = 0.0
+                for key in recipe_keys[r]:
+                    lot = take(remaining, key, day)
+                    gain += -MISS_PENALTY if lot is None else weight(lot, day)
+                if gain > best_gain or (gain == best_gain and r < best):
+                    best, best_gain = r, gain
+            plan.append(best)
+            unused.discard(best)
+            for key in recipe_keys[best]:
+                lot = take(remaining, key, day)
+                if lot is not None:
+                    remaining[lot] -= 1
+
+        # Local search: swap two days or replace a meal with a shortlisted candidate
+        def best_weight(key):
+            good = [lot for lot in lots_by_key.get(key, ()) if expiry[lot] >= 0]
+            return weight(good[0], 0) if good else -MISS_PENALTY
+
+        static = {r: sum(best_weight(k) for k in recipe_keys[r]) for r in unused}
+        shortlist = sorted(unused, key=lambda r: (-static[r], r))[:SHORTLIST]
+        score = evaluate(plan)
+        deadline = time.perf_counter() + time_budget
+        improved = True
+        while improved and time.perf_counter() < deadline:
+            improved = False
+            for s in range(n_slots):
+                for t in range(s + 1, n_slots):
+                    plan[s], plan[t] = plan[t], plan[s]
+                    new = evaluate(plan)
+                    if new > score + 1e-9:
+                        score, improved = new, True
+                    else:
+                        plan[s], plan[t] = plan[t], plan[s]
+                for i, r in enumerate(shortlist):
+                    if time.perf_counter() >= deadline:
+                        break
+                    old = plan[s]
+                    plan[s] = r
+                    new = evaluate(plan)
+                    if new > score + 1e-9:
+                        score, improved = new, True
+                        shortlist[i] = old
+                    else:
+                        plan[s] = old
+
+        return self._describe(plan, slot_days, candidates, recipe_keys, lots_by_key,
+                              capacity, expiry, start_date, meal_types)
+
+    def _describe(self, plan, slot_days, candidates, recipe_keys, lots_by_key,
+                  capacity, expiry, start_date, meal_types):
+        remaining = list(capacity)
+        meals = []
+        for slot, (day, r) in enumerate(zip(slot_days, plan)):
+            recipe = candidates[r]
+            uses, missing = [], []
+            for key in recipe_keys[r]:
+                lot = next((lot for lot in lots_by_key.get(key, ())
+                            if remaining[lot] > 0 and expiry[lot] >= day), None)
+                if lot is None:
+                    missing.append(key)
+                else:
+                    remaining[lot] -= 1
+                    uses.append(key)
+            meals.append({
+                'date': start_date + timedelta(days=day),
+                'meal_type': meal_types[slot % len(meal_types)],
+                'recipe_id': recipe.get('recipe_id'),
+                'recipe_name': recipe.get('title') or recipe.get('recipe_name'),
+                'recipe_image': recipe.get('image'),
+                'ingredients': recipe.get('ingredients', []),
+                'uses': uses,
+                'missing': missing
+            })
+        return meals
+
+    def schedule(self, candidates, days=7, start_date=None, meal_types=('dinner',), api_key=None):
+        """
+        Optimize a plan and write it to the meal calendar in one transaction
+        Returns: (meal ids, plan)
+        """
+        plan = self.optimize(candidates, days=days, start_date=start_date, meal_types=meal_types)
+        batch = [{k: meal[k] for k in ('date', 'meal_type', 'recipe_id', 'recipe_name',
+                                       'recipe_image', 'ingredients')}
+                 for meal in plan]
+        meal_ids = MealPlanner(self.db_name, api_key=api_key).add_meals(batch)
+        return meal_ids, plan
+
+
+# Example usage
+if __name__ == "__main__":
+    from recipe_index import load_default_index
+
+    optimizer = MealOptimizer()
+    index = load_default_index()
+    candidates = index.recipes if index else [
+        {'title': 'Spinach Omelette', 'ingredients': ['eggs', 'spinach', 'cheese']},
+        {'title': 'Chicken Rice Bowl', 'ingredients': ['chicken', 'rice', 'spinach']},
+        {'title': 'Milk Pasta Bake', 'ingredients': ['pasta', 'milk', 'cheese']},
+    ]
+
+    for meal in optimizer.optimize(candidates, days=3):
+        print(f"{meal['date']} {meal['meal_type']}: {meal['recipe_name']} "
+              f"(uses {', '.join(meal['uses']) or '-'}; buy {', '.join(meal['missing']) or '-'})")
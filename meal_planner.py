@@ -1,43 +1,170 @@
 import sqlite3
 import json
-import requests
 from datetime import datetime, timedelta
+from recipe_cache import RecipeCache
+from db_migrations import migrate, meal_ingredient_rows
+from ingredient_matcher import IngredientMatcher
+from ingredient_keys import normalize_ingredient
+from unit_converter import UnitConverter, parse_ingredient
+
+
+def _as_date(value):
+    """date from a date or an ISO 'YYYY-MM-DD...' string"""
+    if isinstance(value, str):
+        return datetime.strptime(value[:10], '%Y-%m-%d').date()
+    return value
 
 class MealPlanner:
     def __init__(self, db_name='home.db', api_key=None):
         self.db_name = db_name
         self.api_key = api_key  # Spoonacular API key
+        migrate(db_name)
     
     def add_meal(self, date, meal_type, recipe_id=None, recipe_name=None, 
                  recipe_image=None, servings=1, ingredients=None):
         """
         Add a meal to the calendar
         meal_type: 'breakfast', 'lunch', 'dinner', 'snack'
+        ingredients: list of ingredients (or its JSON), stored one row each in meal_ingredients
         """
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
+        rows = self._prepare_meals([{
+            'date': date, 'meal_type': meal_type, 'recipe_id': recipe_id,
+            'recipe_name': recipe_name, 'recipe_image': recipe_image,
+            'servings': servings, 'ingredients': ingredients
+        }])
+        meal_id = self._insert_meals(rows)[0]
+        print(f"✅ Added {rows[0][0][3]} to {meal_type} on {date}")
+        return meal_id
+    
+    def add_meals(self, batch):
+        """
+        Add several meals at once
+        batch: list of dicts with add_meal's arguments
+        Recipe details come from the recipe cache, which fetches only the
+        missing ones, and every meal is written in one transaction.
+        Returns: list of new meal ids, in batch order
+        """
+        meal_ids = self._insert_meals(self._prepare_meals(batch))
+        print(f"✅ Added {len(meal_ids)} meals to the plan")
+        return meal_ids
+    
+    def _prepare_meals(self, batch):
+        """
+        meal_plan values and ingredient rows for each meal in batch
+        """
+        # If recipe_ids provided, fetch details from API
+        # Recipe details come from the local cache; only misses hit the API
+        details = {}
+        recipe_ids = [meal['recipe_id'] for meal in batch if str(meal.get('recipe_id') or '').isdigit()]
+        if recipe_ids:
+            try:
+                details = RecipeCache(self.db_name, self.api_key).get_many(recipe_ids)
+            except Exception as e:
+                print(f"Error fetching recipe details: {e}")
         
-        # If recipe_id provided, fetch details from API
-        if recipe_id and self.api_key:
-            recipe_details = self._fetch_recipe_details(recipe_id)
+        rows = []
+        for meal in batch:
+            recipe_id = meal.get('recipe_id')
+            recipe_name = meal.get('recipe_name')
+            recipe_image = meal.get('recipe_image')
+            ingredients = meal.get('ingredients')
+            calories = prep_time = None
+            
+            recipe_details = details.get(int(recipe_id)) if str(recipe_id or '').isdigit() else None
             if recipe_details:
                 recipe_name = recipe_details['title']
                 recipe_image = recipe_details['image']
-                ingredients = json.dumps(recipe_details['ingredients'])
+                ingredients = recipe_details['ingredients']
                 calories = recipe_details.get('calories')
                 prep_time = recipe_details.get('readyInMinutes')
+            
+            if isinstance(ingredients, str):
+                ingredients = json.loads(ingredients)
+            
+            values = (meal['date'], meal['meal_type'], recipe_id, recipe_name, recipe_image,
+                      meal.get('servings', 1), calories, prep_time)
+            ingredient_rows = [row[1:] for row in meal_ingredient_rows(None, ingredients)]
+            rows.append((values, ingredient_rows))
+        
+        return rows
+    
+    def _insert_meals(self, rows):
+        """
+        Write meals and their ingredient rows in one transaction
+        rows: list of (meal_plan values, [(position, ingredient, amount, unit, original), ...])
+        """
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        meal_ids = []
+        ingredient_rows = []
         
+        try:
+            for values, ingredients in rows:
+                cursor.execute('''
+                INSERT INTO meal_plan (date, meal_type, recipe_id, recipe_name, 
+                                       recipe_image, servings, calories, prep_time)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', values)
+                meal_id = cursor.lastrowid
+                meal_ids.append(meal_id)
+                ingredient_rows.extend((meal_id,) + tuple(row) for row in ingredients)
+            
+            cursor.executemany('''
+            INSERT INTO meal_ingredients (meal_id, position, ingredient, amount, unit, original)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', ingredient_rows)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return meal_ids
+    
+    def clone_week(self, src_start, dst_start, weeks=1):
+        """
+        Copy the 7 days of meals starting at src_start to dst_start,
+        repeated for `weeks` consecutive weeks (e.g. weeks=4 plans a month)
+        Meals keep their recipe details and ingredients, so nothing is fetched.
+        Returns: list of new meal ids
+        """
+        src_start = _as_date(src_start)
+        dst_start = _as_date(dst_start)
+        
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
         cursor.execute('''
-        INSERT INTO meal_plan (date, meal_type, recipe_id, recipe_name, 
-                               recipe_image, servings, ingredients, calories, prep_time)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (date, meal_type, recipe_id, recipe_name, recipe_image, 
-              servings, ingredients, calories if 'calories' in locals() else None,
-              prep_time if 'prep_time' in locals() else None))
+        SELECT id, date, meal_type, recipe_id, recipe_name, recipe_image, 
+               servings, calories, prep_time
+        FROM meal_plan
+        WHERE date BETWEEN ? AND ?
+        ORDER BY date, id
+        ''', (src_start, src_start + timedelta(days=6)))
+        meals = cursor.fetchall()
         
-        conn.commit()
+        cursor.execute('''
+        SELECT mi.meal_id, mi.position, mi.ingredient, mi.amount, mi.unit, mi.original
+        FROM meal_ingredients mi
+        JOIN meal_plan mp ON mp.id = mi.meal_id
+        WHERE mp.date BETWEEN ? AND ?
+        ORDER BY mi.meal_id, mi.position
+        ''', (src_start, src_start + timedelta(days=6)))
+        ingredients = {}
+        for row in cursor.fetchall():
+            ingredients.setdefault(row[0], []).append(row[1:])
         conn.close()
-        print(f"✅ Added {recipe_name} to {meal_type} on {date}")
+        
+        rows = []
+        for week in range(weeks):
+            shift = (dst_start - src_start) + timedelta(days=7 * week)
+            for meal in meals:
+                date = _as_date(meal[1]) + shift
+                rows.append(((date,) + tuple(meal[2:]), ingredients.get(meal[0], [])))
+        
+        meal_ids = self._insert_meals(rows)
+        print(f"✅ Copied {len(meals)} meals into {weeks} week(s) from {dst_start}")
+        return meal_ids
     
     def get_week_plan(self, start_date=None):
         """
@@ -52,45 +179,51 @@ class MealPlanner:
         cursor = conn.cursor()
         
         cursor.execute('''
-        SELECT date, meal_type, recipe_name, recipe_image, servings, 
-               ingredients, calories, prep_time
-        FROM meal_plan
-        WHERE date BETWEEN ? AND ?
-        ORDER BY date, 
-                 CASE meal_type 
+        SELECT mp.id, mp.date, mp.meal_type, mp.recipe_name, mp.recipe_image, mp.servings, 
+               mp.calories, mp.prep_time, mi.original
+        FROM meal_plan mp
+        LEFT JOIN meal_ingredients mi ON mi.meal_id = mp.id
+        WHERE mp.date BETWEEN ? AND ?
+        ORDER BY mp.date, 
+                 CASE mp.meal_type 
                      WHEN 'breakfast' THEN 1 
                      WHEN 'lunch' THEN 2 
                      WHEN 'dinner' THEN 3 
                      WHEN 'snack' THEN 4 
-                 END
+                 END,
+                 mp.id, mi.position
         ''', (start_date, end_date))
         
-        meals = cursor.fetchall()
+        rows = cursor.fetchall()
         conn.close()
         
-        # Organize by day
+        # Organize by day, one entry per meal with its ingredients in planned order
         week_plan = {}
-        for meal in meals:
-            date = meal[0]
-            if date not in week_plan:
-                week_plan[date] = []
-            
-            week_plan[date].append({
-                'meal_type': meal[1],
-                'recipe_name': meal[2],
-                'recipe_image': meal[3],
-                'servings': meal[4],
-                'ingredients': json.loads(meal[5]) if meal[5] else [],
-                'calories': meal[6],
-                'prep_time': meal[7]
-            })
+        meals = {}
+        for meal_id, date, meal_type, name, image, servings, calories, prep_time, ingredient in rows:
+            if meal_id not in meals:
+                meals[meal_id] = {
+                    'meal_type': meal_type,
+                    'recipe_name': name,
+                    'recipe_image': image,
+                    'servings': servings,
+                    'ingredients': [],
+                    'calories': calories,
+                    'prep_time': prep_time
+                }
+                week_plan.setdefault(date, []).append(meals[meal_id])
+            if ingredient is not None:
+                meals[meal_id]['ingredients'].append(ingredient)
         
         return week_plan
     
-    def generate_shopping_list_from_plan(self, start_date=None, days=7):
+    def get_shopping_requirements(self, start_date=None, days=7):
         """
-        Generate shopping list from meal plan
-        Checks what's already in inventory
+        Net ingredient requirements of the meal plan against inventory
+        Planned amounts are converted to each item's purchase unit and
+        on-hand stock is subtracted; only real shortfalls are returned.
+        Returns: list of dicts {item, name, needed, on_hand, shortfall, quantity, unit};
+        name is the ingredient as planned, for display, unless it is a known item
         """
         if not start_date:
             start_date = datetime.now().date()
@@ -102,106 +235,114 @@ class MealPlanner:
         
         # Get all ingredients from planned meals
         cursor.execute('''
-        SELECT ingredients FROM meal_plan
-        WHERE date BETWEEN ? AND ?
+        SELECT mi.ingredient, mi.amount, mi.unit, mi.original
+        FROM meal_plan mp
+        JOIN meal_ingredients mi ON mi.meal_id = mp.id
+        WHERE mp.date BETWEEN ? AND ?
         ''', (start_date, end_date))
-        
-        all_ingredients = []
-        for row in cursor.fetchall():
-            if row[0]:
-                ingredients = json.loads(row[0])
-                all_ingredients.extend(ingredients)
+        all_ingredients = cursor.fetchall()
         
         # Check what's in inventory
         cursor.execute('''
-        SELECT item_name, quantity FROM inventory
+        SELECT item_name, quantity, unit FROM inventory
         WHERE status = 'In Stock'
         ''')
+        stock = cursor.fetchall()
+        conn.close()
         
-        inventory_items = {row[0]: row[1] for row in cursor.fetchall()}
-        
-        # Determine what needs to be bought
-        shopping_needed = {}
-        for ingredient in all_ingredients:
-            ingredient_lower = ingredient.lower()
-            
-            # Check if we have it in inventory
-            found_in_inventory = False
-            for item_name, qty in inventory_items.items():
-                if item_name in ingredient_lower or ingredient_lower in item_name:
-                    if qty > 0:
-                        found_in_inventory = True
-                        break
-            
-            if not found_in_inventory:
-                # Add to shopping list
-                shopping_needed[ingredient] = shopping_needed.get(ingredient, 0) + 1
-        
-        # Add to shopping_list table
-        for item, count in shopping_needed.items():
-            # Check if already in shopping list
-            cursor.execute("SELECT id FROM shopping_list WHERE item_name = ?", (item,))
-            if not cursor.fetchone():
-                cursor.execute('''
-                INSERT INTO shopping_list (item_name, is_urgent)
-                VALUES (?, 0)
-                ''', (item,))
+        matcher = IngredientMatcher([(name, qty) for name, qty, _ in stock])
+        converter = UnitConverter(matcher.logic.rules)
         
-        conn.commit()
-        conn.close()
+        # Planned amounts keyed by the inventory item they draw from
+        planned = []
+        labels = {}
+        for name, amount, unit, original in all_ingredients:
+            key = matcher.match(name) or matcher.normalize(name)
+            if amount is None:
+                amount, unit = converter.default_portion(key)
+            planned.append((key, amount, unit))
+            if key not in converter.rules and original:
+                labels.setdefault(key, parse_ingredient(original)[0].split(',')[0].strip().lower())
         
-        print(f"✅ Added {len(shopping_needed)} items to shopping list")
-        return list(shopping_needed.keys())
+        on_hand = [(matcher.normalize(name), qty, unit) for name, qty, unit in stock]
+        requirements = converter.net_requirements(planned, on_hand)
+        for need in requirements:
+            need['name'] = labels.get(need['item']) or need['item']
+        return requirements
     
-    def _fetch_recipe_details(self, recipe_id):
+    def generate_shopping_list_from_plan(self, start_date=None, days=7):
         """
-        Fetch recipe details from Spoonacular API
+        Generate shopping list from meal plan
+        Checks what's already in inventory and lists only the shortfall,
+        with an estimated quantity in the item's purchase unit
         """
-        if not self.api_key:
-            return None
+        shopping_needed = self.get_shopping_requirements(start_date, days)
+        rows = [(need['quantity'], need['unit'], need['name']) for need in shopping_needed]
         
-        try:
-            url = f"https://api.spoonacular.com/recipes/{recipe_id}/information"
-            params = {
-                'apiKey': self.api_key,
-                'includeNutrition': True
-            }
-            
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                
-                # Extract ingredient names
-                ingredients = [ing['name'] for ing in data.get('extendedIngredients', [])]
-                
-                # Get nutrition info
-                calories = None
-                if 'nutrition' in data and 'nutrients' in data['nutrition']:
-                    for nutrient in data['nutrition']['nutrients']:
-                        if nutrient['name'] == 'Calories':
-                            calories = nutrient['amount']
-                            break
-                
-                return {
-                    'title': data.get('title'),
-                    'image': data.get('image'),
-                    'ingredients': ingredients,
-                    'calories': calories,
-                    'readyInMinutes': data.get('readyInMinutes')
-                }
-        except Exception as e:
-            print(f"Error fetching recipe details: {e}")
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
         
-        return None
+        # Refresh quantities of items already listed, add the rest, in one transaction
+        cursor.executemany('''
+        UPDATE shopping_list SET quantity = ?, unit = ? WHERE item_name = ?
+        ''', rows)
+        cursor.executemany('''
+        INSERT INTO shopping_list (item_name, is_urgent, quantity, unit)
+        SELECT ?, 0, ?, ?
+        WHERE NOT EXISTS (SELECT 1 FROM shopping_list WHERE item_name = ?)
+        ''', [(item, qty, unit, item) for qty, unit, item in rows])
+        
+        conn.commit()
+        conn.close()
+        
+        print(f"✅ Added {len(shopping_needed)} items to shopping list")
+        return [need['name'] for need in shopping_needed]
     
     def delete_meal(self, meal_id):
         """Remove a meal from the plan"""
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
+        cursor.execute("DELETE FROM meal_ingredients WHERE meal_id = ?", (meal_id,))
         cursor.execute("DELETE FROM meal_plan WHERE id = ?", (meal_id,))
         conn.commit()
         conn.close()
     
+    def find_meals_using(self, ingredient, start_date=None, end_date=None):
+        """
+        Planned meals that use an ingredient, e.g. "spinach"
+        Matches on the normalized item name, so "Baby Spinach" counts too.
+        Returns: list of dicts {id, date, meal_type, recipe_name, amount, unit}
+        """
+        key = normalize_ingredient(ingredient)
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        
+        query = '''
+        SELECT mp.id, mp.date, mp.meal_type, mp.recipe_name, mi.amount, mi.unit
+        FROM meal_ingredients mi
+        JOIN meal_plan mp ON mp.id = mi.meal_id
+        WHERE mi.ingredient = ?
+        '''
+        params = [key]
+        if start_date:
+            query += ' AND mp.date >= ?'
+            params.append(start_date)
+        if end_date:
+            query += ' AND mp.date <= ?'
+            params.append(end_date)
+        cursor.execute(query + ' ORDER BY mp.date, mp.id', params)
+        
+        meals = [{
+            'id': row[0],
+            'date': row[1],
+            'meal_type': row[2],
+            'recipe_name': row[3],
+            'amount': row[4],
+            'unit': row[5]
+        } for row in cursor.fetchall()]
+        conn.close()
+        return meals
+    
     def get_nutrition_summary(self, date):
         """
         Get total nutrition for a specific day
@@ -236,4 +377,7 @@ if __name__ == "__main__":
     
     # Get week plan
     week = planner.get_week_plan()
-    print(f"\nMeal plan: {week}")
\ No newline at end of file
+    print(f"\nMeal plan: {week}")
+    
+    # Which planned meals use chicken?
+    print(planner.find_meals_using('chicken'))
\ No newline at end of file
@@ -0,0 +1,245 @@
+import re
+import sqlite3
+import time
+import numpy as np
+
+# Column order of the matrix (all values per 100g, sodium in mg)
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'sugar', 'sodium')
+COLUMNS = f'id, item_name, {", ".join(NUTRIENTS)}, last_updated'
+# Seconds a name with no match is trusted before the table is checked again
+MISS_TTL = 60
+
+
+def _normalize(name):
+    """"Olive-Oil " -> "olive oil": case, punctuation and spacing don't matter"""
+    return ' '.join(re.sub(r'[\W_]+', ' ', name.casefold()).split())
+
+
+class NutrientMatrix:
+    """
+    In-memory float32 copy of nutrition_data.
+    Rows are items (indexed by nutrition_data.id), columns are NUTRIENTS.
+    Meal and day totals are a single gather + dot product instead of
+    one SQL query and seven additions per ingredient.
+    """
+
+    def __init__(self, db_name='home.db'):
+        self.db_name = db_name
+        self._loaded = False
+        self._values = np.zeros((0, len(NUTRIENTS)), dtype=np.float32)
+        self._ids = []          # row -> nutrition_data.id
+        self._names = []        # row -> lowercased item_name
+        self._stamps = []       # row -> recency rank (higher = newer)
+        self._row_by_id = {}    # nutrition_data.id -> row
+        self._by_name = {}      # lowercased item_name -> newest row with it
+        self._by_key = {}       # _normalize(item_name) -> newest row with it
+        self._resolved = {}     # lookup name -> row (or None)
+        self._misses_expire = 0 # time.time() after which None entries are re-checked
+        self._next_stamp = 0
+        self._max_id = 0        # high-water marks of what has been read from the table
+        self._max_updated = ''
+
+    def load(self):
+        """
+        Load every nutrition_data row in one query
+        """
+        self._values = np.zeros((0, len(NUTRIENTS)), dtype=np.float32)
+        self._ids, self._names, self._stamps = [], [], []
+        self._row_by_id, self._by_name, self._by_key = {}, {}, {}
+        self._resolved = {}
+        self._misses_expire = 0
+        self._next_stamp = 0
+        self._max_id, self._max_updated = 0, ''
+        self._read('1')
+        self._loaded = True
+
+    def _read(self, where, params=()):
+        """
+        Append the nutrition_data rows matching where, oldest first,
+        and move the high-water marks past them
+        """
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute(f'''
+        SELECT {COLUMNS}
+        FROM nutrition_data
+        WHERE {where}
+        ORDER BY last_updated ASC, id ASC
+        ''', params)
+        rows = cursor.fetchall()
+        conn.close()
+
+        for row in rows:
+            self._max_id = max(self._max_id, row[0])
+            if row[-1] is not None:
+                self._max_updated = max(self._max_updated, str(row[-1]))
+        if rows:
+            self._append([row[:-1] for row in rows])
+
+    def _append(self, rows):
+        """Add (id, item_name, *nutrients) rows, replacing rows with the same id"""
+        new_values = []
+        for row in rows:
+            item_id, item_name = row[0], row[1]
+            name = (item_name or '').lower()
+            values = [v if v is not None else 0 for v in row[2:]]
+            stamp = self._next_stamp
+            self._next_stamp += 1
+
+            if item_id in self._row_by_id:
+                idx = self._row_by_id[item_id]
+                self._values[idx] = values
+                self._unindex(idx)
+                self._forget(lambda key, row: row == idx)
+                self._names[idx] = name
+                self._stamps[idx] = stamp
+            else:
+                idx = len(self._ids)
+                self._row_by_id[item_id] = idx
+                self._ids.append(item_id)
+                self._names.append(name)
+                self._stamps.append(stamp)
+                new_values.append(values)
+
+            # Stamps only grow, so the row just added is the newest for its name
+            self._by_name[name] = idx
+            normalized = _normalize(name)
+            self._by_key[normalized] = idx
+            # A new or newer row can change which row a matching name resolves to
+            self._forget(lambda key, row: key in name or _normalize(key) == normalized)
+
+        if new_values:
+            self._values = np.vstack([self._values, np.asarray(new_values, dtype=np.float32)])
+
+    def _forget(self, affected):
+        """Drop resolved names for which affected(key, row) is true"""
+        for key in [k for k, row in self._resolved.items() if affected(k, row)]:
+            del self._resolved[key]
+
+    def _unindex(self, idx):
+        """
+        Forget the name index entries pointing at row idx before it is renamed.
+        An older row with the same name is then found by the scan in _match.
+        """
+        name = self._names[idx]
+        if self._by_name.get(name) == idx:
+            del self._by_name[name]
+        key = _normalize(name)
+        if self._by_key.get(key) == idx:
+            del self._by_key[key]
+
+    def upsert(self, item_id, item_name, **nutrients):
+        """
+        Keep the matrix in sync after a write to nutrition_data
+        """
+        if not self._loaded:
+            return
+        self._append([(item_id, item_name) + tuple(nutrients.get(n, 0) for n in NUTRIENTS)])
+
+    def invalidate(self):
+        """Drop the in-memory copy; the next lookup reloads it"""
+        self._loaded = False
+
+    def _match(self, name):
+        """
+        Most recently updated row named exactly name (ignoring case and
+        punctuation), else the same rule as get_nutrition_info's
+        LIKE '%name%': most recently updated row whose item_name contains it
+        """
+        if name in self._by_name:
+            return self._by_name[name]
+        key = _normalize(name)
+        if key in self._by_key:
+            return self._by_key[key]
+
+        best, best_stamp = None, -1
+        for idx, item_name in enumerate(self._names):
+            if name in item_name and self._stamps[idx] > best_stamp:
+                best, best_stamp = idx, self._stamps[idx]
+        return best
+
+    def resolve(self, names):
+        """
+        Map ingredient names to matrix rows.
+        Returns a list of row indices (None where nothing matches).
+        Names not found in memory are re-checked against the database
+        with a single query before being reported as misses; misses are
+        then remembered for MISS_TTL seconds or until a matching row is written.
+        """
+        if not self._loaded:
+            self.load()
+
+        now = time.time()
+        if now >= self._misses_expire:
+            self._forget(lambda key, row: row is None)
+
+        keys = [n.lower().strip() for n in names]
+        pending = [k for k in dict.fromkeys(keys) if k not in self._resolved]
+
+        misses = []
+        for key in pending:
+            row = self._match(key)
+            if row is None:
+                misses.append(key)
+            else:
+                self._resolved[key] = row
+
+        if misses:
+            self._fetch_misses()
+            self._misses_expire = now + MISS_TTL
+            # New rows may have dropped other resolved names too, so match every key again
+            for key in dict.fromkeys(keys):
+                if key not in self._resolved:
+                    self._resolved[key] = self._match(key)
+
+        return [self._resolved.get(k) for k in keys]
+
+    def _fetch_misses(self):
+        """
+        Pick up every row other processes added or updated since the last read,
+        in one query however many names missed. New ids are past _max_id;
+        updates set last_updated, and rows stamped in the same second as
+        _max_updated are read again (replacing a row by id is harmless).
+        """
+        self._read("id > ? OR last_updated >= ?", (self._max_id, self._max_updated))
+
+    def totals(self, rows, amounts):
+        """
+        Sum nutrients for matrix rows scaled by amounts (grams, values are per 100g).
+        Rows that are None are skipped.
+        Returns a float32 vector in NUTRIENTS order.
+        """
+        pairs = [(r, a) for r, a in zip(rows, amounts) if r is not None]
+        if not pairs:
+            return np.zeros(len(NUTRIENTS), dtype=np.float32)
+
+        idx = np.fromiter((r for r, _ in pairs), dtype=np.intp, count=len(pairs))
+        scale = np.fromiter((a for _, a in pairs), dtype=np.float32, count=len(pairs)) / 100
+        return scale @ self._values[idx]
+
+    def group_totals(self, groups, rows, amounts, n_groups):
+        """
+        Like totals(), but summed per group (e.g. per day).
+        groups[i] is the output row for rows[i]; returns an (n_groups x nutrients) array.
+        """
+        out = np.zeros((n_groups, len(NUTRIENTS)), dtype=np.float32)
+        keep = [i for i, r in enumerate(rows) if r is not None]
+        if not keep:
+            return out
+
+        idx = np.asarray([rows[i] for i in keep], dtype=np.intp)
+        scale = np.asarray([amounts[i] for i in keep], dtype=np.float32) / 100
+        group_idx = np.asarray([groups[i] for i in keep], dtype=np.intp)
+        np.add.at(out, group_idx, self._values[idx] * scale[:, None])
+        return out
+
+    def as_dict(self, vector):
+        """Turn a NUTRIENTS-ordered vector into the usual nutrition dict"""
+        # float32 keeps ~7 significant digits; round off the representation noise
+        return {name: round(float(value), 4) for name, value in zip(NUTRIENTS, vector)}
+
+    def row_info(self, row):
+        """Nutrition dict for a single matrix row"""
+        info = self.as_dict(self._values[row])
+        info['id'] = self._ids[row]
+        return info
@@ -1,8 +1,6 @@
 # nutrition_engine.py
 # Gemini-powered nutrition lookup and meal suggestions
-import requests
-import json
-import streamlit as st
+from gemini_client import GeminiError, get_client
 
 def get_nutrition_for_items(item_names, lang='en'):
     """
@@ -13,8 +11,8 @@ def get_nutrition_for_items(item_names, lang='en'):
         return {}
 
     try:
-        api_key = st.secrets["GOOGLE_API_KEY"]
-    except:
+        client = get_client()
+    except GeminiError:
         return {}
 
     items_str = ", ".join(item_names[:20])  # cap at 20
@@ -35,20 +33,9 @@ Rules:
 - emoji should match the food
 - Return ONLY JSON, no markdown, no explanation"""
 
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key={api_key}"
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.1}
-    }
-
     try:
-        r = requests.post(url, json=payload, timeout=15)
-        raw = r.json()['candidates'][0]['content']['parts'][0]['text'].strip()
-        if "```" in raw:
-            raw = raw.split("```")[1]
-            if raw.startswith("json"): raw = raw[4:]
-        return json.loads(raw.strip())
-    except:
+        return client.generate_json(prompt, temperature=0.1, timeout=15, coalesce=True)
+    except Exception:
         return {}
 
 
@@ -59,8 +46,8 @@ def suggest_portions_for_goals(inventory_items, goals, lang='en'):
     Returns a meal suggestion with portions.
     """
     try:
-        api_key = st.secrets["GOOGLE_API_KEY"]
-    except:
+        client = get_client()
+    except GeminiError:
         return {"error": "API key missing"}
 
     items_str = ", ".join([i['item_name'].replace('*','').strip() for i in inventory_items[:20]])
@@ -105,18 +92,7 @@ Return ONLY valid JSON:
 
 Only use items from the list provided. Return ONLY JSON."""
 
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key={api_key}"
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.4}
-    }
-
     try:
-        r = requests.post(url, json=payload, timeout=20)
-        raw = r.json()['candidates'][0]['content']['parts'][0]['text'].strip()
-        if "```" in raw:
-            raw = raw.split("```")[1]
-            if raw.startswith("json"): raw = raw[4:]
-        return json.loads(raw.strip())
+        return client.generate_json(prompt, temperature=0.4, timeout=20, coalesce=True)
     except Exception as e:
         return {"error": str(e)}
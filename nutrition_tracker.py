@@ -1,11 +1,16 @@
 import sqlite3
-import requests
+import pandas as pd
 from datetime import datetime, timedelta
+from nutrient_matrix import NutrientMatrix, NUTRIENTS
+from spoonacular_client import get_client
+from db_migrations import migrate
 
 class NutritionTracker:
     def __init__(self, db_name='home.db', api_key=None):
         self.db_name = db_name
         self.api_key = api_key  # Spoonacular API key for nutrition lookup
+        migrate(db_name)
+        self.matrix = NutrientMatrix(db_name)
     
     def add_nutrition_data(self, item_name, serving_size, calories, protein=0, 
                           carbs=0, fat=0, fiber=0, sugar=0, sodium=0, source='manual'):
@@ -27,6 +32,7 @@ class NutritionTracker:
                 fiber=?, sugar=?, sodium=?, source=?, last_updated=CURRENT_TIMESTAMP
             WHERE item_name=?
             ''', (serving_size, calories, protein, carbs, fat, fiber, sugar, sodium, source, item_name))
+            item_id = existing[0]
         else:
             # Insert new
             cursor.execute('''
@@ -34,9 +40,13 @@ class NutritionTracker:
             (item_name, serving_size, calories, protein, carbs, fat, fiber, sugar, sodium, source)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (item_name, serving_size, calories, protein, carbs, fat, fiber, sugar, sodium, source))
+            item_id = cursor.lastrowid
         
         conn.commit()
         conn.close()
+        
+        self.matrix.upsert(item_id, item_name, calories=calories, protein=protein, carbs=carbs,
+                           fat=fat, fiber=fiber, sugar=sugar, sodium=sodium)
         print(f"✅ Nutrition data saved for {item_name}")
     
     def lookup_nutrition_api(self, item_name):
@@ -46,64 +56,27 @@ class NutritionTracker:
         if not self.api_key:
             return None
         
-        try:
-            url = "https://api.spoonacular.com/food/ingredients/search"
-            params = {
-                'apiKey': self.api_key,
-                'query': item_name,
-                'number': 1
-            }
-            
-            response = requests.get(url, params=params)
-            if response.status_code != 200:
-                return None
-            
-            data = response.json()
-            if not data.get('results'):
-                return None
-            
-            ingredient_id = data['results'][0]['id']
-            
-            # Get nutrition info
-            url2 = f"https://api.spoonacular.com/food/ingredients/{ingredient_id}/information"
-            params2 = {
-                'apiKey': self.api_key,
-                'amount': 100,
-                'unit': 'grams'
-            }
-            
-            response2 = requests.get(url2, params=params2)
-            if response2.status_code != 200:
-                return None
-            
-            nutrition_data = response2.json()
-            nutrients = nutrition_data.get('nutrition', {}).get('nutrients', [])
-            
-            # Extract key nutrients
-            nutrient_dict = {}
-            for nutrient in nutrients:
-                nutrient_dict[nutrient['name']] = nutrient['amount']
-            
-            result = {
-                'item_name': item_name,
-                'serving_size': '100g',
-                'calories': nutrient_dict.get('Calories', 0),
-                'protein': nutrient_dict.get('Protein', 0),
-                'carbs': nutrient_dict.get('Carbohydrates', 0),
-                'fat': nutrient_dict.get('Fat', 0),
-                'fiber': nutrient_dict.get('Fiber', 0),
-                'sugar': nutrient_dict.get('Sugar', 0),
-                'sodium': nutrient_dict.get('Sodium', 0)
-            }
-            
+        result = get_client(self.api_key).lookup_nutrition(item_name)
+        if result:
             # Save to database
             self.add_nutrition_data(**result, source='api')
-            
-            return result
-            
-        except Exception as e:
-            print(f"Error fetching nutrition data: {e}")
-            return None
+        
+        return result
+    
+    def lookup_nutrition_many(self, item_names):
+        """
+        Fetch nutrition data for several items concurrently and save the matches
+        Returns: dict {item_name: result or None}
+        """
+        if not self.api_key:
+            return {name: None for name in item_names}
+        
+        results = get_client(self.api_key).lookup_many(item_names)
+        for result in results.values():
+            if result:
+                self.add_nutrition_data(**result, source='api')
+        
+        return results
     
     def get_nutrition_info(self, item_name):
         """
@@ -145,79 +118,91 @@ class NutritionTracker:
         Calculate total nutrition for a meal from ingredient list
         ingredients: list of dicts with 'name' and 'amount' (in grams)
         """
-        total = {
-            'calories': 0,
-            'protein': 0,
-            'carbs': 0,
-            'fat': 0,
-            'fiber': 0,
-            'sugar': 0,
-            'sodium': 0
-        }
+        names = [ingredient['name'] for ingredient in ingredients]
+        amounts = [ingredient.get('amount', 100) for ingredient in ingredients]  # default 100g
         
-        for ingredient in ingredients:
-            name = ingredient['name']
-            amount = ingredient.get('amount', 100)  # default 100g
-            
-            nutrition = self.get_nutrition_info(name)
-            if nutrition:
-                # Scale nutrition based on amount (assuming nutrition is per 100g)
-                scale_factor = amount / 100
-                
-                total['calories'] += nutrition['calories'] * scale_factor
-                total['protein'] += nutrition['protein'] * scale_factor
-                total['carbs'] += nutrition['carbs'] * scale_factor
-                total['fat'] += nutrition['fat'] * scale_factor
-                total['fiber'] += nutrition['fiber'] * scale_factor
-                total['sugar'] += nutrition['sugar'] * scale_factor
-                total['sodium'] += nutrition['sodium'] * scale_factor
+        rows = self._resolve_rows(names)
         
-        return total
+        # Nutrition is per 100g, so one gather + dot product scales and sums everything
+        return self.matrix.as_dict(self.matrix.totals(rows, amounts))
     
-    def get_daily_nutrition(self, date=None):
+    def _resolve_rows(self, names):
         """
-        Get total nutrition consumed for a specific day based on meal plan
+        Map ingredient names to nutrient matrix rows.
+        Names unknown to the database go to the API, which saves into nutrition_data.
         """
-        if not date:
-            date = datetime.now().date()
+        rows = self.matrix.resolve(names)
+        
+        missing = list(dict.fromkeys(n for n, r in zip(names, rows) if r is None))
+        if missing and self.api_key:
+            self.lookup_nutrition_many(missing)
+            rows = self.matrix.resolve(names)
+        
+        return rows
+    
+    def get_nutrition_series(self, start_date, end_date=None):
+        """
+        Get per-day nutrition totals for every day from start_date to end_date
+        Loads all meals in one query and resolves each distinct ingredient once.
+        Returns a DataFrame indexed by date with one column per nutrient.
+        """
+        if not end_date:
+            end_date = start_date
         
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
-        # Get meals for the day
         cursor.execute('''
-        SELECT ingredients, servings FROM meal_plan
-        WHERE date = ?
-        ''', (date,))
+        SELECT mp.date, mi.ingredient, mp.servings
+        FROM meal_plan mp
+        JOIN meal_ingredients mi ON mi.meal_id = mp.id
+        WHERE mp.date BETWEEN ? AND ?
+        ''', (start_date, end_date))
         
         meals = cursor.fetchall()
         conn.close()
         
-        total = {
-            'calories': 0,
-            'protein': 0,
-            'carbs': 0,
-            'fat': 0,
-            'fiber': 0,
-            'sugar': 0,
-            'sodium': 0
-        }
+        days = list(pd.date_range(start_date, end_date).date)
+        day_index = {day.isoformat(): i for i, day in enumerate(days)}
+        
+        # One entry per (day, ingredient) use: 100g per ingredient per serving
+        groups, names, amounts = [], [], []
+        for meal_date, ingredient, servings in meals:
+            day = day_index.get(str(meal_date)[:10])
+            if day is None:
+                continue
+            groups.append(day)
+            names.append(ingredient)
+            amounts.append(100 * (servings or 1))
+        
+        # Distinct ingredients are resolved once for the whole range
+        distinct = list(dict.fromkeys(names))
+        row_by_name = dict(zip(distinct, self._resolve_rows(distinct)))
+        rows = [row_by_name[n] for n in names]
         
-        for meal in meals:
-            if meal[0]:  # if ingredients exist
-                import json
-                ingredients = json.loads(meal[0])
-                servings = meal[1] or 1
-                
-                # Calculate nutrition for each ingredient
-                ingredient_list = [{'name': ing, 'amount': 100} for ing in ingredients]
-                meal_nutrition = self.calculate_meal_nutrition(ingredient_list)
-                
-                # Add to total (multiplied by servings)
-                for key in total.keys():
-                    total[key] += meal_nutrition[key] * servings
+        totals = self.matrix.group_totals(groups, rows, amounts, len(days))
+        return pd.DataFrame(totals.astype(float).round(4), index=pd.Index(days, name='date'),
+                            columns=list(NUTRIENTS))
+    
+    def get_daily_nutrition(self, date=None):
+        """
+        Get total nutrition consumed for a specific day based on meal plan
+        """
+        if not date:
+            date = datetime.now().date()
+        
+        series = self.get_nutrition_series(date, date)
+        return series.iloc[0].to_dict()
+    
+    def _average_daily_nutrition(self, date=None, end_date=None):
+        """
+        Nutrition for one day, or the daily average when end_date is given
+        """
+        if not date:
+            date = datetime.now().date()
         
-        return total
+        series = self.get_nutrition_series(date, end_date or date)
+        return series.mean().to_dict()
     
     def set_nutrition_goals(self, calories=2000, protein=50, carbs=250, fat=70, fiber=25):
         """
@@ -231,11 +216,12 @@ class NutritionTracker:
             'fiber': fiber
         }
     
-    def check_nutrition_goals(self, date=None):
+    def check_nutrition_goals(self, date=None, end_date=None):
         """
         Compare actual nutrition vs goals
+        With end_date, compares the average day between date and end_date
         """
-        daily_nutrition = self.get_daily_nutrition(date)
+        daily_nutrition = self._average_daily_nutrition(date, end_date)
         goals = self.set_nutrition_goals()
         
         comparison = {}
@@ -254,11 +240,12 @@ class NutritionTracker:
         
         return comparison
     
-    def get_macro_breakdown(self, date=None):
+    def get_macro_breakdown(self, date=None, end_date=None):
         """
         Get percentage breakdown of macronutrients (protein/carbs/fat)
+        With end_date, covers every day between date and end_date
         """
-        daily = self.get_daily_nutrition(date)
+        daily = self._average_daily_nutrition(date, end_date)
         
         # Calories per gram: Protein=4, Carbs=4, Fat=9
         protein_cal = daily['protein'] * 4
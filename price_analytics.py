@@ -0,0 +1,190 @@
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ingredient_matcher import item_key
+
+WINDOWS = (7, 30, 90)    # days, for rolling means and percent change
+EWMA_SPAN = 5            # purchases
+SPIKE_Z = 2.5            # |z| at or above this is a price spike
+MIN_HISTORY = 3          # earlier purchases needed before a z-score means anything
+
+# db_name -> (signature, frames); shared so every BudgetManager reuses the work
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+class PriceAnalytics:
+    """
+    Price trends and anomalies for every item at once.
+    price_history is loaded into one DataFrame sorted by item and date, and
+    each statistic is a grouped (vectorized) operation over all items:
+    rolling means over WINDOWS, an EWMA, percent change over each window,
+    per-store averages and spreads, and a z-score of each purchase against
+    the item's earlier purchases.
+    Results are cached per database until price_history gains or loses rows.
+    """
+
+    def __init__(self, db_name='home.db', windows=WINDOWS, span=EWMA_SPAN, spike_z=SPIKE_Z):
+        self.db_name = db_name
+        self.windows = tuple(windows)
+        self.span = span
+        self.spike_z = spike_z
+
+    def _signature(self, conn):
+        return conn.execute("SELECT MAX(id), COUNT(*) FROM price_history").fetchone()
+
+    def frames(self):
+        """
+        {'history': one row per purchase with rolling / ewma / z-score columns,
+         'summary': one row per item, 'stores': one row per item and store}
+        """
+        conn = sqlite3.connect(self.db_name)
+        try:
+            signature = self._signature(conn) + (self.windows, self.span, self.spike_z)
+            with _cache_lock:
+                cached = _cache.get(self.db_name)
+            if cached and cached[0] == signature:
+                return cached[1]
+
+            history = pd.read_sql_query('''
+            SELECT id, item_name, COALESCE(item_key, lower(trim(item_name))) AS item_key,
+                   price, COALESCE(store, '') AS store, date_recorded
+            FROM price_history
+            WHERE date_recorded IS NOT NULL
+            ''', conn)
+        finally:
+            conn.close()
+
+        frames = self._compute(history)
+        with _cache_lock:
+            _cache[self.db_name] = (signature, frames)
+        return frames
+
+    def _compute(self, df):
+        df['date'] = pd.to_datetime(df['date_recorded'].astype(str).str[:10], errors='coerce')
+        df = df.dropna(subset=['date']).sort_values(['item_key', 'date', 'id'], kind='stable')
+        df = df.reset_index(drop=True)
+        groups = df.groupby('item_key', sort=False)
+
+        # Rolling means over calendar windows, and an EWMA over purchases.
+        # Rows are already in group order, so results line up positionally.
+        for window in self.windows:
+            rolled = groups.rolling(f'{window}D', on='date')['price'].mean()
+            df[f'rolling_{window}d'] = rolled.to_numpy()
+        df['ewma'] = groups['price'].ewm(span=self.span, adjust=False).mean().to_numpy()
+
+        # z-score against the item's earlier purchases, from running sums
+        price = df['price']
+        n_prev = groups.cumcount()
+        prev_sum = groups['price'].cumsum() - price
+        prev_sq = (price ** 2).groupby(df['item_key'], sort=False).cumsum() - price ** 2
+        prev_mean = prev_sum / n_prev.replace(0, np.nan)
+        prev_var = (prev_sq - n_prev * prev_mean ** 2) / (n_prev - 1).replace(0, np.nan)
+        prev_std = np.sqrt(prev_var.clip(lower=0))
+        z = (price - prev_mean) / prev_std.replace(0, np.nan)
+        df['zscore'] = z.where(n_prev >= MIN_HISTORY)
+        df['spike'] = df['zscore'].abs() >= self.spike_z
+
+        # Per-item summary
+        groups = df.groupby('item_key', sort=False)
+        summary = groups.agg(
+            item_name=('item_name', 'last'),
+            current_price=('price', 'last'),
+            average_price=('price', 'mean'),
+            min_price=('price', 'min'),
+            max_price=('price', 'max'),
+            purchases=('price', 'size'),
+            last_date=('date', 'last'),
+            ewma=('ewma', 'last'),
+            last_spike=('spike', 'last')
+        )
+        for window in self.windows:
+            summary[f'rolling_{window}d'] = groups[f'rolling_{window}d'].last()
+
+        # Percent change: latest price vs the last price at least `window` days earlier
+        prices_by_date = df[['item_key', 'date', 'price']].sort_values('date', kind='stable')
+        latest = summary[['last_date', 'current_price']].reset_index()
+        for window in self.windows:
+            targets = latest.assign(target=latest['last_date'] - pd.Timedelta(days=window))
+            then = pd.merge_asof(targets.sort_values('target'), prices_by_date,
+                                 left_on='target', right_on='date', by='item_key',
+                                 direction='backward')
+            then = then.set_index('item_key')['price'].reindex(summary.index)
+            summary[f'pct_change_{window}d'] = (summary['current_price'] - then) / then * 100
+
+        # Per-store averages and the spread between cheapest and priciest store
+        stores = (df[df['store'] != '']
+                  .groupby(['item_key', 'store'])['price']
+                  .agg(avg_price='mean', min_price='min', purchases='size')
+                  .reset_index())
+        if not stores.empty:
+            by_item = stores.groupby('item_key')['avg_price']
+            stores['item_min'] = by_item.transform('min')
+            stores['item_max'] = by_item.transform('max')
+            stores['spread'] = stores['item_max'] - stores['item_min']
+            stores['spread_pct'] = stores['spread'] / stores['item_max'] * 100
+            stores['cheapest'] = stores['avg_price'] == stores['item_min']
+
+        return {'history': df, 'summary': summary, 'stores': stores}
+
+    def spikes(self, days=None):
+        """Purchases whose price is a spike for that item, newest first"""
+        history = self.frames()['history']
+        rows = history[history['spike']]
+        if days:
+            rows = rows[rows['date'] >= pd.Timestamp(datetime.now().date() - timedelta(days=days))]
+        return rows.sort_values(['date', 'id'], ascending=False)
+
+    def trend(self, item_name, days=90):
+        """
+        Price history and trends for an item, matched by normalized name or
+        substring, over the last `days` days. Same keys as before plus ewma,
+        rolling means, percent change per window, store prices and spikes.
+        """
+        frames = self.frames()
+        history = frames['history']
+        if history.empty:
+            return None
+
+        key = item_key(item_name)
+        match = (history['item_key'] == key) | history['item_name'].str.contains(item_name, case=False, regex=False)
+        since = pd.Timestamp(datetime.now().date() - timedelta(days=days))
+        records = history[match & (history['date'] >= since)].sort_values(['date', 'id'], ascending=False)
+        if records.empty:
+            return None
+
+        prices = records['price']
+        newest = records.iloc[0]
+        item = frames['summary'].loc[newest['item_key']]
+        stores = frames['stores']
+        store_rows = stores[stores['item_key'] == newest['item_key']] if not stores.empty else stores
+
+        return {
+            'item_name': item_name,
+            'current_price': float(prices.iloc[0]),
+            'average_price': float(prices.mean()),
+            'min_price': float(prices.min()),
+            'max_price': float(prices.max()),
+            'price_change': float((prices.iloc[0] - prices.iloc[-1]) / prices.iloc[-1] * 100) if len(prices) > 1 else 0,
+            'ewma': float(item['ewma']),
+            'rolling_means': {w: float(item[f'rolling_{w}d']) for w in self.windows},
+            'pct_change': {w: (None if pd.isna(item[f'pct_change_{w}d']) else float(item[f'pct_change_{w}d']))
+                           for w in self.windows},
+            'stores': sorted(set(s for s in records['store'] if s)),
+            'store_prices': {row.store: float(row.avg_price) for row in store_rows.itertuples()},
+            'spikes': [{'price': float(r.price), 'store': r.store, 'date': r.date_recorded, 'zscore': float(r.zscore)}
+                       for r in records[records['spike']].itertuples()],
+            'history': [{'price': float(r.price), 'store': r.store or None, 'date': r.date_recorded}
+                        for r in records.itertuples()]
+        }
+
+
+# Example usage
+if __name__ == "__main__":
+    analytics = PriceAnalytics()
+    print(analytics.frames()['summary'].head())
+    print(analytics.spikes(days=30)[['item_name', 'price', 'store', 'date_recorded', 'zscore']])
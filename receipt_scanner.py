@@ -2,13 +2,13 @@ import json
 import PIL.Image
 import streamlit as st
 import base64
-import requests
 import io
+from gemini_client import GeminiError, get_client, image_part
 
 class ReceiptScanner:
-    def __init__(self):
+    def __init__(self, api_key=None):
         try:
-            self.api_key = st.secrets["GOOGLE_API_KEY"]
+            self.api_key = api_key or st.secrets["GOOGLE_API_KEY"]
             self.active = True
         except Exception as e:
             self.active = False
@@ -60,42 +60,11 @@ Categories: Dairy, Meat, Produce, Bakery, Pantry, Frozen, Beverages, Snacks, Oth
 
 Return ONLY the JSON array. No markdown, no explanation, no extra text."""
 
-            url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key={self.api_key}"
-
-            payload = {
-                "contents": [{
-                    "parts": [
-                        {"text": prompt},
-                        {
-                            "inline_data": {
-                                "mime_type": "image/jpeg",
-                                "data": img_base64
-                            }
-                        }
-                    ]
-                }],
-                "generationConfig": {
-                    "temperature": 0.1  # Low temperature = more precise, less creative
-                }
-            }
-
-            response = requests.post(url, json=payload, timeout=15)
-
-            if response.status_code != 200:
-                return {"error": f"API Error {response.status_code}: {response.text[:200]}"}
-
-            result = response.json()
-            raw_text = result['candidates'][0]['content']['parts'][0]['text'].strip()
-
-            # Clean markdown if present
-            if "```" in raw_text:
-                parts = raw_text.split("```")
-                raw_text = parts[1] if len(parts) > 1 else parts[0]
-                if raw_text.startswith("json"):
-                    raw_text = raw_text[4:]
-            raw_text = raw_text.strip()
-
-            items = json.loads(raw_text)
+            items = get_client(self.api_key).generate_json(
+                [prompt, image_part(img_base64)],
+                temperature=0.1,  # Low temperature = more precise, less creative
+                timeout=15
+            )
             
             # Clean up item names — remove common store brand prefixes
             prefixes_to_remove = ["GV ", "SE ", "MM ", "EQ ", "MV ", "PL "]
@@ -118,5 +87,7 @@ Return ONLY the JSON array. No markdown, no explanation, no extra text."""
 
         except json.JSONDecodeError:
             return {"error": "Could not read receipt. Try a clearer, well-lit photo."}
+        except GeminiError as e:
+            return {"error": str(e)}
         except Exception as e:
             return {"error": f"Scan failed: {str(e)}"}
@@ -0,0 +1,59 @@
+import json
+import sqlite3
+from db_migrations import migrate
+from spoonacular_client import get_client
+
+
+class RecipeCache:
+    """
+    Spoonacular recipe details kept in the recipe_cache table.
+    Cached recipes are served without an API key or network; misses are
+    fetched together (bulk endpoint for several) and stored for next time.
+    """
+
+    def __init__(self, db_name='home.db', api_key=None):
+        self.db_name = db_name
+        self.api_key = api_key
+        migrate(db_name)
+
+    def get_many(self, recipe_ids):
+        """
+        Details for each recipe id
+        Returns: dict {recipe_id: details or None}
+        """
+        ids = list(dict.fromkeys(int(rid) for rid in recipe_ids))
+        if not ids:
+            return {}
+
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        placeholders = ','.join('?' * len(ids))
+        cursor.execute(f"SELECT recipe_id, details FROM recipe_cache WHERE recipe_id IN ({placeholders})", ids)
+        results = {rid: json.loads(details) for rid, details in cursor.fetchall()}
+        conn.close()
+
+        missing = [rid for rid in ids if rid not in results]
+        if missing and self.api_key:
+            fetched = get_client(self.api_key).get_recipes_information(missing)
+            self.put_many({rid: d for rid, d in fetched.items() if d})
+            results.update(fetched)
+
+        for rid in ids:
+            results.setdefault(rid, None)
+        return results
+
+    def get(self, recipe_id):
+        return self.get_many([recipe_id])[int(recipe_id)]
+
+    def put_many(self, details_by_id):
+        """Store fetched recipe details in one transaction"""
+        if not details_by_id:
+            return
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.executemany('''
+        INSERT OR REPLACE INTO recipe_cache (recipe_id, details)
+        VALUES (?, ?)
+        ''', [(int(rid), json.dumps(details)) for rid, details in details_by_id.items()])
+        conn.commit()
+        conn.close()
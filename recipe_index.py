@@ -0,0 +1,209 @@
+# recipe_index.py
+# Offline recipe suggestions: local corpus + inverted ingredient index
+import csv
+import json
+import os
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+
+from ingredient_keys import normalize_ingredient
+
+# Not counted as "missing" — same idea as the Gemini prompt's pantry staples rule
+PANTRY_STAPLES = {
+    'salt', 'pepper', 'black pepper', 'water', 'oil', 'olive oil', 'vegetable oil',
+    'cooking spray', 'sugar', 'flour', 'butter', 'garlic', 'vinegar'
+}
+
+EXPIRY_BOOST = 3.0     # an item expiring today counts 1 + 3 = 4x a long-life item
+MISS_PENALTY = 0.5     # cost of each non-staple ingredient the kitchen doesn't have
+
+
+def _parse_ingredient_field(value):
+    """CSV ingredient cells may hold a JSON list or a '|' / ';' separated list"""
+    if isinstance(value, list):
+        return value
+    value = (value or '').strip()
+    if value.startswith('['):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
+    sep = '|' if '|' in value else ';'
+    return [v.strip() for v in value.split(sep) if v.strip()]
+
+
+def load_recipe_corpus(path):
+    """
+    Load recipes from a .jsonl or .csv file
+    Each recipe needs a title and ingredients; id, instructions, steps,
+    time, difficulty, servings and image are optional.
+    Returns: list of recipe dicts
+    """
+    recipes = []
+    if path.endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            row['ingredients'] = _parse_ingredient_field(row.get('ingredients'))
+            if row.get('steps'):
+                row['steps'] = _parse_ingredient_field(row['steps'])
+            recipes.append(row)
+    else:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    recipes.append(json.loads(line))
+
+    cleaned = []
+    for i, recipe in enumerate(recipes):
+        if not recipe.get('title') or not recipe.get('ingredients'):
+            continue
+        ingredients = [
+            ing if isinstance(ing, str) else ing.get('name', '')
+            for ing in recipe['ingredients']
+        ]
+        recipe['ingredients'] = [ing for ing in ingredients if ing]
+        recipe.setdefault('id', i + 1)
+        cleaned.append(recipe)
+    return cleaned
+
+
+class RecipeIndex:
+    """
+    Inverted index from normalized ingredient to the recipes that use it.
+    Ranking is vectorized over the whole corpus: each inventory item adds its
+    expiry weight to every recipe in its posting list, then recipes are
+    penalized for the ingredients they would still need.
+    """
+
+    def __init__(self, recipes):
+        self.recipes = recipes
+        n = len(recipes)
+
+        self.required = np.zeros(n, dtype=np.int16)       # non-staple ingredients per recipe
+        postings = {}
+
+        for idx, recipe in enumerate(recipes):
+            terms = list(dict.fromkeys(t for t in map(normalize_ingredient, recipe['ingredients']) if t))
+            self.required[idx] = sum(1 for t in terms if t not in PANTRY_STAPLES)
+            for term in terms:
+                postings.setdefault(term, []).append(idx)
+
+        self.postings = {term: np.asarray(ids, dtype=np.int32) for term, ids in postings.items()}
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_recipe_corpus(path))
+
+    @staticmethod
+    def _expiry_weight(expiry_date, today):
+        if not expiry_date:
+            return 1.0
+        if isinstance(expiry_date, str):
+            try:
+                expiry_date = datetime.strptime(expiry_date[:10], '%Y-%m-%d').date()
+            except ValueError:
+                return 1.0
+        elif isinstance(expiry_date, datetime):
+            expiry_date = expiry_date.date()
+        days_left = max((expiry_date - today).days, 0)
+        return 1.0 + EXPIRY_BOOST / (1 + days_left)
+
+    def _inventory_weights(self, inventory, today):
+        """{term: weight} from item names or inventory rows with expiry_date"""
+        weights = {}
+        for item in inventory:
+            if isinstance(item, str):
+                name, expiry = item, None
+            else:
+                name, expiry = item.get('item_name', ''), item.get('expiry_date')
+            term = normalize_ingredient(name.replace('*', ''))
+            if term:
+                weights[term] = max(weights.get(term, 0), self._expiry_weight(expiry, today))
+        return weights
+
+    def rank(self, inventory, top_k=3, today=None):
+        """
+        Best recipes for what's on hand
+        inventory: item names, or dicts with 'item_name' and optional 'expiry_date'
+        Returns: recipe dicts in the same format as recipe_manager.suggest_recipes_from_list
+        """
+        if not self.recipes:
+            return []
+        today = today or date.today()
+        weights = self._inventory_weights(inventory, today)
+
+        n = len(self.recipes)
+        score = np.zeros(n, dtype=np.float32)
+        used_required = np.zeros(n, dtype=np.int16)
+
+        for term, weight in weights.items():
+            ids = self.postings.get(term)
+            if ids is None:
+                continue
+            score[ids] += weight
+            if term not in PANTRY_STAPLES:
+                used_required[ids] += 1
+
+        candidates = np.flatnonzero(used_required)
+        if candidates.size == 0:
+            return []
+
+        missed = self.required[candidates] - used_required[candidates]
+        final = score[candidates] - MISS_PENALTY * missed
+
+        k = min(top_k, candidates.size)
+        top = np.argpartition(-final, k - 1)[:k]
+        top = top[np.argsort(-final[top], kind='stable')]
+
+        return [self._to_result(int(candidates[i]), weights, rank) for rank, i in enumerate(top)]
+
+    def _to_result(self, idx, weights, rank):
+        recipe = self.recipes[idx]
+        used, missed = [], []
+        for ingredient, term in zip(recipe['ingredients'], map(normalize_ingredient, recipe['ingredients'])):
+            if term in weights:
+                used.append({"name": ingredient})
+            elif term and term not in PANTRY_STAPLES:
+                missed.append({"name": ingredient})
+
+        colors = ["FF6B6B", "4ECDC4", "45B7D1"]
+        name_encoded = recipe['title'].replace(' ', '+')[:20]
+        result = {
+            "id": recipe['id'],
+            "title": recipe['title'],
+            "image": recipe.get('image') or
+                     f"https://via.placeholder.com/150x100/{colors[rank % len(colors)]}/white?text={name_encoded}",
+            "usedIngredients": used,
+            "missedIngredients": missed,
+            "instructions": recipe.get('instructions', ''),
+            "time": recipe.get('time', ''),
+            "difficulty": recipe.get('difficulty', '')
+        }
+
+        # Corpus recipes with steps already carry the "Full Recipe" view
+        if recipe.get('steps'):
+            result['details'] = {
+                "title": recipe['title'],
+                "servings": recipe.get('servings', 4),
+                "time": recipe.get('time', ''),
+                "ingredients": [{"item": ing, "amount": ""} for ing in recipe['ingredients']],
+                "steps": recipe['steps'],
+                "tips": recipe.get('tips', '')
+            }
+        return result
+
+
+@lru_cache(maxsize=1)
+def load_default_index():
+    """
+    Index for the corpus at $RECIPE_CORPUS (.jsonl or .csv), built once per process.
+    Returns None when no corpus is configured.
+    """
+    path = os.getenv('RECIPE_CORPUS')
+    if not path or not os.path.exists(path):
+        return None
+    return RecipeIndex.from_file(path)
@@ -1,19 +1,96 @@
-import requests
+import copy
 import json
-import streamlit as st
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from gemini_client import GeminiError, get_client
 
-def suggest_recipes_from_list(ingredients, lang='en'):
+
+class _SuggestionCache:
+    """
+    Process-wide cache of recipe suggestions.
+    Keyed by a canonical signature of the ingredient set plus language;
+    a near-identical set (Jaccard similarity >= min_similarity) reuses the
+    closest cached entry. Entries expire after ttl seconds and the least
+    recently used entry is evicted beyond max_entries.
+    Entries are stored and returned as deep copies, so callers can edit
+    the recipes they get without changing the cache.
+    """
+
+    def __init__(self, max_entries=128, ttl=6 * 3600, min_similarity=0.8):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.min_similarity = min_similarity
+        self._entries = OrderedDict()   # (lang, frozenset) -> (expires_at, recipes)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(ingredients, lang):
+        return (lang, frozenset(i.lower().strip() for i in ingredients))
+
+    def get(self, key):
+        lang, items = key
+        now = time.time()
+        with self._lock:
+            for k in [k for k, (expires, _) in self._entries.items() if expires <= now]:
+                del self._entries[k]
+
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return copy.deepcopy(self._entries[key][1])
+
+            best, best_score = None, 0.0
+            for (k_lang, k_items) in self._entries:
+                if k_lang != lang:
+                    continue
+                union = len(items | k_items)
+                score = len(items & k_items) / union if union else 1.0
+                if score > best_score:
+                    best, best_score = (k_lang, k_items), score
+
+            if best is not None and best_score >= self.min_similarity:
+                self._entries.move_to_end(best)
+                return copy.deepcopy(self._entries[best][1])
+        return None
+
+    def put(self, key, recipes):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, copy.deepcopy(recipes))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+_suggestion_cache = _SuggestionCache()
+
+
+def _shortest_ingredients(ingredients, limit=12):
+    """
+    The limit shortest names, one per spelling, ties broken alphabetically so
+    the same fridge always gives the same subset (app.py builds the list from
+    a set, whose order changes between processes)
+    """
+    unique = {}
+    for name in sorted(ingredients):
+        unique.setdefault(name.lower().strip(), name)
+    return sorted(unique.values(), key=lambda x: (len(x), x.lower().strip(), x))[:limit]
+
+
+def suggest_recipes_from_list(ingredients, lang='en', refresh=False):
     """
     Uses Gemini to suggest recipes based on expiring ingredients.
     Returns list of recipe dicts compatible with existing app UI.
+    Answers are cached per ingredient set and language; refresh=True skips
+    the cache to get new ideas (and replaces the cached answer).
     """
     if not ingredients:
         return {"error": "No expiring ingredients found."}
 
     try:
-        api_key = st.secrets["GOOGLE_API_KEY"]
-    except Exception:
-        return {"error": "GOOGLE_API_KEY missing from Streamlit Secrets."}
+        client = get_client()
+    except GeminiError as e:
+        return {"error": str(e)}
 
     # Language-specific instructions
     if lang == 'es':
@@ -25,9 +102,15 @@ def suggest_recipes_from_list(ingredients, lang='en'):
 
     # If too many ingredients, take a smart subset
     # Prioritize shorter names (more likely to be real ingredients vs barcodes)
-    cleaned = sorted(ingredients, key=lambda x: len(x))[:12]
+    cleaned = _shortest_ingredients(ingredients)
     ingredients_str = ", ".join(cleaned)
 
+    cache_key = _suggestion_cache.signature(cleaned, lang)
+    if not refresh:
+        cached = _suggestion_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     prompt = f"""You are a helpful home cooking assistant. {language_instruction}
 
 A home cook has these ingredients that need to be used soon:
@@ -63,35 +146,8 @@ Rules:
 - Make the recipes realistic and practical for a home cook
 - Return ONLY the JSON array, no markdown, no explanation"""
 
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key={api_key}"
-
-    payload = {
-        "contents": [{
-            "parts": [{"text": prompt}]
-        }],
-        "generationConfig": {
-            "temperature": 0.7
-        }
-    }
-
     try:
-        response = requests.post(url, json=payload, timeout=20)
-
-        if response.status_code != 200:
-            return {"error": f"API Error {response.status_code}: {response.text[:200]}"}
-
-        result = response.json()
-        raw_text = result['candidates'][0]['content']['parts'][0]['text'].strip()
-
-        # Clean markdown if present
-        if "```" in raw_text:
-            parts = raw_text.split("```")
-            raw_text = parts[1] if len(parts) > 1 else parts[0]
-            if raw_text.startswith("json"):
-                raw_text = raw_text[4:]
-        raw_text = raw_text.strip()
-
-        recipes = json.loads(raw_text)
+        recipes = client.generate_json(prompt, temperature=0.7, timeout=20, coalesce=True)
 
         # Generate placeholder images with recipe name
         for i, recipe in enumerate(recipes):
@@ -100,10 +156,13 @@ Rules:
             name_encoded = recipe['title'].replace(' ', '+')[:20]
             recipe['image'] = f"https://via.placeholder.com/150x100/{color}/white?text={name_encoded}"
 
+        _suggestion_cache.put(cache_key, recipes)
         return recipes
 
     except json.JSONDecodeError:
         return {"error": "Could not parse recipe response. Try again."}
+    except GeminiError as e:
+        return {"error": str(e)}
     except Exception as e:
         return {"error": f"Recipe lookup failed: {str(e)}"}
 
@@ -114,8 +173,8 @@ def get_recipe_details(recipe_title, ingredients, lang='en'):
     Called when user wants to actually cook something.
     """
     try:
-        api_key = st.secrets["GOOGLE_API_KEY"]
-    except Exception:
+        client = get_client()
+    except GeminiError:
         return {"error": "API key missing."}
 
     if lang == 'es':
@@ -125,7 +184,7 @@ def get_recipe_details(recipe_title, ingredients, lang='en'):
 
     # If too many ingredients, take a smart subset
     # Prioritize shorter names (more likely to be real ingredients vs barcodes)
-    cleaned = sorted(ingredients, key=lambda x: len(x))[:12]
+    cleaned = _shortest_ingredients(ingredients)
     ingredients_str = ", ".join(cleaned)
 
     prompt = f"""{language_instruction}
@@ -151,21 +210,57 @@ Return ONLY valid JSON:
 
 Return ONLY the JSON, no markdown."""
 
-    url = f"https://generativelanguage.googleapis.com/v1/models/gemini-2.0-flash:generateContent?key={api_key}"
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {"temperature": 0.3}
-    }
-
     try:
-        response = requests.post(url, json=payload, timeout=20)
-        result = response.json()
-        raw_text = result['candidates'][0]['content']['parts'][0]['text'].strip()
-        if "```" in raw_text:
-            parts = raw_text.split("```")
-            raw_text = parts[1] if len(parts) > 1 else parts[0]
-            if raw_text.startswith("json"):
-                raw_text = raw_text[4:]
-        return json.loads(raw_text.strip())
+        return client.generate_json(prompt, temperature=0.3, timeout=20, coalesce=True)
     except Exception as e:
         return {"error": f"Could not get recipe details: {str(e)}"}
+
+
+_prefetch_pool = ThreadPoolExecutor(max_workers=6, thread_name_prefix='recipe-prefetch')
+
+
+class RecipeDetailsPrefetch:
+    """
+    Fetches get_recipe_details for every suggested recipe in the background.
+    One instance per batch of suggestions, kept in the session so opening a
+    full recipe is instant. cancel() drops the batch when new suggestions
+    replace it.
+    """
+
+    def __init__(self, recipes, ingredients, lang='en'):
+        self._cancelled = threading.Event()
+        self._futures = {}
+        for recipe in recipes:
+            title = recipe['title']
+            # Local corpus recipes already carry their details
+            if title not in self._futures and not recipe.get('details'):
+                self._futures[title] = _prefetch_pool.submit(self._fetch, title, list(ingredients), lang)
+
+    def _fetch(self, title, ingredients, lang):
+        if self._cancelled.is_set():
+            return None
+        return get_recipe_details(title, ingredients, lang=lang)
+
+    def get(self, title, timeout=None):
+        """
+        Prefetched details for a recipe, waiting up to timeout seconds if still loading.
+        Returns None if not prefetched, cancelled, failed or not ready in time.
+        """
+        future = self._futures.get(title)
+        if future is None or self._cancelled.is_set() or future.cancelled():
+            return None
+        try:
+            details = future.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+        except Exception:
+            return None
+        if not details or "error" in details:
+            return None
+        return details
+
+    def cancel(self):
+        """Stop work that has not started and ignore results still in flight"""
+        self._cancelled.set()
+        for future in self._futures.values():
+            future.cancel()
@@ -1,10 +1,34 @@
 import sqlite3
 from datetime import datetime, timedelta
 import json
+from db_migrations import migrate
+
+# Components of calculate_monthly_savings, in the order they are summed
+SAVINGS_COMPONENTS = ('meal_planning_savings', 'smart_shopping_savings', 'food_waste_prevention',
+                      'price_comparison_savings', 'bulk_buying_savings')
+
+
+def _add_months(month, months):
+    """First day of the month `months` after month"""
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def _is_closed(start_date, today=None):
+    """
+    A month's numbers are final once its savings window (through the 1st of
+    the next month) and its 30-day contribution window are both over
+    """
+    if start_date.day != 1:
+        return False
+    last_day = max(_add_months(start_date, 1), start_date + timedelta(days=30))
+    return (today or datetime.now().date()) > last_day
+
 
 class SavingsTracker:
     def __init__(self, db_name='home.db'):
         self.db_name = db_name
+        migrate(db_name)
         
         # Economic values (customize these)
         self.RESTAURANT_MEAL_COST = 35.00  # Average cost per person eating out
@@ -15,6 +39,10 @@ class SavingsTracker:
     def calculate_monthly_savings(self, start_date=None):
         """
         Calculate total savings for the month
+        Every component is one set-based query; all of them run on one
+        connection inside one read transaction, so they see the same data.
+        Closed months are read from savings_snapshots (and stored there the
+        first time they are computed); only the open month is computed live.
         """
         if not start_date:
             start_date = datetime.now().date().replace(day=1)
@@ -25,35 +53,97 @@ class SavingsTracker:
         else:
             end_date = start_date.replace(month=start_date.month + 1, day=1)
         
-        savings = {
-            'meal_planning_savings': self._calculate_meal_planning_savings(start_date, end_date),
-            'smart_shopping_savings': self._calculate_smart_shopping_savings(start_date, end_date),
-            'food_waste_prevention': self._calculate_food_waste_prevention(start_date, end_date),
-            'price_comparison_savings': self._calculate_price_comparison_savings(start_date, end_date),
-            'bulk_buying_savings': self._calculate_bulk_savings(start_date, end_date),
-        }
-        
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        try:
+            cursor.execute('BEGIN')
+            snapshot = self._load_snapshot(cursor, start_date) if _is_closed(start_date) else None
+            if snapshot:
+                savings = {key: snapshot[key] for key in SAVINGS_COMPONENTS}
+            else:
+                savings = {
+                    'meal_planning_savings': self._calculate_meal_planning_savings(cursor, start_date, end_date),
+                    'smart_shopping_savings': self._calculate_smart_shopping_savings(cursor, start_date, end_date),
+                    'food_waste_prevention': self._calculate_food_waste_prevention(cursor, start_date, end_date),
+                    'price_comparison_savings': self._calculate_price_comparison_savings(cursor, start_date, end_date),
+                    'bulk_buying_savings': self._calculate_bulk_savings(cursor, start_date, end_date),
+                }
+                if _is_closed(start_date):
+                    self._save_snapshot(cursor, start_date, savings)
+            conn.commit()
+        finally:
+            conn.close()
+        
+        return self._with_totals(savings)
+    
+    def _with_totals(self, savings):
         savings['total_monthly_savings'] = sum(savings.values())
         savings['annual_projection'] = savings['total_monthly_savings'] * 12
         savings['equivalent_salary'] = savings['annual_projection'] * 1.25  # Add 25% for after-tax equivalent
-        
         return savings
     
-    def _calculate_meal_planning_savings(self, start_date, end_date):
+    def _load_snapshot(self, cursor, start_date):
+        cursor.execute(f'''
+        SELECT {', '.join(SAVINGS_COMPONENTS)}, meals_planned, shopping_trips
+        FROM savings_snapshots WHERE month = ?
+        ''', (str(start_date),))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        return dict(zip(SAVINGS_COMPONENTS + ('meals_planned', 'shopping_trips'), row))
+    
+    def _save_snapshot(self, cursor, start_date, savings):
+        """Freeze a closed month, with the counts get_contribution_value needs"""
+        meals_planned, shopping_trips = self._contribution_counts(cursor, start_date)
+        cursor.execute(f'''
+        INSERT OR IGNORE INTO savings_snapshots
+            (month, {', '.join(SAVINGS_COMPONENTS)}, meals_planned, shopping_trips, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        ''', (str(start_date), *(savings[key] for key in SAVINGS_COMPONENTS), meals_planned, shopping_trips))
+    
+    def get_savings_history(self, months=12):
         """
-        Calculate savings from meal planning vs eating out
+        Savings for the last `months` months, oldest first, for charting
+        Closed months come from savings_snapshots in one indexed read; the
+        open month (and any closed month not snapshotted yet) is computed.
+        Returns: list of dicts with month ('YYYY-MM') and the calculate_monthly_savings keys
         """
+        this_month = datetime.now().date().replace(day=1)
+        first = _add_months(this_month, -(months - 1))
+        
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
+        cursor.execute(f'''
+        SELECT month, {', '.join(SAVINGS_COMPONENTS)}
+        FROM savings_snapshots
+        WHERE month >= ? AND month <= ?
+        ORDER BY month
+        ''', (str(first), str(this_month)))
+        snapshots = {row[0]: dict(zip(SAVINGS_COMPONENTS, row[1:])) for row in cursor.fetchall()}
+        conn.close()
         
+        history = []
+        for i in range(months):
+            month = _add_months(first, i)
+            if str(month) in snapshots:
+                savings = self._with_totals(snapshots[str(month)])
+            else:
+                savings = self.calculate_monthly_savings(month)
+            history.append({'month': month.strftime('%Y-%m'), **savings})
+        
+        return history
+    
+    def _calculate_meal_planning_savings(self, cursor, start_date, end_date):
+        """
+        Calculate savings from meal planning vs eating out
+        """
         # Count meals planned this month
         cursor.execute('''
         SELECT COUNT(*) FROM meal_plan
         WHERE date BETWEEN ? AND ?
-        ''', (start_date, end_date))
+        ''', (str(start_date), str(end_date)))
         
         meals_planned = cursor.fetchone()[0]
-        conn.close()
         
         # Assume 80% of planned meals were actually cooked
         meals_cooked = int(meals_planned * 0.8)
@@ -63,143 +153,148 @@ class SavingsTracker:
         
         return savings
     
-    def _calculate_smart_shopping_savings(self, start_date, end_date):
+    def _calculate_smart_shopping_savings(self, cursor, start_date, end_date):
         """
         Calculate savings from finding deals and lower prices
         """
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         # Count shopping trips (saved delivery fees)
         cursor.execute('''
         SELECT COUNT(DISTINCT date_recorded) 
         FROM price_history
         WHERE date_recorded BETWEEN ? AND ?
-        ''', (start_date, end_date))
+        ''', (str(start_date), str(end_date)))
         
         shopping_trips = cursor.fetchone()[0]
         delivery_savings = shopping_trips * self.GROCERY_DELIVERY_FEE
         
-        # Calculate price comparison savings
-        # (Compare current prices vs previous higher prices)
+        # Calculate price comparison savings: every purchase this month that
+        # was cheaper than the item's average over the 6 months before it
         cursor.execute('''
-        SELECT item_name, price FROM price_history
-        WHERE date_recorded BETWEEN ? AND ?
-        ''', (start_date, end_date))
-        
-        recent_purchases = cursor.fetchall()
-        comparison_savings = 0
-        
-        for item_name, price in recent_purchases:
-            # Get average price from past 6 months
-            cursor.execute('''
-            SELECT AVG(price) FROM price_history
-            WHERE item_name = ? 
-            AND date_recorded < ?
-            AND date_recorded > ?
-            ''', (item_name, start_date, start_date - timedelta(days=180)))
-            
-            avg_past_price = cursor.fetchone()[0]
-            if avg_past_price and avg_past_price > price:
-                comparison_savings += (avg_past_price - price)
-        
-        conn.close()
+        WITH past AS (
+            SELECT item_name, AVG(price) AS avg_price
+            FROM price_history
+            WHERE date_recorded < ? AND date_recorded > ?
+            GROUP BY item_name
+        )
+        SELECT SUM(past.avg_price - ph.price)
+        FROM price_history ph
+        CROSS JOIN past ON past.item_name = ph.item_name  -- this month's rows drive the join
+        WHERE ph.date_recorded BETWEEN ? AND ?
+        AND past.avg_price != 0 AND past.avg_price > ph.price
+        ''', (str(start_date), str(start_date - timedelta(days=180)), str(start_date), str(end_date)))
+        
+        comparison_savings = cursor.fetchone()[0] or 0
         
         return delivery_savings + comparison_savings
     
-    def _calculate_food_waste_prevention(self, start_date, end_date):
+    def _calculate_food_waste_prevention(self, cursor, start_date, end_date):
         """
         Calculate value of food that was saved from expiring
         """
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         # Items that were consumed before expiring
         cursor.execute('''
         SELECT SUM(price) FROM inventory
         WHERE status = 'Consumed'
         AND date_added BETWEEN ? AND ?
         AND expiry_date >= date_added
-        ''', (start_date, end_date))
+        ''', (str(start_date), str(end_date)))
         
         result = cursor.fetchone()[0]
         prevented_waste = result if result else 0
         
-        conn.close()
-        
         return prevented_waste
     
-    def _calculate_price_comparison_savings(self, start_date, end_date):
+    def _calculate_price_comparison_savings(self, cursor, start_date, end_date):
         """
         Savings from choosing cheaper stores
+        For each item bought this month: the latest price paid vs the highest
+        price at any other store in the last 90 days. Rows without a store
+        never count as another store.
         """
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
-        # Get all items bought this month
         cursor.execute('''
-        SELECT DISTINCT item_name FROM price_history
-        WHERE date_recorded BETWEEN ? AND ?
-        ''', (start_date, end_date))
-        
-        items = cursor.fetchall()
-        total_savings = 0
-        
-        for item in items:
-            item_name = item[0]
-            
-            # Get price paid
-            cursor.execute('''
-            SELECT price, store FROM price_history
-            WHERE item_name = ?
-            AND date_recorded BETWEEN ? AND ?
-            ORDER BY date_recorded DESC
-            LIMIT 1
-            ''', (item_name, start_date, end_date))
-            
-            current = cursor.fetchone()
-            if not current:
-                continue
-            
-            price_paid, store_used = current
-            
-            # Get highest price from other stores (last 90 days)
-            cursor.execute('''
-            SELECT MAX(price) FROM price_history
-            WHERE item_name = ?
-            AND store != ?
-            AND date_recorded > ?
-            ''', (item_name, store_used if store_used else '', start_date - timedelta(days=90)))
-            
-            max_other_price = cursor.fetchone()[0]
-            if max_other_price and max_other_price > price_paid:
-                total_savings += (max_other_price - price_paid)
-        
-        conn.close()
-        return total_savings
+        WITH paid AS (
+            SELECT item_name, price, store,
+                   ROW_NUMBER() OVER (PARTITION BY item_name
+                                      ORDER BY date_recorded DESC, id ASC) AS rn
+            FROM price_history
+            WHERE date_recorded BETWEEN ? AND ?
+            AND item_name IS NOT NULL
+        ),
+        store_max AS (
+            SELECT item_name, store, MAX(price) AS max_price
+            FROM price_history
+            WHERE date_recorded > ?
+            AND store IS NOT NULL
+            AND item_name IN (SELECT item_name FROM paid WHERE rn = 1)
+            GROUP BY item_name, store
+        ),
+        best_other AS (
+            SELECT paid.item_name, paid.price, MAX(store_max.max_price) AS max_other
+            FROM paid
+            JOIN store_max ON store_max.item_name = paid.item_name
+                          AND store_max.store != COALESCE(paid.store, '')
+            WHERE paid.rn = 1
+            GROUP BY paid.item_name, paid.price
+        )
+        SELECT SUM(max_other - price) FROM best_other
+        WHERE max_other != 0 AND max_other > price
+        ''', (str(start_date), str(end_date), str(start_date - timedelta(days=90))))
+        
+        return cursor.fetchone()[0] or 0
     
-    def _calculate_bulk_savings(self, start_date, end_date):
+    def _calculate_bulk_savings(self, cursor, start_date, end_date):
         """
         Estimate savings from bulk buying
         """
-        conn = sqlite3.connect(self.db_name)
-        cursor = conn.cursor()
-        
         # Look for bulk purchases (quantity > 1 or from stores like Costco)
         cursor.execute('''
         SELECT SUM(price * 0.15) FROM price_history
         WHERE date_recorded BETWEEN ? AND ?
         AND (quantity > 1 OR store LIKE '%Costco%' OR store LIKE '%Sam%')
-        ''', (start_date, end_date))
+        ''', (str(start_date), str(end_date)))
         
         result = cursor.fetchone()[0]
         bulk_savings = result if result else 0
         
-        conn.close()
-        
         # Estimate 15% savings on bulk items
         return bulk_savings
     
+    def get_savings_summary(self, start_date=None):
+        """
+        Month-to-date numbers for the sidebar's savings card, in one query
+        Same result as app.py's db_calculate_savings (the savings_summary RPC
+        on Supabase): meals planned, shopping days and consumed inventory
+        value since start_date, each an indexed range count or sum.
+        """
+        if not start_date:
+            start_date = datetime.now().date().replace(day=1)
+        
+        conn = sqlite3.connect(self.db_name)
+        cursor = conn.cursor()
+        cursor.execute('''
+        SELECT (SELECT COUNT(*) FROM meal_plan WHERE date >= ?),
+               (SELECT COUNT(DISTINCT date_recorded) FROM price_history WHERE date_recorded >= ?),
+               (SELECT COALESCE(SUM(price), 0) FROM inventory
+                WHERE status = 'Consumed' AND date_added >= ?)
+        ''', (str(start_date),) * 3)
+        meals_planned, shopping_trips, waste_prevented = cursor.fetchone()
+        conn.close()
+        
+        meals_cooked = int(meals_planned * 0.8)
+        meal_savings = meals_cooked * self.RESTAURANT_MEAL_COST
+        shopping_savings = shopping_trips * self.GROCERY_DELIVERY_FEE
+        total = meal_savings + shopping_savings + waste_prevented
+        
+        return {
+            'meal_planning_savings': meal_savings,
+            'smart_shopping_savings': shopping_savings,
+            'food_waste_prevention': waste_prevented,
+            'total_monthly_savings': total,
+            'annual_projection': total * 12,
+            'meals_cooked': meals_cooked,
+            'shopping_trips': shopping_trips
+        }
+    
     def get_contribution_value(self, start_date=None):
         """
         Calculate the economic value of household management work
@@ -207,26 +302,17 @@ class SavingsTracker:
         if not start_date:
             start_date = datetime.now().date().replace(day=1)
         
-        end_date = start_date + timedelta(days=30)
-        
         conn = sqlite3.connect(self.db_name)
         cursor = conn.cursor()
         
-        # Count meals prepared
-        cursor.execute('''
-        SELECT COUNT(*) FROM meal_plan
-        WHERE date BETWEEN ? AND ?
-        ''', (start_date, end_date))
-        meals_planned = cursor.fetchone()[0]
+        # Closed months: the counts were frozen with the month's snapshot
+        snapshot = self._load_snapshot(cursor, start_date) if _is_closed(start_date) else None
+        if snapshot:
+            meals_planned, shopping_trips = snapshot['meals_planned'], snapshot['shopping_trips']
+        else:
+            meals_planned, shopping_trips = self._contribution_counts(cursor, start_date)
         meals_cooked = int(meals_planned * 0.8)
         
-        # Count shopping trips
-        cursor.execute('''
-        SELECT COUNT(DISTINCT date_recorded) FROM price_history
-        WHERE date_recorded BETWEEN ? AND ?
-        ''', (start_date, end_date))
-        shopping_trips = cursor.fetchone()[0]
-        
         conn.close()
         
         # Calculate economic value
@@ -258,6 +344,26 @@ class SavingsTracker:
         
         return contributions
     
+    def _contribution_counts(self, cursor, start_date):
+        """(meals planned, shopping trips) in the 30 days from start_date"""
+        end_date = start_date + timedelta(days=30)
+        
+        # Count meals prepared
+        cursor.execute('''
+        SELECT COUNT(*) FROM meal_plan
+        WHERE date BETWEEN ? AND ?
+        ''', (str(start_date), str(end_date)))
+        meals_planned = cursor.fetchone()[0]
+        
+        # Count shopping trips
+        cursor.execute('''
+        SELECT COUNT(DISTINCT date_recorded) FROM price_history
+        WHERE date_recorded BETWEEN ? AND ?
+        ''', (str(start_date), str(end_date)))
+        shopping_trips = cursor.fetchone()[0]
+        
+        return meals_planned, shopping_trips
+    
     def get_achievements(self, start_date=None):
         """
         Get achievements earned this month
@@ -337,4 +443,8 @@ if __name__ == "__main__":
     
     # Get achievements
     achievements = tracker.get_achievements()
-    print(f"\nAchievements Earned: {len(achievements)}")
\ No newline at end of file
+    print(f"\nAchievements Earned: {len(achievements)}")
+    
+    # Last 12 months, for a chart
+    for month in tracker.get_savings_history(months=12):
+        print(f"{month['month']}: ${month['total_monthly_savings']:.2f}")
\ No newline at end of file
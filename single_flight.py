@@ -0,0 +1,45 @@
+# single_flight.py
+# Collapse concurrent identical calls into one
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    While a call for a key is running, later callers with the same key
+    wait for it and receive its result (or its exception) instead of
+    starting their own. Nothing is cached once the call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}   # key -> Future of the running call
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._calls[key] = future
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                del self._calls[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._calls[key]
+        future.set_result(result)
+        return result
+
+    def in_flight(self):
+        """Number of distinct calls currently running"""
+        with self._lock:
+            return len(self._calls)
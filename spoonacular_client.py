@@ -0,0 +1,233 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from api_cassette import new_session
+from single_flight import SingleFlight
+
+BASE_URL = "https://api.spoonacular.com"
+BULK_SIZE = 50   # recipe ids per /recipes/informationBulk request
+
+
+class SpoonacularClient:
+    """
+    Shared Spoonacular client: one pooled Session, timeouts on every call,
+    a memory of ingredients with no match (negative cache) and coalescing of
+    identical lookups that are already in flight. Recipe details never change,
+    so they are kept once fetched.
+    """
+
+    def __init__(self, api_key, timeout=10, max_workers=4, negative_ttl=24 * 3600, session=None):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self.negative_ttl = negative_ttl
+        self.session = session or new_session(max_workers)
+
+        self._lock = threading.Lock()
+        self._found = {}       # ingredient -> nutrition dict
+        self._not_found = {}   # ingredient -> time.time() when the miss expires
+        self._recipes = {}     # recipe_id -> parsed recipe details
+        self._flight = SingleFlight()
+
+    def _get(self, path, **params):
+        """
+        GET an API path; returns parsed JSON or None on a non-200 response
+        """
+        params['apiKey'] = self.api_key
+        response = self.session.get(f"{BASE_URL}{path}", params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            return None
+        return response.json()
+
+    def lookup_nutrition(self, item_name):
+        """
+        Nutrition per 100g for an ingredient, or None if Spoonacular has no match
+        """
+        key = item_name.lower().strip()
+
+        with self._lock:
+            if key in self._found:
+                return self._found[key]
+            if self._not_found.get(key, 0) > time.time():
+                return None
+
+        # Someone else already asking for this ingredient shares their answer
+        return self._flight.do(key, self._lookup_uncached, item_name, key)
+
+    def _lookup_uncached(self, item_name, key):
+        result, failed = None, True
+        try:
+            result = self._fetch_nutrition(item_name)
+            failed = False
+        except Exception as e:
+            print(f"Error fetching nutrition data: {e}")
+
+        with self._lock:
+            if result:
+                self._found[key] = result
+            elif not failed:
+                # Only a definite "no match" is remembered; errors are retried next time
+                self._not_found[key] = time.time() + self.negative_ttl
+
+        return result
+
+    def _fetch_nutrition(self, item_name):
+        """
+        Search for the ingredient, then fetch its nutrition for 100g
+        """
+        data = self._get('/food/ingredients/search', query=item_name, number=1)
+        if data is None:
+            raise RuntimeError(f"search failed for '{item_name}'")
+        if not data.get('results'):
+            return None
+
+        ingredient_id = data['results'][0]['id']
+
+        info = self._get(f'/food/ingredients/{ingredient_id}/information', amount=100, unit='grams')
+        if info is None:
+            raise RuntimeError(f"information failed for '{item_name}'")
+
+        nutrients = info.get('nutrition', {}).get('nutrients', [])
+
+        # Extract key nutrients
+        nutrient_dict = {}
+        for nutrient in nutrients:
+            nutrient_dict[nutrient['name']] = nutrient['amount']
+
+        return {
+            'item_name': item_name,
+            'serving_size': '100g',
+            'calories': nutrient_dict.get('Calories', 0),
+            'protein': nutrient_dict.get('Protein', 0),
+            'carbs': nutrient_dict.get('Carbohydrates', 0),
+            'fat': nutrient_dict.get('Fat', 0),
+            'fiber': nutrient_dict.get('Fiber', 0),
+            'sugar': nutrient_dict.get('Sugar', 0),
+            'sodium': nutrient_dict.get('Sodium', 0)
+        }
+
+    def get_recipe_information(self, recipe_id):
+        """
+        Recipe details in MealPlanner's format, or None if unavailable
+        """
+        with self._lock:
+            if recipe_id in self._recipes:
+                return self._recipes[recipe_id]
+        return self._flight.do(('recipe', recipe_id), self._fetch_recipe, recipe_id)
+
+    def _fetch_recipe(self, recipe_id):
+        data = self._get(f'/recipes/{recipe_id}/information', includeNutrition='true')
+        if data is None:
+            return None
+        details = parse_recipe_information(data)
+        with self._lock:
+            self._recipes[recipe_id] = details
+        return details
+
+    def _fetch_recipes_bulk(self, recipe_ids):
+        """
+        One /recipes/informationBulk request for up to BULK_SIZE ids
+        Returns: dict {recipe_id: details} for the recipes the API returned
+        """
+        data = self._get('/recipes/informationBulk', ids=','.join(str(rid) for rid in recipe_ids),
+                         includeNutrition='true')
+        if data is None:
+            raise RuntimeError(f"informationBulk failed for {len(recipe_ids)} recipes")
+
+        wanted = {str(rid): rid for rid in recipe_ids}
+        results = {}
+        for item in data:
+            rid = wanted.get(str(item.get('id')))
+            if rid is not None:
+                results[rid] = parse_recipe_information(item)
+        with self._lock:
+            self._recipes.update(results)
+        return results
+
+    def get_recipes_information(self, recipe_ids):
+        """
+        Details for several recipes, fetching only the uncached ones
+        Several misses go through the bulk endpoint, BULK_SIZE ids per request.
+        Returns: dict {recipe_id: details or None}
+        """
+        ids = list(dict.fromkeys(recipe_ids))
+        with self._lock:
+            results = {rid: self._recipes[rid] for rid in ids if rid in self._recipes}
+        missing = [rid for rid in ids if rid not in results]
+
+        def fetch(recipe_id):
+            try:
+                return self.get_recipe_information(recipe_id)
+            except Exception as e:
+                print(f"Error fetching recipe details: {e}")
+                return None
+
+        def fetch_chunk(chunk):
+            try:
+                return self._fetch_recipes_bulk(chunk)
+            except Exception as e:
+                print(f"Error fetching recipe details: {e}")
+                return {}
+
+        if len(missing) == 1:
+            results[missing[0]] = fetch(missing[0])
+        elif missing:
+            chunks = [missing[i:i + BULK_SIZE] for i in range(0, len(missing), BULK_SIZE)]
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as pool:
+                for found in pool.map(fetch_chunk, chunks):
+                    results.update(found)
+            for rid in missing:
+                results.setdefault(rid, None)
+        return results
+
+    def lookup_many(self, item_names):
+        """
+        Resolve several ingredients concurrently
+        Returns: dict {item_name: nutrition dict or None}
+        """
+        names = list(dict.fromkeys(item_names))
+        if len(names) <= 1:
+            return {name: self.lookup_nutrition(name) for name in names}
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(names))) as pool:
+            results = pool.map(self.lookup_nutrition, names)
+            return dict(zip(names, results))
+
+
+def parse_recipe_information(data):
+    """
+    Reduce a /recipes/{id}/information payload to title, image, ingredient
+    names, calories and readyInMinutes
+    """
+    # Extract ingredient names
+    ingredients = [ing['name'] for ing in data.get('extendedIngredients', [])]
+
+    # Get nutrition info
+    calories = None
+    if 'nutrition' in data and 'nutrients' in data['nutrition']:
+        for nutrient in data['nutrition']['nutrients']:
+            if nutrient['name'] == 'Calories':
+                calories = nutrient['amount']
+                break
+
+    return {
+        'title': data.get('title'),
+        'image': data.get('image'),
+        'ingredients': ingredients,
+        'calories': calories,
+        'readyInMinutes': data.get('readyInMinutes')
+    }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key):
+    """
+    Process-wide client per API key, so caches survive across tracker instances
+    """
+    with _clients_lock:
+        if api_key not in _clients:
+            _clients[api_key] = SpoonacularClient(api_key)
+        return _clients[api_key]
@@ -0,0 +1,54 @@
+-- The Supabase tables the SQL in this folder works on (price_history,
+-- budget_settings, meal_plan, inventory), with the columns app.py writes, for
+-- testing against a local Postgres. Supabase projects already have these; don't
+-- run it there. Run it first: the functions in 002 and 003 are checked against
+-- these tables when they are created.
+
+CREATE TABLE IF NOT EXISTS price_history (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    item_name TEXT NOT NULL,
+    price DOUBLE PRECISION,
+    store TEXT,
+    quantity DOUBLE PRECISION DEFAULT 1,
+    unit TEXT DEFAULT 'unit',
+    date_recorded DATE
+);
+
+CREATE TABLE IF NOT EXISTS budget_settings (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    period TEXT DEFAULT 'monthly',
+    budget_limit DOUBLE PRECISION,
+    alert_threshold DOUBLE PRECISION DEFAULT 0.8,
+    start_date DATE,
+    current_spent DOUBLE PRECISION DEFAULT 0,
+    UNIQUE (user_id)
+);
+
+CREATE TABLE IF NOT EXISTS meal_plan (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    date DATE NOT NULL,
+    meal_type TEXT,
+    meal_name TEXT,
+    recipe_name TEXT,
+    servings INTEGER DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS inventory (
+    id BIGSERIAL PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    item_name TEXT NOT NULL,
+    category TEXT,
+    quantity DOUBLE PRECISION,
+    unit TEXT,
+    date_added DATE,
+    expiry_date DATE,
+    storage TEXT,
+    status TEXT DEFAULT 'In Stock',
+    decision_reason TEXT,
+    price DOUBLE PRECISION,
+    store TEXT,
+    barcode TEXT
+);
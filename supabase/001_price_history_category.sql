@@ -0,0 +1,18 @@
+-- Category and normalized item key stamped on price_history at write time
+-- (app.py db_record_purchase fills both). Run once in the Supabase SQL editor.
+
+ALTER TABLE price_history ADD COLUMN IF NOT EXISTS category TEXT;
+ALTER TABLE price_history ADD COLUMN IF NOT EXISTS item_key TEXT;
+
+-- Older rows are stamped by backfill_price_history.py, with the same rule the
+-- app writes new rows with: InventoryLogic.normalize_item's category ('Unsorted'
+-- for unknown items) and ingredient_matcher.item_key. Both depend on defaults.json,
+-- so they are computed in Python rather than here; until the script has run, the
+-- dashboard normalizes NULL categories itself. Rows of databases that already ran
+-- an earlier version of this file (inventory category / lower(trim(name)) key)
+-- are re-stamped by the script too.
+
+CREATE INDEX IF NOT EXISTS idx_price_history_user_category
+    ON price_history (user_id, category, date_recorded);
+CREATE INDEX IF NOT EXISTS idx_price_history_user_item_key
+    ON price_history (user_id, item_key, date_recorded);
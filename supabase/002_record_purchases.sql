@@ -0,0 +1,64 @@
+-- record_purchases: a batch of purchases and the budget increment in one call,
+-- in one transaction. app.py calls it through supabase.rpc("record_purchases").
+-- Needs 001_price_history_category.sql. Run once in the Supabase SQL editor.
+--
+-- Local testing with plain Postgres:
+--   createdb home_os
+--   psql home_os -f supabase/000_local_schema.sql -f supabase/001_price_history_category.sql \
+--                -f supabase/002_record_purchases.sql
+--   psql home_os -c "SELECT * FROM record_purchases('dev@example.com',
+--       '[{\"item_name\": \"milk\", \"price\": 4.99, \"store\": \"Kroger\"}]')"
+--
+-- p_items: JSON array of {item_name, price, store, quantity, unit, date_recorded,
+-- category, item_key}; only item_name and price are required.
+
+CREATE OR REPLACE FUNCTION record_purchases(p_user_id TEXT, p_items JSONB)
+RETURNS TABLE (recorded INTEGER, total DOUBLE PRECISION, current_spent DOUBLE PRECISION)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_count INTEGER;
+    v_total DOUBLE PRECISION;
+    v_spent DOUBLE PRECISION;
+BEGIN
+    WITH inserted AS (
+        INSERT INTO price_history (user_id, item_name, price, store, quantity, unit,
+                                   date_recorded, category, item_key)
+        SELECT p_user_id, i.item_name, i.price, COALESCE(i.store, ''),
+               COALESCE(i.quantity, 1), COALESCE(i.unit, 'unit'),
+               COALESCE(i.date_recorded, CURRENT_DATE), i.category,
+               COALESCE(i.item_key, lower(trim(i.item_name)))
+        FROM jsonb_to_recordset(COALESCE(p_items, '[]'::jsonb)) AS i(
+            item_name TEXT, price DOUBLE PRECISION, store TEXT, quantity DOUBLE PRECISION,
+            unit TEXT, date_recorded DATE, category TEXT, item_key TEXT)
+        WHERE i.item_name IS NOT NULL AND i.price IS NOT NULL
+        RETURNING price
+    )
+    SELECT COUNT(*), COALESCE(SUM(price), 0) INTO v_count, v_total FROM inserted;
+
+    -- Receipts for the same user take turns from here on, so two first
+    -- receipts can't both find no budget row and both insert one. Released at
+    -- commit; budget_settings needs no UNIQUE (user_id) for this.
+    PERFORM pg_advisory_xact_lock(hashtext('record_purchases'), hashtext(p_user_id));
+
+    -- The increment happens in the row update itself, so concurrent receipts
+    -- from two devices serialize on the row instead of overwriting each other
+    -- The app only ever reads a user's first budget row, so only that one is
+    -- updated (RETURNING ... INTO would fail on duplicates)
+    UPDATE budget_settings b
+    SET current_spent = COALESCE(b.current_spent, 0) + v_total
+    WHERE b.id = (SELECT id FROM budget_settings
+                  WHERE user_id = p_user_id
+                  ORDER BY id LIMIT 1
+                  FOR UPDATE)
+    RETURNING b.current_spent INTO v_spent;
+
+    IF NOT FOUND THEN
+        INSERT INTO budget_settings (user_id, period, budget_limit, current_spent, start_date)
+        VALUES (p_user_id, 'monthly', 500.0, v_total, CURRENT_DATE)
+        RETURNING budget_settings.current_spent INTO v_spent;
+    END IF;
+
+    RETURN QUERY SELECT v_count, v_total, v_spent;
+END;
+$$;
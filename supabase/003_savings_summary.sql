@@ -0,0 +1,31 @@
+-- savings_summary: the month-to-date numbers behind the sidebar's savings card,
+-- counted and summed in Postgres so app.py's db_calculate_savings makes one
+-- round trip instead of downloading every row. Run once in the Supabase SQL editor.
+-- (SavingsTracker.get_savings_summary is the same query for the local SQLite backend.)
+--
+-- Local testing with plain Postgres (000 creates meal_plan and inventory too):
+--   createdb home_os
+--   psql home_os -f supabase/000_local_schema.sql -f supabase/001_price_history_category.sql \
+--                -f supabase/002_record_purchases.sql -f supabase/003_savings_summary.sql
+--   psql home_os -c "SELECT * FROM savings_summary('dev@example.com', date_trunc('month', now())::date)"
+
+CREATE OR REPLACE FUNCTION savings_summary(p_user_id TEXT, p_since DATE)
+RETURNS TABLE (meals_planned BIGINT, shopping_trips BIGINT, waste_prevented DOUBLE PRECISION)
+LANGUAGE sql STABLE
+AS $$
+    SELECT
+        (SELECT COUNT(*) FROM meal_plan
+         WHERE user_id = p_user_id AND date >= p_since),
+        (SELECT COUNT(DISTINCT date_recorded) FROM price_history
+         WHERE user_id = p_user_id AND date_recorded >= p_since),
+        (SELECT COALESCE(SUM(price), 0)::DOUBLE PRECISION FROM inventory
+         WHERE user_id = p_user_id AND status = 'Consumed' AND date_added >= p_since);
+$$;
+
+-- Each subquery is a range scan over the user's rows for the month
+CREATE INDEX IF NOT EXISTS idx_meal_plan_user_date
+    ON meal_plan (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_price_history_user_date
+    ON price_history (user_id, date_recorded);
+CREATE INDEX IF NOT EXISTS idx_inventory_user_status_added
+    ON inventory (user_id, status, date_added);
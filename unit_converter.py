@@ -0,0 +1,184 @@
+import math
+import re
+import numpy as np
+
+# Standard units -> (dimension, factor to the dimension's base unit)
+# Base units: grams for mass, millilitres for volume, pieces for count
+UNITS = {
+    'g': ('mass', 1.0), 'gram': ('mass', 1.0), 'grams': ('mass', 1.0),
+    'kg': ('mass', 1000.0),
+    'oz': ('mass', 28.3495), 'ounce': ('mass', 28.3495), 'ounces': ('mass', 28.3495),
+    'lb': ('mass', 453.592), 'lbs': ('mass', 453.592), 'pound': ('mass', 453.592), 'pounds': ('mass', 453.592),
+    'ml': ('volume', 1.0), 'l': ('volume', 1000.0), 'liter': ('volume', 1000.0), 'litre': ('volume', 1000.0),
+    'tsp': ('volume', 4.929), 'teaspoon': ('volume', 4.929),
+    'tbsp': ('volume', 14.787), 'tablespoon': ('volume', 14.787),
+    'fl oz': ('volume', 29.574), 'cup': ('volume', 236.588), 'cups': ('volume', 236.588),
+    'pint': ('volume', 473.176), 'quart': ('volume', 946.353),
+    'gallon': ('volume', 3785.41), 'gal': ('volume', 3785.41),
+    'count': ('count', 1.0), 'ct': ('count', 1.0), 'each': ('count', 1.0), 'unit': ('count', 1.0),
+    'piece': ('count', 1.0), 'dozen': ('count', 12.0),
+}
+
+_AMOUNT = re.compile(r'^\s*(\d+(?:\.\d+)?(?:\s*/\s*\d+)?)\s*(.*)$')
+
+
+def parse_ingredient(entry):
+    """
+    Split a planned ingredient into (name, amount, unit)
+    entry: a dict with name/amount/unit, or text like "2 cups spinach" / "spinach"
+    amount and unit are None when the entry doesn't give them
+    """
+    if isinstance(entry, dict):
+        return entry.get('name', ''), entry.get('amount'), entry.get('unit')
+
+    text = str(entry).strip()
+    m = _AMOUNT.match(text)
+    if not m:
+        return text, None, None
+    number, rest = m.groups()
+    if '/' in number:
+        top, bottom = number.split('/')
+        amount = float(top) / float(bottom) if float(bottom) else None
+    else:
+        amount = float(number)
+
+    rest_lower = rest.lower()
+    for unit in sorted(UNITS, key=len, reverse=True):
+        if rest_lower.startswith(unit + ' ') or rest_lower.startswith(unit + '. '):
+            return rest[len(unit):].lstrip('. ').strip(), amount, unit
+    return rest.strip(), amount, 'unit'
+
+
+class UnitConverter:
+    """
+    Converts item amounts between units using a precomputed table of
+    (item, unit) -> (dimension, factor to base unit).
+    Package units like 'bag' or 'carton' and mass<->volume conversions use
+    the per-item unit_size and density_g_per_ml overrides in defaults.json.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self._table = {}
+        for item in rules:
+            for unit in list(UNITS) + [rules[item].get('unit', 'unit')]:
+                factor = self._compute(item, unit)
+                if factor:
+                    self._table[(item, unit)] = factor
+
+    @staticmethod
+    def clean_unit(unit):
+        unit = (unit or 'unit').strip().lower()
+        return re.sub(r'\s+', ' ', unit).rstrip('.')
+
+    def _compute(self, item, unit):
+        if unit in UNITS:
+            return UNITS[unit]
+        rule = self.rules.get(item, {})
+        size = rule.get('unit_size')
+        if rule.get('unit') == unit and size and self.clean_unit(size['unit']) in UNITS:
+            dimension, factor = UNITS[self.clean_unit(size['unit'])]
+            return dimension, factor * size['amount']
+        return None
+
+    def factor(self, item, unit):
+        """(dimension, factor to base) for an amount of item in unit, or None if unknown"""
+        unit = self.clean_unit(unit)
+        key = (item, unit)
+        if key not in self._table:
+            self._table[key] = self._compute(item, unit)
+        return self._table[key]
+
+    def purchase_unit(self, item):
+        """Unit the item is bought in, with its (dimension, factor)"""
+        unit = self.rules.get(item, {}).get('unit', 'unit')
+        return unit, self.factor(item, unit) or ('count', 1.0)
+
+    def factor_to(self, item, unit, dimension):
+        """
+        Multiplier taking an amount in unit to the base unit of dimension,
+        crossing mass/volume with the item's density. None if not convertible.
+        """
+        source = self.factor(item, unit)
+        if source is None:
+            return None
+        source_dim, factor = source
+        if source_dim == dimension:
+            return factor
+        density = self.rules.get(item, {}).get('density_g_per_ml')
+        if density and source_dim == 'volume' and dimension == 'mass':
+            return factor * density
+        if density and source_dim == 'mass' and dimension == 'volume':
+            return factor / density
+        return None
+
+    def to_purchase_units(self, item, amount, unit):
+        """
+        amount of unit expressed in the item's purchase unit (2 x 'lb' of rice -> bags).
+        The generic 'unit', and units that don't convert, count as purchase units.
+        """
+        amount = amount if amount is not None else 1
+        purchase_unit, (dimension, package) = self.purchase_unit(item)
+        if self.clean_unit(unit) == 'unit':
+            return amount
+        factor = self.factor_to(item, unit, dimension)
+        if factor is None:
+            return amount
+        return amount * factor / package
+
+    def default_portion(self, item):
+        """Amount one planned use needs when the plan gives no quantity"""
+        portion = self.rules.get(item, {}).get('portion')
+        if portion:
+            return portion['amount'], portion['unit']
+        return 1, 'unit'
+
+    def net_requirements(self, planned, on_hand):
+        """
+        Shortfalls of planned usage against what's on hand
+        planned, on_hand: lists of (item, amount, unit)
+        Each item is measured in the dimension of its purchase unit. Amounts
+        that can't be converted into it, and inventory rows stored with the
+        generic 'unit', count as that many purchase units.
+        Returns: list of dicts with item, needed / on_hand (base units), the
+        shortfall and an estimated quantity to buy in the item's purchase unit
+        """
+        items = list(dict.fromkeys(item for item, _, _ in planned))
+        if not items:
+            return []
+        code = {item: i for i, item in enumerate(items)}
+        dims = [self.purchase_unit(item)[1] for item in items]
+
+        def to_vector(rows, generic_is_package):
+            idx, values = [], []
+            for item, amount, unit in rows:
+                if item not in code:
+                    continue
+                i = code[item]
+                f = None
+                if not (generic_is_package and self.clean_unit(unit) == 'unit'):
+                    f = self.factor_to(item, unit, dims[i][0])
+                idx.append(i)
+                values.append((amount or 0) * (dims[i][1] if f is None else f))
+            return np.bincount(np.asarray(idx, dtype=np.intp),
+                               weights=np.asarray(values, dtype=np.float64),
+                               minlength=len(items))
+
+        needed = to_vector(planned, False)
+        have = to_vector(on_hand, True)
+        shortfall = needed - have
+        package = np.asarray([d[1] for d in dims])
+
+        results = []
+        for i in np.flatnonzero(shortfall > 1e-9):
+            item = items[i]
+            unit = self.purchase_unit(item)[0]
+            results.append({
+                'item': item,
+                'needed': float(needed[i]),
+                'on_hand': float(have[i]),
+                'shortfall': float(shortfall[i]),
+                'quantity': max(1, math.ceil(shortfall[i] / package[i] - 1e-9)),
+                'unit': unit
+            })
+        return results